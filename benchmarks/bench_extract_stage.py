@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+import pandas as pd
+import utils.extract_stage as extract_stage
+from data_generators import make_data_taipei_pages
+
+
+class _FakeResponse:
+    def __init__(self, page):
+        self.page = page
+
+    def json(self):
+        return self.page
+
+
+def bench_get_data_taipei_api(benchmark, monkeypatch):
+    # The pages are served from memory, so only the client side of the paging is measured.
+    pages = make_data_taipei_pages(50_000)
+
+    def run():
+        responses = iter(pages)
+        monkeypatch.setattr(
+            extract_stage.requests,
+            "get",
+            lambda url, timeout: _FakeResponse(next(responses)),
+        )
+        return pd.DataFrame(extract_stage.get_data_taipei_api("rid"))
+
+    benchmark(run)
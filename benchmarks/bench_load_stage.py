@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+import pandas as pd
+from data_generators import make_addresses, make_points
+from sqlalchemy import text
+from utils.load_stage import (
+    save_dataframe_to_postgresql,
+    save_geodataframe_to_postgresql,
+)
+from utils.transform_geometry import add_point_wkbgeometry_column_to_df
+
+N_ROWS = 50_000
+TABLE = "benchmark_load_stage"
+
+
+@pytest.fixture
+def table(db_engine):
+    yield TABLE
+    with db_engine.connect() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.commit()
+
+
+def _make_data():
+    return pd.DataFrame(
+        {"id": range(N_ROWS), "addr": make_addresses(N_ROWS), "value": 1.0}
+    )
+
+
+@pytest.mark.parametrize("method", ["execute_values", "multi"])
+def bench_save_dataframe_to_postgresql(benchmark, db_engine, table, method):
+    data = _make_data()
+    benchmark.pedantic(
+        save_dataframe_to_postgresql,
+        args=(db_engine, data, "append", table),
+        kwargs={"method": method},
+        rounds=3,
+    )
+
+
+def bench_save_geodataframe_to_postgresql(benchmark, db_engine, table):
+    x, y = make_points(N_ROWS)
+    gdata = add_point_wkbgeometry_column_to_df(_make_data(), x, y, from_crs=3826)
+    gdata = gdata.drop(columns="geometry")
+    benchmark.pedantic(
+        save_geodataframe_to_postgresql,
+        args=(db_engine, gdata, "append", "Point", table),
+        rounds=3,
+    )
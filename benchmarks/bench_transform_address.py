@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+import pandas as pd
+from data_generators import make_addresses
+
+try:
+    import utils.transform_address as transform_address
+except FileNotFoundError as error:
+    # the dimension data of opendata is loaded when importing
+    pytest.skip(f"Address dimension data not found: {error}", allow_module_level=True)
+
+# the bundled addr.csv is resampled to 1M rows, the scale named by the request
+N_ROWS = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def addresses():
+    return make_addresses(N_ROWS)
+
+
+@pytest.mark.parametrize("string_dtype", ["object", "string[pyarrow]"])
+def bench_clean_data(benchmark, monkeypatch, addresses, string_dtype):
+    # the dtype of the replaces inside clean_data, the input and output are object
+    monkeypatch.setattr(transform_address, "STRING_DTYPE", string_dtype)
+    # tracemalloc doesn't see Arrow buffers, so compare the size of the column in each dtype
+    column_bytes = addresses.astype(string_dtype).memory_usage(deep=True)
+    benchmark.extra_info["column_mb"] = round(column_bytes / 2**20, 1)
+    benchmark(transform_address.clean_data, addresses)
+
+
+def bench_main_process(benchmark):
+    addr_cleaned = transform_address.clean_data(make_addresses(500))
+    benchmark(transform_address.main_process, addr_cleaned)
+
+
+def bench_cut_edge(benchmark, addresses):
+    data = pd.DataFrame({"addr": addresses})
+    for i in range(20):
+        data[f"col{i}"] = data["addr"].where(data.index % (i + 2) == 0)
+    benchmark(transform_address.cut_edge, data)
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+import geopandas as gpd
+import numpy as np
+import shapely
+from data_generators import TAIPEI_BOUNDS_3826, make_points
+from utils.transform_geocode import (
+    build_boundary_index,
+    reverse_geocode_district_village,
+)
+
+N_POINTS = 1_000_000
+# about the number of villages in Taipei
+N_GRID = 21
+
+
+@pytest.fixture(scope="module")
+def boundary_index():
+    # a grid of villages over Taipei, each with a hole in the middle
+    minx, miny, maxx, maxy = TAIPEI_BOUNDS_3826
+    xs = np.linspace(minx, maxx, N_GRID + 1)
+    ys = np.linspace(miny, maxy, N_GRID + 1)
+    x0, y0 = (a.ravel() for a in np.meshgrid(xs[:-1], ys[:-1]))
+    x1, y1 = (a.ravel() for a in np.meshgrid(xs[1:], ys[1:]))
+    cells = shapely.box(x0, y0, x1, y1)
+    holes = shapely.buffer(shapely.centroid(cells), 100, quad_segs=8)
+    boundary = gpd.GeoDataFrame(
+        {
+            "TOWNNAME": (np.arange(len(cells)) // N_GRID).astype(str),
+            "VILLNAME": np.arange(len(cells)).astype(str),
+        },
+        geometry=shapely.difference(cells, holes),
+        crs=3826,
+    )
+    return build_boundary_index(boundary)
+
+
+@pytest.fixture(scope="module")
+def points():
+    x, y = make_points(N_POINTS)
+    return gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y), crs=3826)
+
+
+def bench_reverse_geocode_district_village(benchmark, boundary_index, points):
+    benchmark(reverse_geocode_district_village, points, boundary_index)
@@ -0,0 +1,136 @@
+from functools import partial
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+import geopandas as gpd
+import pandas as pd
+import shapely
+from data_generators import make_lines, make_points, make_polygons
+from geoalchemy2.elements import WKBElement, WKTElement
+from utils.transform_geometry import (
+    add_point_wkbgeometry_column_to_df,
+    convert_3d_polygon_to_2d_polygon,
+    convert_geometry_to_wkbgeometry,
+    convert_geoseries_to_2d,
+    convert_geoseries_to_ewkb,
+    convert_geoseries_to_multilinestring,
+    convert_geoseries_to_multipolygon,
+    convert_linestring_to_multilinestring,
+    convert_polygon_to_multipolygon,
+    get_transformer,
+    simplify_geoseries,
+    transform_xy,
+    validate_geometry,
+)
+
+# the points are reprojected from TWD97 (EPSG:3826) to WGS84 on 1M points
+N_POINTS = 1_000_000
+N_POLYGONS = 20_000
+# the per-row converters are compared with the vectorized ones on 1M geometries
+N_CONVERTED = 1_000_000
+# the time and peak memory of the wkb_geometry column are compared on 1M points
+N_ENCODED = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def polygons():
+    return gpd.GeoDataFrame(
+        {"id": range(N_POLYGONS)}, geometry=make_polygons(N_POLYGONS), crs=3826
+    )
+
+
+@pytest.fixture(scope="module")
+def many_polygons():
+    return gpd.GeoSeries(make_polygons(N_CONVERTED, quad_segs=2), crs=3826)
+
+
+@pytest.fixture(scope="module")
+def many_lines():
+    return gpd.GeoSeries(make_lines(N_CONVERTED), crs=3826)
+
+
+@pytest.mark.parametrize("transformer", ["cached", "uncached"])
+def bench_get_transformer(benchmark, transformer):
+    if transformer == "cached":
+        get_transformer(3826, 4326)
+        benchmark(get_transformer, 3826, 4326)
+    else:
+        # the function without lru_cache, like creating a Transformer per call
+        benchmark(get_transformer.__wrapped__, 3826, 4326)
+
+
+@pytest.mark.parametrize("path", ["to_crs", "cached", "uncached"])
+def bench_transform_xy(benchmark, path):
+    x, y = make_points(N_POINTS)
+    if path == "to_crs":
+        # the former path, build the points then reproject them by geopandas
+        benchmark(
+            lambda: gpd.GeoSeries(gpd.points_from_xy(x, y), crs=3826).to_crs(epsg=4326)
+        )
+    elif path == "cached":
+        benchmark(transform_xy, x, y, from_crs=3826)
+    else:
+        benchmark(
+            lambda: get_transformer.__wrapped__(3826, 4326).transform(
+                x.to_numpy(), y.to_numpy()
+            )
+        )
+
+
+def bench_add_point_wkbgeometry_column_to_df(benchmark):
+    x, y = make_points(N_POINTS)
+    data = pd.DataFrame({"id": range(N_POINTS)})
+    benchmark(add_point_wkbgeometry_column_to_df, data, x, y, from_crs=3826)
+
+
+@pytest.mark.parametrize("path", ["wktelement", "wkbelement", "ewkb"])
+def bench_convert_geoseries_to_ewkb(benchmark, trace_memory, path):
+    x, y = make_points(N_ENCODED)
+    geos = gpd.GeoSeries(gpd.points_from_xy(x, y), crs=3826)
+    if path == "wktelement":
+        # the former per-row path of the wkb_geometry column
+        func = partial(geos.apply, lambda geo: WKTElement(geo.wkt, srid=3826))
+    elif path == "wkbelement":
+        func = partial(geos.apply, lambda geo: WKBElement(geo.wkb, srid=3826))
+    else:
+        func = partial(convert_geoseries_to_ewkb, geos, srid=3826)
+    trace_memory(func)
+    benchmark(func)
+
+
+def bench_convert_geometry_to_wkbgeometry(benchmark, polygons):
+    benchmark(convert_geometry_to_wkbgeometry, polygons, from_crs=3826)
+
+
+@pytest.mark.parametrize("path", ["apply", "vectorized"])
+def bench_convert_geoseries_to_2d(benchmark, many_polygons, path):
+    geos = gpd.GeoSeries(shapely.force_3d(many_polygons.values), crs=3826)
+    if path == "apply":
+        benchmark(geos.apply, convert_3d_polygon_to_2d_polygon)
+    else:
+        benchmark(convert_geoseries_to_2d, geos)
+
+
+@pytest.mark.parametrize("path", ["apply", "vectorized"])
+def bench_convert_geoseries_to_multipolygon(benchmark, many_polygons, path):
+    if path == "apply":
+        benchmark(many_polygons.apply, convert_polygon_to_multipolygon)
+    else:
+        benchmark(convert_geoseries_to_multipolygon, many_polygons)
+
+
+@pytest.mark.parametrize("path", ["apply", "vectorized"])
+def bench_convert_geoseries_to_multilinestring(benchmark, many_lines, path):
+    if path == "apply":
+        benchmark(many_lines.apply, convert_linestring_to_multilinestring)
+    else:
+        benchmark(convert_geoseries_to_multilinestring, many_lines)
+
+
+def bench_validate_geometry(benchmark, polygons):
+    benchmark(validate_geometry, polygons, "MultiPolygon", is_print=False)
+
+
+def bench_simplify_geoseries(benchmark, polygons):
+    benchmark(simplify_geoseries, polygons.geometry, tolerance=5, is_print=False)
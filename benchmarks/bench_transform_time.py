@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+from data_generators import make_times
+from utils.transform_time import (
+    convert_datetime_to_epoch,
+    convert_str_to_time_format,
+    normalize_chinese_time,
+    omit_chinese_string_in_time,
+)
+
+# 1M-row timestamp columns, the scale named by the requests
+N_ROWS = 1_000_000
+
+
+@pytest.mark.parametrize("cache", [False, True])
+@pytest.mark.parametrize("n_unique", [None, 1000])
+def bench_convert_minguo_time(benchmark, cache, n_unique):
+    times = make_times(N_ROWS, n_unique=n_unique)
+    benchmark(
+        convert_str_to_time_format,
+        times,
+        from_format="%TY/%m/%d %H:%M:%S",
+        cache=cache,
+    )
+
+
+def bench_convert_minguo_date(benchmark):
+    # like 發照日期 of building permits
+    times = make_times(N_ROWS, time_format="%TY%m%d")
+    benchmark(convert_str_to_time_format, times, from_format="%TY%m%d", cache=False)
+
+
+@pytest.mark.parametrize("string_dtype", ["object", "string[pyarrow]"])
+def bench_convert_guessed_format(benchmark, string_dtype):
+    times = make_times(N_ROWS, time_format="%Y-%m-%d %H:%M:%S").astype(string_dtype)
+    benchmark(convert_str_to_time_format, times, cache=False)
+
+
+@pytest.mark.parametrize("path", ["apply", "vectorized"])
+def bench_normalize_chinese_time(benchmark, path):
+    times = make_times(N_ROWS, time_format="%Y/%m/%d %p %I:%M:%S.000")
+    times = times.str.replace("AM", "上午").str.replace("PM", "下午")
+    if path == "apply":
+        # the former usage, which also returns strings to be parsed again
+        benchmark(times.apply, omit_chinese_string_in_time)
+    else:
+        benchmark(normalize_chinese_time, times)
+
+
+def bench_convert_datetime_to_epoch(benchmark):
+    times = convert_str_to_time_format(
+        make_times(N_ROWS), from_format="%TY/%m/%d %H:%M:%S"
+    )
+    benchmark(convert_datetime_to_epoch, times)
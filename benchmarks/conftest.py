@@ -0,0 +1,70 @@
+"""
+Benchmarks of the `utils` package, run by pytest-benchmark on synthetic seeded data.
+
+    pip install pytest-benchmark
+    pytest benchmarks                                     # run all benchmarks
+    pytest benchmarks --benchmark-save=baseline           # save a new JSON baseline
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:20%
+
+The JSON results are saved under `benchmarks/baselines/<machine>/`, so compare only with the
+baselines of the same machine. The load benchmarks need a PostgreSQL with PostGIS, set by
+`BENCHMARK_DB_URI` (default is `READY_DATA_DB_URI` of `settings.global_config`), and are skipped
+if it can't be connected.
+"""
+
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCHMARK_PATH, "..", "dags"))
+
+# default storage of pytest-benchmark, replaced by the tracked baselines folder
+_DEFAULT_STORAGE = "file://./.benchmarks"
+BASELINE_PATH = os.path.join(BENCHMARK_PATH, "baselines")
+
+
+def pytest_configure(config):
+    if getattr(config.option, "benchmark_storage", None) == _DEFAULT_STORAGE:
+        config.option.benchmark_storage = f"file://{BASELINE_PATH}"
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    """
+    The engine of the benchmark database, skip the test if it can't be connected.
+    """
+    from settings.global_config import READY_DATA_DB_URI
+    from sqlalchemy import text
+    from utils.db_engine import get_engine
+
+    engine = get_engine(os.environ.get("BENCHMARK_DB_URI", READY_DATA_DB_URI))
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as error:
+        pytest.skip(f"Benchmark database is not available: {error}")
+    return engine
+
+
+@pytest.fixture
+def trace_memory(benchmark):
+    """
+    Run a function once under tracemalloc, and save the peak of the memory allocated by Python
+    and numpy in MB to the `peak_mb` extra info of the benchmark, which is kept in the JSON
+    results. Memory allocated by GEOS or Arrow outside the Python allocator is not traced.
+    """
+
+    def trace(func, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_mb"] = round(peak / 2**20, 1)
+        return peak
+
+    return trace
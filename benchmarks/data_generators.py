@@ -0,0 +1,151 @@
+"""
+Synthetic data generators of the benchmarks. All generators are seeded, so every run benchmarks
+the same data.
+"""
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import shapely
+
+ADDR_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "dags",
+    "utils",
+    "preprocess",
+    "addr.csv",
+)
+# the bounds of Taipei in EPSG:3826 (TWD97)
+TAIPEI_BOUNDS_3826 = (296000, 2761000, 317000, 2789000)
+# the time range of the generated times, the Minguo year 100-113
+TIME_START = pd.Timestamp("2011-01-01")
+TIME_END = pd.Timestamp("2024-12-31")
+
+
+def make_addresses(n: int, seed=0) -> pd.Series:
+    """
+    Resample the real addresses of `preprocess/addr.csv` to `n` rows. The house numbers are
+    randomized so most addresses are unique, and some digits are changed to full-width or
+    followed by remarks in brackets, like the raw data of the feeds.
+    """
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(ADDR_PATH)["addr"].dropna().to_numpy(dtype=object)
+    numbers = pd.Series(rng.integers(1, 400, n).astype(str))
+    addresses = pd.Series(
+        [
+            re.sub(r"\d+號", f"{number}號", address, count=1)
+            for address, number in zip(rng.choice(base, n), numbers)
+        ]
+    )
+    is_full_width = rng.random(n) < 0.1
+    addresses[is_full_width] = addresses[is_full_width].str.translate(
+        {ord(str(i)): chr(0xFF10 + i) for i in range(10)}
+    )
+    has_remark = rng.random(n) < 0.1
+    addresses[has_remark] = addresses[has_remark] + "(" + numbers[has_remark] + "室)"
+    return addresses
+
+
+def make_points(n: int, seed=0) -> tuple:
+    """
+    Random x and y in Taipei, in EPSG:3826.
+    """
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = TAIPEI_BOUNDS_3826
+    x = pd.Series(rng.uniform(minx, maxx, n))
+    y = pd.Series(rng.uniform(miny, maxy, n))
+    return x, y
+
+
+def make_polygons(n: int, seed=0, quad_segs=8) -> np.ndarray:
+    """
+    Random circles in Taipei, in EPSG:3826, with 4 * `quad_segs` vertices each. Some of them
+    are invalid bow-tie polygons, so validation has work to do.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = make_points(n, seed)
+    radius = rng.uniform(5, 200, n)
+    polygons = shapely.buffer(shapely.points(x, y), radius, quad_segs=quad_segs)
+    is_bowtie = rng.random(n) < 0.05
+    bowtie_x, bowtie_y = x[is_bowtie].to_numpy(), y[is_bowtie].to_numpy()
+    polygons[is_bowtie] = shapely.polygons(
+        np.stack(
+            [
+                np.column_stack([bowtie_x, bowtie_y]),
+                np.column_stack([bowtie_x + 10, bowtie_y + 10]),
+                np.column_stack([bowtie_x + 10, bowtie_y]),
+                np.column_stack([bowtie_x, bowtie_y + 10]),
+            ],
+            axis=1,
+        )
+    )
+    return polygons
+
+
+def make_lines(n: int, seed=0, n_vertices=8) -> np.ndarray:
+    """
+    Random walks in Taipei, in EPSG:3826, with `n_vertices` vertices and steps up to 50 meters.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = make_points(n, seed)
+    steps = rng.uniform(-50, 50, (n, n_vertices - 1, 2))
+    coords = np.concatenate(
+        [np.column_stack([x, y])[:, np.newaxis], steps], axis=1
+    ).cumsum(axis=1)
+    return shapely.linestrings(coords)
+
+
+def make_times(n: int, seed=0, n_unique=None, time_format="%TY/%m/%d %H:%M:%S"):
+    """
+    Random time strings of 2011-2024 in `time_format`, where '%TY' is the Minguo year.
+    `n_unique` limits the number of unique values, like the update time of a feed. Default is
+    None, which means almost all values are unique.
+    """
+    rng = np.random.default_rng(seed)
+    span = int((TIME_END - TIME_START).total_seconds())
+    seconds = rng.integers(0, span, n_unique or n)
+    if n_unique:
+        seconds = rng.choice(seconds, n)
+    times = TIME_START + pd.to_timedelta(seconds, unit="s")
+    minguo_year = pd.Series((times.year - 1911).astype(str))
+    pieces = time_format.split("%TY")
+    result = pd.Series(times.strftime(pieces[0])) if pieces[0] else ""
+    for piece in pieces[1:]:
+        result = result + minguo_year
+        if piece:
+            result = result + pd.Series(times.strftime(piece))
+    return result
+
+
+def make_data_taipei_pages(n: int, page_size=1000, seed=0) -> list:
+    """
+    The JSON responses of Data.taipei API for a dataset of `n` records, one dict per page.
+    The first element is the response without offset, which only the count is read from.
+    """
+    rng = np.random.default_rng(seed)
+    addresses = make_addresses(n, seed)
+    x, y = make_points(n, seed)
+    records = [
+        {
+            "_id": i + 1,
+            "_importdate": {
+                "date": "2024-03-01 14:46:51.602832",
+                "timezone_type": 3,
+                "timezone": "Asia/Taipei",
+            },
+            "機構名稱": f"機構{rng.integers(0, 1000)}",
+            "地址": addresses[i],
+            "x": f"{x[i]:.2f}",
+            "y": f"{y[i]:.2f}",
+        }
+        for i in range(n)
+    ]
+    pages = [{"result": {"count": n, "results": records[:page_size]}}]
+    for offset in range(0, n + 1, page_size):
+        pages.append(
+            {"result": {"count": n, "results": records[offset : offset + page_size]}}
+        )
+    return pages
@@ -7,11 +7,14 @@ import xml.etree.ElementTree as ET
 
 import pandas as pd
 import requests
-from settings.global_config import DATA_PATH, READY_DATA_DB_URI
-from sqlalchemy import create_engine
+from settings.global_config import DATA_PATH
+from utils.db_engine import get_engine
 from utils.extract_stage import get_data_taipei_file_last_modified_time
 from utils.load_stage import save_dataframe_to_postgresql
-from utils.transform_time import convert_str_to_time_format
+from utils.transform_time import (
+    convert_datetime_to_epoch,
+    convert_str_to_time_format,
+)
 
 # Config
 URL = "https://data.taipei/api/frontstage/tpeod/dataset/resource.download?rid=43624c8e-c768-4b3c-93c4-595f5af7a9cb"
@@ -64,11 +67,11 @@ data = raw_data.copy()
 # standardize time
 data["data_time"] = convert_str_to_time_format(data["data_time"])
 data["發照日期"] = convert_str_to_time_format(data["發照日期"], from_format="%TY%m%d")
-data["epoch_time"] = data["發照日期"].map(lambda x: x.timestamp())
+data["epoch_time"] = convert_datetime_to_epoch(data["發照日期"])
 ready_data = data
 
 # Load
-engine = create_engine(READY_DATA_DB_URI)
+engine = get_engine()
 save_dataframe_to_postgresql(
     engine,
     data=ready_data,
@@ -4,13 +4,16 @@ import sys
 sys.path.append(os.path.join(os.getcwd(), "dags"))
 
 import geopandas as gpd
-from settings.global_config import DATA_PATH, READY_DATA_DB_URI
-from sqlalchemy import create_engine
+from settings.global_config import DATA_PATH, MBTILES_ENABLED
+from utils.db_engine import get_engine
 from utils.extract_stage import download_file, unzip_file_to_target_folder
+from utils.instrumentation import RunMetrics, StageMetrics
 from utils.load_stage import save_geodataframe_to_postgresql
+from utils.tile_stage import save_geodataframe_to_mbtiles
 from utils.transform_geometry import (
     convert_geometry_to_wkbgeometry,
-    convert_polygon_to_multipolygon,
+    simplify_geoseries,
+    validate_geometry,
 )
 
 # Config
@@ -23,67 +26,96 @@ LOAD_BEHAVIOR = "current+history"
 DEFAULT_TABLE = "patrol_debrisarea"
 HISTORY_TABLE = "patrol_debrisarea_history"
 GEOMETRY_TYPE = "MultiPolygon"
+# simplification tolerance and precision grid in meters (EPSG:3826)
+SIMPLIFY_TOLERANCE = 0.5
+GRID_SIZE = 0.01
+MVT_MIN_ZOOM = 10
+MVT_MAX_ZOOM = 16
 
-# Extract shpfile
-zip_file = download_file(FILE_NAME, URL)
-unzip_file_to_target_folder(zip_file, unzip_path)
-target_shp_file = [f for f in os.listdir(unzip_path) if f.endswith("shp")][0]
-raw_data = gpd.read_file(
-    f"{unzip_path}/{target_shp_file}", encoding=ENCODING, from_crs=FROM_CRS
-)
+# the stages below are summarized in one line when the run finishes
+with RunMetrics(table=DEFAULT_TABLE):
+    # Extract shpfile
+    with StageMetrics("extract", table=DEFAULT_TABLE) as metrics:
+        zip_file = download_file(FILE_NAME, URL)
+        unzip_file_to_target_folder(zip_file, unzip_path)
+        target_shp_file = [f for f in os.listdir(unzip_path) if f.endswith("shp")][0]
+        raw_data = gpd.read_file(
+            f"{unzip_path}/{target_shp_file}", encoding=ENCODING, from_crs=FROM_CRS
+        )
+        metrics.add_rows(len(raw_data))
 
-# Transform
-gdata = raw_data.copy()
-# rename
-gdata.columns = gdata.columns.str.lower()
-gdata = gdata.rename(
-    columns={
-        "id": "id",
-        "debrisno": "debrisno",  # 土石流潛勢溪流編號
-        "county": "county",  # 縣市
-        "town": "town",  # 鄉鎮市區
-        "vill": "vill",  # 村里
-        "overflowno": "overflowno",  # 溢流點編號
-        "overflow_x": "overflow_x",
-        "overflow_y": "overflow_y",
-        "address": "address",  # 保全住戶地址
-        "total_res": "total_res",  # 影響範圍內保全住戶總數
-        "res_class": "res_class",  # 影響範圍內保全住戶戶數級距
-        "risk": "risk",  # 風險等級
-        "dbno_old": "dbno_old",  # 土石流潛勢溪流前次編號
-    }
-)
-# geometry
-# there some polygon and multipolygon in geometry column, convert them all to multipolygon
-gdata["geometry"] = gdata["geometry"].apply(convert_polygon_to_multipolygon)
-gdata = convert_geometry_to_wkbgeometry(gdata, from_crs=FROM_CRS)
-# secelt columns
-ready_data = gdata[
-    [
-        "id",
-        "debrisno",
-        "county",
-        "town",
-        "vill",
-        "overflowno",
-        "overflow_x",
-        "overflow_y",
-        "address",
-        "total_res",
-        "res_class",
-        "risk",
-        "dbno_old",
-        "wkb_geometry",
-    ]
-]
+    # Transform
+    with StageMetrics("transform", table=DEFAULT_TABLE) as metrics:
+        gdata = raw_data.copy()
+        # rename
+        gdata.columns = gdata.columns.str.lower()
+        gdata = gdata.rename(
+            columns={
+                "id": "id",
+                "debrisno": "debrisno",  # 土石流潛勢溪流編號
+                "county": "county",  # 縣市
+                "town": "town",  # 鄉鎮市區
+                "vill": "vill",  # 村里
+                "overflowno": "overflowno",  # 溢流點編號
+                "overflow_x": "overflow_x",
+                "overflow_y": "overflow_y",
+                "address": "address",  # 保全住戶地址
+                "total_res": "total_res",  # 影響範圍內保全住戶總數
+                "res_class": "res_class",  # 影響範圍內保全住戶戶數級距
+                "risk": "risk",  # 風險等級
+                "dbno_old": "dbno_old",  # 土石流潛勢溪流前次編號
+            }
+        )
+        # geometry
+        # there some polygon and multipolygon in geometry column, convert them all to multipolygon
+        # invalid geometries are repaired, and empty geometries are dropped
+        gdata, _ = validate_geometry(gdata, GEOMETRY_TYPE)
+        # drop the vertices which can't be seen on the dashboard
+        gdata["geometry"], _ = simplify_geoseries(
+            gdata["geometry"], tolerance=SIMPLIFY_TOLERANCE, grid_size=GRID_SIZE
+        )
+        gdata = convert_geometry_to_wkbgeometry(gdata, from_crs=FROM_CRS)
+        # secelt columns
+        ready_data = gdata[
+            [
+                "id",
+                "debrisno",
+                "county",
+                "town",
+                "vill",
+                "overflowno",
+                "overflow_x",
+                "overflow_y",
+                "address",
+                "total_res",
+                "res_class",
+                "risk",
+                "dbno_old",
+                "wkb_geometry",
+            ]
+        ]
+        metrics.add_rows(len(ready_data))
 
-# Load
-engine = create_engine(READY_DATA_DB_URI)
-save_geodataframe_to_postgresql(
-    engine,
-    gdata=ready_data,
-    load_behavior=LOAD_BEHAVIOR,
-    default_table=DEFAULT_TABLE,
-    history_table=HISTORY_TABLE,
-    geometry_type=GEOMETRY_TYPE,
-)
+    # Load
+    engine = get_engine()
+    save_geodataframe_to_postgresql(
+        engine,
+        gdata=ready_data,
+        load_behavior=LOAD_BEHAVIOR,
+        default_table=DEFAULT_TABLE,
+        history_table=HISTORY_TABLE,
+        geometry_type=GEOMETRY_TYPE,
+    )
+
+    # Tiles
+    # pre-render the layer to vector tiles, so the dashboard doesn't need to load the whole layer
+    if MBTILES_ENABLED and (__name__ == "__main__"):
+        with StageMetrics("tile", table=DEFAULT_TABLE) as metrics:
+            save_geodataframe_to_mbtiles(
+                gdata,
+                layer_name=DEFAULT_TABLE,
+                min_zoom=MVT_MIN_ZOOM,
+                max_zoom=MVT_MAX_ZOOM,
+                property_cols=ready_data.columns.drop("wkb_geometry").tolist(),
+            )
+            metrics.add_rows(len(gdata))
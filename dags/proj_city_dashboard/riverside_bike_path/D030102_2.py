@@ -6,9 +6,8 @@ import xml.etree.ElementTree as ET
 
 import geopandas as gpd
 import pandas as pd
-from settings.global_config import READY_DATA_DB_URI
 from shapely.geometry import LineString
-from sqlalchemy import create_engine
+from utils.db_engine import get_engine
 from utils.extract_stage import (
     download_file,
     get_data_taipei_file_last_modified_time,
@@ -17,7 +16,8 @@ from utils.extract_stage import (
 from utils.load_stage import save_geodataframe_to_postgresql
 from utils.transform_geometry import (
     convert_geometry_to_wkbgeometry,
-    convert_linestring_to_multilinestring
+    simplify_geoseries,
+    validate_geometry
 )
 from utils.transform_time import convert_str_to_time_format
 
@@ -28,6 +28,9 @@ HISTORY_TABLE = "work_riverside_bike_path_history"
 URL = "https://data.taipei/api/frontstage/tpeod/dataset/resource.download?rid=0912d803-688f-493a-b682-27da729ed593"
 PAGE_ID = "4fefd1b3-58b9-4dab-af00-724c715b0c58"
 GEOMETRY_TYPE = "MultiLineStringZ"
+# simplification tolerance and precision grid in degrees (EPSG:4326), about 0.1 m and 1 cm
+SIMPLIFY_TOLERANCE = 1e-6
+GRID_SIZE = 1e-7
 FILE_NAME = "riverside_bike_path.kml"
 FROM_CRS = 4326
 
@@ -53,7 +56,12 @@ gdata["item"] = gdata['item'].str.strip().astype(int)
 # time
 gdata["data_time"] = convert_str_to_time_format(gdata["data_time"])
 # geometry
-gdata["geometry"] = gdata["geometry"].apply(convert_linestring_to_multilinestring)
+# convert all to multilinestringz, repair invalid geometries and drop empty geometries
+gdata, _ = validate_geometry(gdata, GEOMETRY_TYPE)
+# drop the vertices which can't be seen on the dashboard
+gdata["geometry"], _ = simplify_geoseries(
+    gdata["geometry"], tolerance=SIMPLIFY_TOLERANCE, grid_size=GRID_SIZE
+)
 gdata = convert_geometry_to_wkbgeometry(gdata, from_crs=FROM_CRS)
 # select column
 ready_data = gdata[
@@ -70,7 +78,7 @@ ready_data = gdata[
 ]
 
 # Load
-engine = create_engine(READY_DATA_DB_URI)
+engine = get_engine()
 save_geodataframe_to_postgresql(
     engine,
     gdata=ready_data,
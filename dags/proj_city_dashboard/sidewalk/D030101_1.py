@@ -6,11 +6,16 @@ from datetime import datetime
 
 import geopandas as gpd
 import pytz
-from settings.global_config import READY_DATA_DB_URI
-from sqlalchemy import create_engine
+from settings.global_config import MBTILES_ENABLED
+from utils.db_engine import get_engine
 from utils.extract_stage import download_file
 from utils.load_stage import save_geodataframe_to_postgresql
-from utils.transform_geometry import convert_geometry_to_wkbgeometry
+from utils.tile_stage import save_geodataframe_to_mbtiles
+from utils.transform_geometry import (
+    convert_geometry_to_wkbgeometry,
+    simplify_geoseries,
+    validate_geometry,
+)
 from utils.transform_time import convert_str_to_time_format
 
 # Config
@@ -23,6 +28,11 @@ LOAD_BEHAVIOR = "current+history"
 DEFAULT_TABLE = "work_sidewalk"
 HISTORY_TABLE = "work_sidewalk_history"
 GEOMETRY_TYPE = "MultiPolygon"
+# simplification tolerance and precision grid in meters (EPSG:3826)
+SIMPLIFY_TOLERANCE = 0.1
+GRID_SIZE = 0.01
+MVT_MIN_ZOOM = 10
+MVT_MAX_ZOOM = 16
 
 # Extract
 local_file = download_file(FILE_NAME, URL, timeout=300)
@@ -36,6 +46,11 @@ gdata["objectid"] = gdata["objectid"].astype(str)
 gdata["data_time"] = datetime.now(tz=TAIPEI_TZ).replace(microsecond=0)
 gdata["data_time"] = convert_str_to_time_format(gdata["data_time"])
 # geometry
+gdata, _ = validate_geometry(gdata, GEOMETRY_TYPE)
+# drop the vertices which can't be seen on the dashboard
+gdata["geometry"], _ = simplify_geoseries(
+    gdata["geometry"], tolerance=SIMPLIFY_TOLERANCE, grid_size=GRID_SIZE
+)
 gdata = convert_geometry_to_wkbgeometry(gdata, from_crs=FROM_CRS)
 # reshape
 col_map = {
@@ -69,7 +84,7 @@ ready_data = gdata[
 ]
 
 # Load
-engine = create_engine(READY_DATA_DB_URI)
+engine = get_engine()
 save_geodataframe_to_postgresql(
     engine,
     gdata=ready_data,
@@ -78,3 +93,14 @@ save_geodataframe_to_postgresql(
     history_table=HISTORY_TABLE,
     geometry_type=GEOMETRY_TYPE,
 )
+
+# Tiles
+# pre-render the layer to vector tiles, so the dashboard doesn't need to load the whole layer
+if MBTILES_ENABLED and (__name__ == "__main__"):
+    save_geodataframe_to_mbtiles(
+        gdata,
+        layer_name=DEFAULT_TABLE,
+        min_zoom=MVT_MIN_ZOOM,
+        max_zoom=MVT_MAX_ZOOM,
+        property_cols=ready_data.columns.drop("wkb_geometry").tolist(),
+    )
@@ -4,8 +4,7 @@ import sys
 dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
 sys.path.append(dags_path)
 import pandas as pd
-from settings.global_config import READY_DATA_DB_URI
-from sqlalchemy import create_engine
+from utils.db_engine import get_engine
 from utils.extract_stage import (
     get_data_taipei_api,
     get_data_taipei_file_last_modified_time
@@ -48,7 +47,7 @@ ready_data = gdata[["data_time", "name", "addr", "lng", "lat", "wkb_geometry"]]
 
 # Load
 # Load data to DB
-engine = create_engine(READY_DATA_DB_URI)
+engine = get_engine()
 save_geodataframe_to_postgresql(
     engine,
     gdata=ready_data,
@@ -30,3 +30,51 @@ IP = "localhost"
 PORT = "5433"
 DATABASE_NAME = "dashboard"
 READY_DATA_DB_URI = f"postgresql://{USER_NAME}:{PASSWORD}@{IP}:{PORT}/{DATABASE_NAME}"
+
+# DB_POOL_* controls the connection pool of the shared engine created by `utils.db_engine`.
+# Every DAG running in the same worker process reuses one engine per URI, so keep the pool small.
+# DB_POOL_PRE_PING checks a pooled connection before using it, which avoids errors from
+#   connections closed by the database server while they are idle in the pool.
+# DB_POOL_RECYCLE is the number of seconds after which a pooled connection is replaced.
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_PRE_PING = True
+DB_POOL_RECYCLE = 1800
+
+# HISTORY_PARTITION_*_MONTH is the month range of the monthly partitions created for `_history`
+#   tables by `utils.generate_sql_to_create_DB_table`, like "2024-01". Both are included.
+# Rows out of the range are stored in the default partition, so extend the range before it ends.
+HISTORY_PARTITION_START_MONTH = "2024-01"
+HISTORY_PARTITION_END_MONTH = "2024-12"
+
+# LOAD_CHUNKSIZE is the number of rows written to the database per INSERT batch by `utils.load_stage`.
+# It bounds the client memory used by one batch.
+# LOAD_METHOD is the insert method of `utils.load_stage`, should be one of
+#   "execute_values": one multi-row INSERT per batch by psycopg2 `execute_values`, fastest.
+#   "multi": one multi-row INSERT per batch built by pandas.
+#   None: one INSERT per row (executemany), the pandas default.
+LOAD_CHUNKSIZE = 10000
+LOAD_METHOD = "execute_values"
+
+# PARQUET_COMPRESSION is the compression codec of the stage outputs saved by
+#   `utils.load_stage.save_stage_parquet`, should be one of "zstd", "snappy", "gzip", None.
+PARQUET_COMPRESSION = "zstd"
+
+# STRING_DTYPE is the pandas dtype of the string columns processed by `utils.transform_address`.
+# "string[pyarrow]" stores the strings in Arrow buffers, which are smaller than Python objects
+#   for Chinese text, and `.str` methods run in pyarrow compute kernels.
+# Set it to "object" to use the pandas default.
+STRING_DTYPE = "string[pyarrow]"
+
+# STAGE_PROFILE_ENABLED controls whether `utils.instrumentation.StageMetrics` dumps the cProfile
+#   stats of every stage to DATA_PATH/profile, which can be opened by `pstats` or snakeviz.
+# It also makes `utils.load_stage` measure the payload bytes including object values.
+# Profiling slows down Python code, so it's turned on per run by the environment variable
+#   DAG_STAGE_PROFILE=1 instead of here.
+STAGE_PROFILE_ENABLED = os.environ.get("DAG_STAGE_PROFILE", "0") == "1"
+
+# MBTILES_ENABLED controls whether the DAGs of heavy layers pre-render their data to vector tiles
+#   by `utils.tile_stage.save_geodataframe_to_mbtiles` after loading.
+# Tiling starts a process pool and takes much longer than loading, so it's turned on by the
+#   environment variable DAG_MBTILES=1 only where the dashboard serves the tiles.
+MBTILES_ENABLED = os.environ.get("DAG_MBTILES", "0") == "1"
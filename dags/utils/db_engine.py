@@ -0,0 +1,79 @@
+import atexit
+import threading
+
+from settings.global_config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    READY_DATA_DB_URI,
+)
+from sqlalchemy import create_engine
+
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def get_engine(db_uri: str = READY_DATA_DB_URI):
+    """
+    Get the shared sqlalchemy engine of `db_uri`.
+    The engine is created lazily at the first call and reused by every later call with the same
+    `db_uri`, so all DAG scripts and load functions running in the same worker process share one
+    connection pool instead of creating a new engine (and new connections) every time.
+    The pool is configured by `DB_POOL_SIZE`, `DB_MAX_OVERFLOW`, `DB_POOL_PRE_PING` and
+    `DB_POOL_RECYCLE` in `settings.global_config`.
+
+    Args:
+        db_uri: str, the URI of the database. Default is `READY_DATA_DB_URI`.
+
+    Returns: sqlalchemy.engine.base.Engine
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        from utils.db_engine import get_engine
+
+        engine = get_engine()
+        print(engine is get_engine())
+        ```
+        ```
+        >>> print(engine is get_engine())
+        True
+        ```
+    """
+    engine = _ENGINES.get(db_uri)
+    if engine is not None:
+        return engine
+
+    with _ENGINES_LOCK:
+        # check again, another thread could create the engine while waiting for the lock
+        engine = _ENGINES.get(db_uri)
+        if engine is None:
+            engine = create_engine(
+                db_uri,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_pre_ping=DB_POOL_PRE_PING,
+                pool_recycle=DB_POOL_RECYCLE,
+            )
+            _ENGINES[db_uri] = engine
+    return engine
+
+
+def dispose_engines():
+    """
+    Close all pooled connections and remove all shared engines.
+    It is registered to run at the process exit, so the DAG scripts don't need to call it.
+    """
+    with _ENGINES_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+
+
+# close the pooled connections once, when the process exits
+atexit.register(dispose_engines)
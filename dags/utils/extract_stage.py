@@ -4,6 +4,8 @@ from pathlib import Path
 
 import fiona
 import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
 import requests
 from settings.global_config import DATA_PATH, PROXIES
 
@@ -188,6 +190,55 @@ def read_kml(file):
     return df
 
 
+def read_stage_parquet(
+    file_name: str, columns=None, file_folder=DATA_PATH, memory_map=True
+):
+    """
+    Read the stage output saved by `utils.load_stage.save_stage_parquet`.
+    Only the `columns` are read from the file, and the file is memory-mapped, so reading a part
+    of a large file is fast and doesn't copy the whole file into memory.
+    GeoParquet is read as gpd.GeoDataFrame if any of its geometry columns is selected,
+    otherwise as pd.DataFrame.
+
+    Args:
+        file_name: str, file name, e.g. "heal_hospital_ready.parquet".
+        columns: list of str or None, columns to be read. Default is None, which means all.
+        file_folder: str, file folder path. Default is `DATA_PATH`.
+        memory_map: bool, whether to memory-map the file. Default is True.
+
+    Returns: pd.DataFrame or gpd.GeoDataFrame
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        from utils.extract_stage import read_stage_parquet
+
+        data = read_stage_parquet('test_ready.parquet', columns=['name'])
+        print(data)
+        ```
+        ```
+        >>> print(data)
+          name
+        0    A
+        1    B
+        ```
+    """
+    full_file_path = f"{file_folder}/{file_name}"
+    metadata = pq.read_schema(full_file_path).metadata or {}
+    geometry_cols = []
+    if b"geo" in metadata:
+        geometry_cols = list(json.loads(metadata[b"geo"])["columns"])
+
+    is_geo = any((columns is None) or (col in columns) for col in geometry_cols)
+    if is_geo:
+        return gpd.read_parquet(full_file_path, columns=columns, memory_map=memory_map)
+    return pd.read_parquet(full_file_path, columns=columns, memory_map=memory_map)
+
+
 def get_data_taipei_api(rid, timeout=60):
     """
     Retrieve data from Data.taipei API by automatically traversing all data.
@@ -1,5 +1,26 @@
+import math
+import re
+from datetime import date
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from geoalchemy2.elements import WKBElement, WKTElement
+from settings.global_config import (
+    HISTORY_PARTITION_END_MONTH,
+    HISTORY_PARTITION_START_MONTH,
+)
+from shapely.geometry.base import BaseGeometry
+
+
 def generate_sql_to_define_column(
-    table_name, col_map, is_add_ogc_fid=False, is_add_mtime=False, is_add_ctime=False
+    table_name,
+    col_map,
+    is_add_ogc_fid=False,
+    is_add_mtime=False,
+    is_add_ctime=False,
+    partition_col=None,
 ):
     """
     Generate SQL to define columns by converting the input dictionary into SQL text.
@@ -10,6 +31,9 @@ def generate_sql_to_define_column(
         is_add_ogc_fid (bool): Whether to add the OGC_FID column. Default is False.
         is_add_mtime (bool): Whether to add the MTIME column. Default is False.
         is_add_ctime (bool): Whether to add the CTIME column. Default is False.
+        partition_col (str): The partition key column of a partitioned table. Default is None.
+            The primary key of a partitioned table must include the partition key, so it is
+            added to the primary key when `is_add_ogc_fid` is True.
 
     Returns:
         str: SQL text defining the columns.
@@ -47,15 +71,127 @@ def generate_sql_to_define_column(
         col_sql += ctime_sql
 
     if is_add_ogc_fid:
+        pkey_cols = f"ogc_fid, {partition_col}" if partition_col else "ogc_fid"
         ofc_fid_sql = f"""
             \n        ,ogc_fid integer NOT NULL DEFAULT nextval('{table_name}_ogc_fid_seq'::regclass),
-            \n        CONSTRAINT {table_name}_pkey PRIMARY KEY (ogc_fid)
+            \n        CONSTRAINT {table_name}_pkey PRIMARY KEY ({pkey_cols})
         """
         col_sql += ofc_fid_sql
 
     return col_sql
 
 
+def _iterate_month(start_month, end_month):
+    """
+    Yield the first day of each month from `start_month` to `end_month`, both are str like
+    "2024-01" and included.
+    """
+    year, month = [int(ele) for ele in start_month.split("-")]
+    last_year, last_month = [int(ele) for ele in end_month.split("-")]
+    while (year, month) <= (last_year, last_month):
+        yield date(year, month, 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def generate_sql_to_create_monthly_partition(
+    table_name, start_month, end_month, utc_offset="+08:00"
+):
+    """
+    Generate SQL to create a partition for each month of a table partitioned by range of a time
+    column, and a default partition for the rows out of the range (include NULL).
+
+    Args:
+        table_name (str): The name of the partitioned table.
+        start_month (str): The first month to create partition, like "2024-01".
+        end_month (str): The last month to create partition, like "2024-12".
+        utc_offset (str): The UTC offset of the partition bounds. Default is "+08:00" (Taipei).
+
+    Returns:
+        str: SQL text to create the partitions.
+
+    ---- use case
+    sql = generate_sql_to_create_monthly_partition("heal_hospital_history", "2024-01", "2024-02")
+    print(sql)
+    >>> print(sql)
+    -- create partition
+    CREATE TABLE IF NOT EXISTS public.heal_hospital_history_y2024m01
+        PARTITION OF public.heal_hospital_history
+        FOR VALUES FROM ('2024-01-01 00:00:00+08:00') TO ('2024-02-01 00:00:00+08:00');
+    CREATE TABLE IF NOT EXISTS public.heal_hospital_history_y2024m02
+        PARTITION OF public.heal_hospital_history
+        FOR VALUES FROM ('2024-02-01 00:00:00+08:00') TO ('2024-03-01 00:00:00+08:00');
+    CREATE TABLE IF NOT EXISTS public.heal_hospital_history_default
+        PARTITION OF public.heal_hospital_history DEFAULT;
+    """
+    sql = "\n    -- create partition"
+    for month_start in _iterate_month(start_month, end_month):
+        if month_start.month == 12:
+            month_end = date(month_start.year + 1, 1, 1)
+        else:
+            month_end = date(month_start.year, month_start.month + 1, 1)
+        partition_name = f"{table_name}_y{month_start.year}m{month_start.month:02}"
+        sql += f"""
+    CREATE TABLE IF NOT EXISTS public.{partition_name}
+        PARTITION OF public.{table_name}
+        FOR VALUES FROM ('{month_start} 00:00:00{utc_offset}') TO ('{month_end} 00:00:00{utc_offset}');"""
+    sql += f"""
+    CREATE TABLE IF NOT EXISTS public.{table_name}_default
+        PARTITION OF public.{table_name} DEFAULT;
+    """
+    return sql
+
+
+def generate_sql_to_create_index(
+    table_name,
+    col_map,
+    is_add_geometry_index=True,
+    time_index_col=None,
+    time_index_method="brin",
+):
+    """
+    Generate SQL to create indexes for the geometry and time columns.
+    A GIST index on geometry columns speeds up the spatial filter of dashboard map queries, and an
+    index on the time column speeds up the time range query of history tables.
+    BRIN index is very small and fits time columns of append-only tables, which is physically
+    sorted by time. Use B-tree if the rows are not inserted in time order.
+
+    Args:
+        table_name (str): The name of the table.
+        col_map (dict): A dictionary containing column names as keys and column types as values.
+        is_add_geometry_index (bool): Whether to add GIST index to all columns with type
+            `geometry`. Default is True.
+        time_index_col (str): The time column to add index. Default is None, no time index.
+        time_index_method (str): The index method of time column, should be one of `brin`,
+            `btree`. Default is `brin`.
+
+    Returns:
+        str: SQL text to create the indexes.
+    """
+    if time_index_method not in ("brin", "btree"):
+        raise ValueError(
+            f"time_index_method should be one of `brin`, `btree`, but got {time_index_method}."
+        )
+
+    sql = ""
+    if is_add_geometry_index:
+        geometry_cols = [
+            col for col, col_type in col_map.items() if col_type.startswith("geometry")
+        ]
+        for col in geometry_cols:
+            sql += f"""
+    CREATE INDEX IF NOT EXISTS {table_name}_{col}_gist_idx
+        ON public.{table_name} USING gist ({col});"""
+
+    if time_index_col:
+        sql += f"""
+    CREATE INDEX IF NOT EXISTS {table_name}_{time_index_col}_{time_index_method}_idx
+        ON public.{table_name} USING {time_index_method} ({time_index_col});"""
+
+    if sql:
+        sql = "\n    -- create index" + sql + "\n"
+    return sql
+
+
 def generate_sql_to_create_db_table(
     table_name,
     col_map,
@@ -63,6 +199,12 @@ def generate_sql_to_create_db_table(
     is_add_ctime=False,
     is_add_ogc_fid=False,
     is_grant_socl_reader=False,
+    is_add_geometry_index=False,
+    time_index_col=None,
+    time_index_method="brin",
+    partition_col=None,
+    partition_start_month=HISTORY_PARTITION_START_MONTH,
+    partition_end_month=HISTORY_PARTITION_END_MONTH,
 ):
     """
     Generate SQL to create a database table based on the table name and column definitions.
@@ -74,19 +216,45 @@ def generate_sql_to_create_db_table(
         is_add_ctime (bool): Whether to add the CTIME column. Default is False.
         is_add_ogc_fid (bool): Whether to add the OGC_FID column. Default is False.
         is_grant_socl_reader (bool): Whether to grant SELECT permission to socl_reader. Default is False.
+        is_add_geometry_index (bool): Whether to add GIST index to geometry columns. Default is False.
+        time_index_col (str): The time column to add index, like "data_time". Default is None.
+        time_index_method (str): The index method of `time_index_col`, `brin` or `btree`.
+            Default is `brin`.
+        partition_col (str): The time column to partition the table by month, like "data_time".
+            Usually used for `_history` tables. Default is None, which means not partitioned.
+        partition_start_month (str): The first month partition, like "2024-01".
+            Default is `HISTORY_PARTITION_START_MONTH` of `settings.global_config`.
+        partition_end_month (str): The last month partition, like "2024-12".
+            Default is `HISTORY_PARTITION_END_MONTH` of `settings.global_config`.
+            Rows out of the range are stored in the default partition.
 
     Returns:
         str: SQL text to create the database table.
     """
     sql = ""
 
+    if partition_col and not (partition_start_month and partition_end_month):
+        raise ValueError(
+            "partition_start_month and partition_end_month should be provided when partition_col is given."
+        )
+
     col_sql = generate_sql_to_define_column(
         table_name,
         col_map,
         is_add_mtime=is_add_mtime,
         is_add_ctime=is_add_ctime,
         is_add_ogc_fid=is_add_ogc_fid,
+        partition_col=partition_col,
+    )
+
+    # partitioned table can't have storage parameters or a tablespace, the partitions have them
+    if partition_col:
+        table_option_sql = f"PARTITION BY RANGE ({partition_col});"
+    else:
+        table_option_sql = """WITH (
+        OIDS = FALSE
     )
+    TABLESPACE pg_default;"""
 
     create_table_sql = f"""
     -- create table
@@ -94,10 +262,7 @@ def generate_sql_to_create_db_table(
     (
         {col_sql}
     )
-    WITH (
-        OIDS = FALSE
-    )
-    TABLESPACE pg_default;
+    {table_option_sql}
     """
 
     grant_table_sql = f"""
@@ -150,6 +315,19 @@ def generate_sql_to_create_db_table(
     sql += create_table_sql
     sql += grant_table_sql
 
+    if partition_col:
+        sql += generate_sql_to_create_monthly_partition(
+            table_name, partition_start_month, partition_end_month
+        )
+
+    sql += generate_sql_to_create_index(
+        table_name,
+        col_map,
+        is_add_geometry_index=is_add_geometry_index,
+        time_index_col=time_index_col,
+        time_index_method=time_index_method,
+    )
+
     if is_add_mtime:
         sql += create_mtime_trigger_sql
 
@@ -186,6 +364,206 @@ def generate_sql_to_delete_db_table(table_name, is_add_mtime=True, is_add_ogc_fi
     return sql
 
 
+def _infer_integer_type(min_value, max_value):
+    """
+    Return the smallest PostgreSQL integer type which can store values in [min_value, max_value].
+    """
+    if (min_value >= -32768) and (max_value <= 32767):
+        return "smallint"
+    if (min_value >= -2147483648) and (max_value <= 2147483647):
+        return "integer"
+    return "bigint"
+
+
+def _to_shapely_array(series):
+    """
+    Convert a column of shapely geometry, WKTElement/WKBElement, (E)WKT or hex (E)WKB strings to
+    an array of shapely geometry. The SRID of EWKB and spatial elements is kept.
+    """
+    values = series.dropna()
+    if isinstance(series, gpd.GeoSeries):
+        # the public numpy conversion of GeometryArray, `GeometryArray.data` is internal
+        return np.asarray(values.values, dtype=object)
+    if len(values) == 0:
+        return np.array([], dtype=object)
+
+    sample = values.iloc[0]
+    if isinstance(sample, BaseGeometry):
+        return values.to_numpy()
+    if isinstance(sample, WKBElement):
+        geoms = shapely.from_wkb([ele.desc for ele in values])
+        srids = [ele.srid for ele in values]
+        return shapely.set_srid(geoms, srids)
+    if isinstance(sample, WKTElement):
+        geoms = shapely.from_wkt([ele.data for ele in values])
+        srids = [ele.srid for ele in values]
+        return shapely.set_srid(geoms, srids)
+    # strings, hex (E)WKB only contains hex digits
+    if re.fullmatch(r"[0-9A-Fa-f]+", str(sample)):
+        return shapely.from_wkb(values.to_numpy())
+    # EWKT like "SRID=4326;POINT (1 2)"
+    ewkt = values.astype(str).str.extract(r"^(?:SRID=(\d+);)?(.*)$")
+    geoms = shapely.from_wkt(ewkt[1].to_numpy())
+    srids = pd.to_numeric(ewkt[0], errors="coerce").fillna(0).astype(int).to_numpy()
+    return shapely.set_srid(geoms, srids)
+
+
+def _infer_geometry_type(series, default_srid=4326):
+    """
+    Infer `geometry({type},{srid})` of a geometry column.
+    Polygon and MultiPolygon (also for LineString, Point) mixed column is inferred as the Multi
+    type, which is the type after `convert_polygon_to_multipolygon`.
+    """
+    geoms = _to_shapely_array(series)
+    geoms = geoms[~shapely.is_empty(geoms)] if len(geoms) else geoms
+    if len(geoms) == 0:
+        return f"geometry(Geometry,{default_srid})"
+
+    geom_types = set(shapely.get_type_id(geoms).tolist())
+    type_names = {
+        0: "Point",
+        1: "LineString",
+        3: "Polygon",
+        4: "MultiPoint",
+        5: "MultiLineString",
+        6: "MultiPolygon",
+        7: "GeometryCollection",
+    }
+    multi_pairs = [{0, 4}, {1, 5}, {3, 6}]
+    if len(geom_types) == 1:
+        geometry_type = type_names.get(geom_types.pop(), "Geometry")
+    elif geom_types in multi_pairs:
+        geometry_type = type_names[max(geom_types)]
+    else:
+        geometry_type = "Geometry"
+    if shapely.has_z(geoms).any():
+        geometry_type += "Z"
+
+    if isinstance(series, gpd.GeoSeries) and (series.crs is not None):
+        srid = series.crs.to_epsg() or default_srid
+    else:
+        srids = shapely.get_srid(geoms)
+        srid = int(srids.max()) if srids.max() > 0 else default_srid
+    return f"geometry({geometry_type},{srid})"
+
+
+def generate_column_map_from_dataframe(
+    data,
+    geometry_cols=("wkb_geometry", "geometry"),
+    varchar_max_length=255,
+    varchar_length_scale=1.5,
+    default_srid=4326,
+):
+    """
+    Infer the `col_map` of `generate_sql_to_create_db_table` from a ready DataFrame or
+    GeoDataFrame, with the narrowest column types for the values in data. Narrower types make
+    smaller tables and faster scans.
+        - integer: smallint, integer or bigint by value range.
+        - float: double precision, even if all values are integral.
+        - bool: boolean.
+        - string: character varying(n), n is the max length multiplied by `varchar_length_scale`
+            to tolerate longer values in the future. text if n > `varchar_max_length`.
+        - datetime.date: date.
+        - tz-aware datetime: timestamp with time zone.
+        - naive datetime: date if all values are at midnight, else timestamp without time zone.
+        - geometry: geometry({type},{srid}) from the GeoSeries, or from the WKTElement,
+            WKBElement, EWKT or hex EWKB in the column.
+        - others: text.
+    Please review the result before creating the table, the data may not cover all cases.
+
+    Args:
+        data (pd.DataFrame or gpd.GeoDataFrame): The ready data to be saved.
+        geometry_cols (tuple): The columns to be inferred as geometry.
+            Default is ("wkb_geometry", "geometry").
+        varchar_max_length (int): The max length of character varying. Default is 255.
+        varchar_length_scale (float): The scale of max string length. Default is 1.5.
+        default_srid (int): The SRID used when it can't be inferred from data. Default is 4326.
+
+    Returns:
+        dict: A dictionary containing column names as keys and column types as values.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import pandas as pd
+        from utils.generate_sql_to_create_DB_table import (
+            generate_column_map_from_dataframe,
+            generate_sql_to_create_db_table,
+        )
+        from utils.transform_geometry import add_point_wkbgeometry_column_to_df
+        from utils.transform_time import convert_str_to_time_format
+
+        data = pd.DataFrame({
+            "data_time": convert_str_to_time_format(pd.Series(["2024-05-06 20:43:18"] * 2)),
+            "name": ["捷運科技大樓站", "捷運大安站"],
+            "bike_capacity": [28, 40],
+        })
+        gdata = add_point_wkbgeometry_column_to_df(
+            data, x=pd.Series([121.5436, 121.5434]), y=pd.Series([25.026, 25.033]), from_crs=4326
+        )
+        gdata = gdata.drop(columns=["geometry"])
+        col_map = generate_column_map_from_dataframe(gdata)
+        print(col_map)
+        sql = generate_sql_to_create_db_table("tran_ubike_station", col_map)
+        ```
+        ```
+        >>> print(col_map)
+        {'data_time': 'timestamp with time zone', 'name': 'character varying(11) COLLATE pg_catalog."default"', 'bike_capacity': 'smallint', 'lng': 'double precision', 'lat': 'double precision', 'wkb_geometry': 'geometry(Point,4326)'}
+        ```
+    """
+    col_map = {}
+    for col in data.columns:
+        series = data[col]
+        if col in geometry_cols or isinstance(series, gpd.GeoSeries):
+            col_map[col] = _infer_geometry_type(series, default_srid=default_srid)
+            continue
+
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            col_map[col] = "timestamp with time zone"
+            continue
+        if pd.api.types.is_datetime64_dtype(series.dtype):
+            times = series.dropna()
+            is_date = (times == times.dt.normalize()).all()
+            col_map[col] = "date" if is_date else "timestamp without time zone"
+            continue
+
+        inferred = pd.api.types.infer_dtype(series, skipna=True)
+        values = series.dropna()
+        if inferred == "boolean":
+            col_map[col] = "boolean"
+        elif inferred == "integer":
+            values = values.astype("int64")
+            col_map[col] = _infer_integer_type(values.min(), values.max())
+        elif inferred in ("floating", "mixed-integer-float", "decimal"):
+            # floats with integral values are kept, e.g. a measurement of 2.0 can be 2.5 later
+            col_map[col] = "double precision"
+        elif inferred == "string":
+            max_length = int(values.str.len().max())
+            varchar_length = max(1, math.ceil(max_length * varchar_length_scale))
+            if varchar_length > varchar_max_length:
+                col_map[col] = 'text COLLATE pg_catalog."default"'
+            else:
+                col_map[col] = (
+                    f'character varying({varchar_length}) COLLATE pg_catalog."default"'
+                )
+        elif inferred == "date":
+            col_map[col] = "date"
+        elif inferred == "datetime":
+            is_tz_aware = values.map(lambda ele: ele.tzinfo is not None).all()
+            if is_tz_aware:
+                col_map[col] = "timestamp with time zone"
+            else:
+                col_map[col] = "timestamp without time zone"
+        else:
+            col_map[col] = 'text COLLATE pg_catalog."default"'
+
+    return col_map
+
+
 def _show_smaple_column_type():
     """
     {'example_column_name': 'example_column_type'}
@@ -220,9 +598,10 @@ def _show_smaple_column_type():
 
 
 if __name__ == "__main__":
+    # run from the dags folder by `python -m utils.generate_sql_to_create_DB_table`
     # input
     IS_HISTRORY_TABLE = True
-    
+
     tname = "heal_hospital"
     column_map = {
         "data_time": "timestamp with time zone DEFAULT CURRENT_TIMESTAMP",
@@ -240,5 +619,13 @@ if __name__ == "__main__":
         drop_table_sql = generate_sql_to_delete_db_table(table)
         print(drop_table_sql)
 
-        create_table_sql = generate_sql_to_create_db_table(table, column_map)
+        is_history = table.endswith("_history")
+        create_table_sql = generate_sql_to_create_db_table(
+            table,
+            column_map,
+            is_add_geometry_index=True,
+            time_index_col="data_time",
+            # history table is partitioned by month of `data_time`, see HISTORY_PARTITION_*_MONTH
+            partition_col="data_time" if is_history else None,
+        )
         print(create_table_sql)
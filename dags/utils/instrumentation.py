@@ -0,0 +1,347 @@
+import cProfile
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+from settings.global_config import DATA_PATH, STAGE_PROFILE_ENABLED
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# The stages being recorded (outermost first) and the open `RunMetrics` of each thread.
+# They are per thread, so DAGs run in the threads of one worker don't mix their stages.
+_local = threading.local()
+# number of rows measured by `estimate_payload_bytes` to estimate the size of object values
+_PAYLOAD_SAMPLE_ROWS = 1000
+
+
+def _get_active_stages() -> list:
+    if not hasattr(_local, "active_stages"):
+        _local.active_stages = []
+    return _local.active_stages
+
+
+def _get_peak_rss_mb():
+    """
+    Get the peak resident set size of this process in MB, None if it's not supported.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in KB on Linux
+    peak = peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+    return round(peak, 1)
+
+
+def estimate_payload_bytes(data, deep=False) -> int:
+    """
+    Estimate the in-memory size of a pd.DataFrame or gpd.GeoDataFrame in bytes. It is the
+    approximate amount of data sent to the database.
+    By default the content of object values (strings, EWKB strings ...) is measured on
+    `_PAYLOAD_SAMPLE_ROWS` evenly spaced rows and scaled to all rows, so it's cheap for large
+    data. `deep=True` measures every value, which is a pass over all of them, so it's only for
+    profiling.
+    """
+    n_rows = len(data)
+    if deep or (n_rows <= _PAYLOAD_SAMPLE_ROWS):
+        return int(data.memory_usage(deep=True, index=False).sum())
+
+    positions = np.linspace(0, n_rows - 1, _PAYLOAD_SAMPLE_ROWS).astype(np.int64)
+    sample_bytes = data.iloc[positions].memory_usage(deep=True, index=False).sum()
+    return int(sample_bytes * n_rows / _PAYLOAD_SAMPLE_ROWS)
+
+
+class StageMetrics:
+    """
+    A context manager recording the metrics of a DAG stage (extract, transform, load ...):
+    wall time and CPU time, timings of each phase, peak RSS, row counts, payload bytes and
+    throughput.
+    When leaving the block, the metrics are printed as one JSON line prefixed with `Metrics:`,
+    so the slowest stages can be found by searching the task logs.
+    It can decorate a function too, then every call is recorded, and the rows of the returned
+    DataFrame are counted.
+    `rss_growth_mb` is how much the stage raised the peak RSS of the process, so a stage
+    holding a large DataFrame shows up even after it's freed.
+    If `STAGE_PROFILE_ENABLED` is True, the stage is also profiled by cProfile, and the stats
+    are dumped to `DATA_PATH/profile/{stage}_{labels}_{timestamp}.prof`. Nested stages are not
+    profiled separately, they are included in the profile of the outer stage.
+    The outermost stages are collected by the open `RunMetrics` of the thread, if any.
+
+    Args:
+        stage: str, the stage name, e.g. "extract", "transform", "load".
+        is_print: bool, whether to print the metrics when leaving the block. Default is True.
+        **labels: extra fields added to the metrics, e.g. table name.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import pandas as pd
+        from utils.instrumentation import StageMetrics
+
+        with StageMetrics("transform", table="heal_hospital") as metrics:
+            with metrics.phase("read"):
+                data = pd.DataFrame({"a": range(1000)})
+            with metrics.phase("clean"):
+                data = data[data["a"] % 2 == 0]
+            metrics.add_rows(len(data))
+        print(metrics.metrics["rows"])
+        ```
+        ```
+        >>> output:
+        Metrics: {"stage": "transform", "table": "heal_hospital", "status": "success", "total_s": 0.002, "cpu_s": 0.002, "phases_s": {"read": 0.001, "clean": 0.001}, "rows": 500, "bytes": null, "rows_per_s": 250000.0, "peak_rss_mb": 152.3, "rss_growth_mb": 0.0}
+        >>> print(metrics.metrics["rows"])
+        500
+        ```
+    """
+
+    def __init__(self, stage: str, is_print=True, **labels):
+        self.stage = stage
+        self.is_print = is_print
+        self.labels = labels
+        self.metrics = {
+            "stage": stage,
+            **labels,
+            "status": "running",
+            "total_s": None,
+            "cpu_s": None,
+            "phases_s": {},
+            "rows": None,
+            "bytes": None,
+            "rows_per_s": None,
+            "peak_rss_mb": None,
+            "rss_growth_mb": None,
+        }
+        self._start_time = None
+        self._start_cpu_time = None
+        self._start_peak_rss = None
+        self._profiler = None
+
+    def __enter__(self):
+        self._start_peak_rss = _get_peak_rss_mb()
+        # only the outermost stage is profiled, a second profiler can't run at the same time
+        active_stages = _get_active_stages()
+        if STAGE_PROFILE_ENABLED and not active_stages:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        active_stages.append(self)
+        self._start_cpu_time = time.process_time()
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        total = time.perf_counter() - self._start_time
+        cpu_time = time.process_time() - self._start_cpu_time
+        active_stages = _get_active_stages()
+        active_stages.remove(self)
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._dump_profile()
+
+        self.metrics["status"] = "failed" if exc_type else "success"
+        self.metrics["total_s"] = round(total, 3)
+        self.metrics["cpu_s"] = round(cpu_time, 3)
+        if self.metrics["rows"] is not None:
+            self.metrics["rows_per_s"] = (
+                round(self.metrics["rows"] / total, 1) if total > 0 else None
+            )
+        peak_rss = _get_peak_rss_mb()
+        if peak_rss is not None:
+            self.metrics["peak_rss_mb"] = peak_rss
+            self.metrics["rss_growth_mb"] = round(peak_rss - self._start_peak_rss, 1)
+        run = getattr(_local, "run", None)
+        if (run is not None) and (not active_stages):
+            run.add_stage(self.metrics)
+        if self.is_print:
+            print(f"Metrics: {self.to_json()}")
+        # never suppress the exception
+        return False
+
+    def __call__(self, func):
+        """
+        Decorate a function, every call is recorded by a new StageMetrics with the same stage
+        and labels. The rows of the returned DataFrame are counted.
+        """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with StageMetrics(self.stage, self.is_print, **self.labels) as metrics:
+                result = func(*args, **kwargs)
+                if hasattr(result, "shape"):
+                    metrics.add_rows(len(result))
+            return result
+
+        return wrapper
+
+    def _dump_profile(self):
+        """
+        Dump the cProfile stats of the stage to `DATA_PATH/profile`.
+        """
+        profile_dir = os.path.join(DATA_PATH, "profile")
+        os.makedirs(profile_dir, exist_ok=True)
+        name = "_".join([self.stage, *(str(value) for value in self.labels.values())])
+        name = re.sub(r"[^\w.-]", "_", name)
+        # in microseconds, so the calls of a decorated function don't overwrite each other
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        file_path = os.path.join(profile_dir, f"{name}_{timestamp}.prof")
+        self._profiler.dump_stats(file_path)
+        print(f"Profile of stage {self.stage} been saved to {file_path}.")
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a phase of the stage. The time of phases with the same name is accumulated.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            cost_time = time.perf_counter() - start_time
+            phases = self.metrics["phases_s"]
+            phases[name] = round(phases.get(name, 0) + cost_time, 3)
+
+    def add_rows(self, rows: int):
+        """
+        Add the number of rows processed by the stage.
+        """
+        self.metrics["rows"] = (self.metrics["rows"] or 0) + int(rows)
+
+    def add_bytes(self, n_bytes: int):
+        """
+        Add the number of bytes processed by the stage.
+        """
+        self.metrics["bytes"] = (self.metrics["bytes"] or 0) + int(n_bytes)
+
+    def to_json(self) -> str:
+        """
+        Return the metrics as a JSON string.
+        """
+        return json.dumps(self.metrics, ensure_ascii=False, default=str)
+
+
+class RunMetrics:
+    """
+    A context manager collecting the outermost `StageMetrics` of a DAG run in the same thread.
+    When leaving the block, one line summarizing the run is printed: the wall time of each
+    stage and its share of the total, CPU time and peak RSS. It shows where the time of a DAG
+    goes at a glance. Stages with the same name are added up.
+    Stages are only collected while a run is open, and the run is dropped with the block, so
+    nothing is kept in a long-lived worker process.
+
+    Args:
+        is_print: bool, whether to print the summary when leaving the block. Default is True.
+        **labels: extra fields added to the summary, e.g. table name.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import pandas as pd
+        from utils.instrumentation import RunMetrics, StageMetrics
+
+        @StageMetrics("transform", is_print=False)
+        def transform(data):
+            return data[data["a"] % 2 == 0]
+
+        with RunMetrics(table="test") as run:
+            with StageMetrics("extract", is_print=False) as metrics:
+                data = pd.DataFrame({"a": range(1000000)})
+                metrics.add_rows(len(data))
+            data = transform(data)
+        print(run.summary["stages"]["transform"]["rows"])
+        ```
+        ```
+        >>> output:
+        Run summary: table test, total 0.031s, cpu 0.030s, peak RSS 180.2MB | extract 0.004s (13%) 1000000 rows | transform 0.027s (87%) 500000 rows
+        >>> print(run.summary["stages"]["transform"]["rows"])
+        500000
+        ```
+    """
+
+    def __init__(self, is_print=True, **labels):
+        self.is_print = is_print
+        self.labels = labels
+        self.summary = None
+        self._stages = []
+        self._lock = threading.Lock()
+        self._outer_run = None
+
+    def __enter__(self):
+        self._outer_run = getattr(_local, "run", None)
+        _local.run = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.run = self._outer_run
+        self.summary = self.summarize()
+        if self.is_print:
+            print(self._format_summary())
+        # never suppress the exception
+        return False
+
+    def add_stage(self, metrics: dict):
+        """
+        Add the metrics of a finished stage to the run.
+        """
+        with self._lock:
+            self._stages.append(metrics)
+
+    def summarize(self) -> dict:
+        """
+        Summarize the stages collected so far.
+        """
+        with self._lock:
+            stage_metrics = list(self._stages)
+        stages = {}
+        for metrics in stage_metrics:
+            stage = stages.setdefault(
+                metrics["stage"], {"total_s": 0, "cpu_s": 0, "rows": None}
+            )
+            stage["total_s"] += metrics["total_s"]
+            stage["cpu_s"] += metrics["cpu_s"]
+            if metrics["rows"] is not None:
+                stage["rows"] = (stage["rows"] or 0) + metrics["rows"]
+        total = sum(stage["total_s"] for stage in stages.values())
+        for stage in stages.values():
+            stage["total_s"] = round(stage["total_s"], 3)
+            stage["cpu_s"] = round(stage["cpu_s"], 3)
+            stage["share"] = round(stage["total_s"] / total, 3) if total > 0 else None
+        return {
+            **self.labels,
+            "total_s": round(total, 3),
+            "cpu_s": round(sum(stage["cpu_s"] for stage in stages.values()), 3),
+            "peak_rss_mb": _get_peak_rss_mb(),
+            "stages": stages,
+        }
+
+    def _format_summary(self) -> str:
+        summary = self.summary
+        labels = "".join(f"{key} {value}, " for key, value in self.labels.items())
+        line = (
+            f"Run summary: {labels}total {summary['total_s']:.3f}s, "
+            f"cpu {summary['cpu_s']:.3f}s"
+        )
+        if summary["peak_rss_mb"] is not None:
+            line += f", peak RSS {summary['peak_rss_mb']}MB"
+        for name, stage in summary["stages"].items():
+            line += f" | {name} {stage['total_s']:.3f}s"
+            if stage["share"] is not None:
+                line += f" ({stage['share']:.0%})"
+            if stage["rows"] is not None:
+                line += f" {stage['rows']} rows"
+        return line
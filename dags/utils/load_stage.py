@@ -1,12 +1,186 @@
-import time
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 import geopandas as gpd
+import numpy as np
+import pandas as pd
 from geoalchemy2 import Geometry
+from geoalchemy2.elements import WKBElement, WKTElement
+from psycopg2.extras import execute_values
+from settings.global_config import (
+    DATA_PATH,
+    LOAD_CHUNKSIZE,
+    LOAD_METHOD,
+    PARQUET_COMPRESSION,
+    STAGE_PROFILE_ENABLED,
+)
 from sqlalchemy.sql import text as sa_text
+from utils.instrumentation import StageMetrics, estimate_payload_bytes
+
+
+def _psql_insert_execute_values(table, conn, keys, data_iter):
+    """
+    A `method` for pd.DataFrame.to_sql which inserts the rows of a chunk by psycopg2
+    `execute_values`, so the whole chunk is sent as one multi-row INSERT statement.
+    Spatial elements are not processed by this method, use `_spatial_element_to_ewkt` first.
+    """
+    columns = ", ".join(f'"{key}"' for key in keys)
+    if table.schema:
+        table_name = f'"{table.schema}"."{table.name}"'
+    else:
+        table_name = f'"{table.name}"'
+    rows = list(data_iter)
+    cursor = conn.connection.cursor()
+    try:
+        execute_values(
+            cursor,
+            f"INSERT INTO {table_name} ({columns}) VALUES %s",
+            rows,
+            page_size=len(rows),
+        )
+    finally:
+        cursor.close()
+
+
+def _spatial_element_to_ewkt(value):
+    """
+    Convert WKTElement or WKBElement to EWKT or hex EWKB string, which can be cast to geometry by
+    PostGIS directly. The same conversion is done by geoalchemy2 when binding parameters.
+    """
+    if isinstance(value, WKTElement):
+        if value.extended:
+            return value.data
+        return f"SRID={value.srid};{value.data}"
+    if isinstance(value, WKBElement):
+        if value.extended:
+            return value.desc
+        return f"SRID={value.srid};{value.desc}"
+    return value
+
+
+def _get_to_sql_method(method):
+    """
+    Map the `method` argument of load functions to the `method` argument of pd.DataFrame.to_sql.
+    """
+    if method == "execute_values":
+        return _psql_insert_execute_values
+    if method in (None, "multi"):
+        return method
+    raise ValueError(
+        f"method should be one of `execute_values`, `multi`, None, but got {method}."
+    )
+
+
+def _write_table(conn, data, table: str, dtype, chunksize: int, method):
+    """
+    Write `data` to `table` in batches of `chunksize` rows.
+    """
+    data.to_sql(
+        table,
+        conn,
+        if_exists="append",
+        index=False,
+        schema="public",
+        dtype=dtype,
+        chunksize=chunksize,
+        method=_get_to_sql_method(method),
+    )
+
+
+def _write_table_parallel(
+    engine, data, table: str, dtype, chunksize: int, method, parallel_workers: int
+):
+    """
+    Split `data` into `parallel_workers` slices and write each slice with its own connection
+    and transaction. The slices are committed independently, so a failure could leave part of
+    the data in the table.
+    """
+    # make sure the table exists before the workers start, or they could create it concurrently
+    with engine.connect() as conn:
+        _write_table(conn, data.iloc[:0], table, dtype, chunksize, method)
+        conn.commit()
+
+    def write_slice(data_slice):
+        with engine.connect() as conn:
+            _write_table(conn, data_slice, table, dtype, chunksize, method)
+            conn.commit()
+
+    bounds = np.linspace(0, len(data), parallel_workers + 1).astype(int)
+    data_slices = [
+        data.iloc[start:end]
+        for start, end in zip(bounds[:-1], bounds[1:])
+        if end > start
+    ]
+    with ThreadPoolExecutor(max_workers=parallel_workers) as executor:
+        # list() to raise the exception of any worker
+        list(executor.map(write_slice, data_slices))
+
+
+def _format_rows_per_s(metrics: StageMetrics) -> str:
+    """
+    Format the throughput of the load for the print, it's unknown if the load took no time.
+    """
+    rows_per_s = metrics.metrics["rows_per_s"]
+    return "- rows/s" if rows_per_s is None else f"{rows_per_s:.0f} rows/s"
+
+
+def _load(
+    engine,
+    data,
+    load_behavior: str,
+    default_table: str,
+    history_table: str,
+    dtype,
+    chunksize: int,
+    method,
+    parallel_workers: int,
+    metrics: StageMetrics,
+):
+    """
+    Common load process of `save_dataframe_to_postgresql` and `save_geodataframe_to_postgresql`.
+    The time of each phase (truncate, transfer, history, commit) is recorded in `metrics`.
+    """
+    if load_behavior not in ("append", "replace", "current+history"):
+        raise ValueError(
+            "load_behavior should be one of `append`, `replace`, `current+history`."
+        )
+    if (load_behavior == "current+history") and (not history_table):
+        raise ValueError(
+            "history_table should be provided when load_behavior is `current+history`."
+        )
+
+    # Truncate and write in parallel can't be done in one transaction, only allowed for append.
+    if (parallel_workers > 1) and (load_behavior == "append"):
+        # every worker commits its own slice, so the commit time is part of the transfer
+        with metrics.phase("transfer"):
+            _write_table_parallel(
+                engine, data, default_table, dtype, chunksize, method, parallel_workers
+            )
+        return
+
+    # the connection is returned to the pool when leaving the block, even if loading fails
+    with engine.connect() as conn:
+        if load_behavior in ("replace", "current+history"):
+            with metrics.phase("truncate"):
+                conn.execute(sa_text(f"TRUNCATE TABLE {default_table}"))
+        with metrics.phase("transfer"):
+            _write_table(conn, data, default_table, dtype, chunksize, method)
+        if load_behavior == "current+history":
+            with metrics.phase("history"):
+                _write_table(conn, data, history_table, dtype, chunksize, method)
+        with metrics.phase("commit"):
+            conn.commit()
 
 
 def save_dataframe_to_postgresql(
-    engine, data, load_behavior: str, default_table: str, history_table: str = None
+    engine,
+    data,
+    load_behavior: str,
+    default_table: str,
+    history_table: str = None,
+    chunksize: int = LOAD_CHUNKSIZE,
+    method=LOAD_METHOD,
+    parallel_workers: int = 1,
 ):
     """
     Save pd.DataFrame to psql.
@@ -14,7 +188,8 @@ def save_dataframe_to_postgresql(
     If the data is gpd.GeoDataFrame, use function `save_geodataframe_to_postgresql` instead.
 
     Args:
-    engine : sqlalchemy.engine.base.Engine.
+    engine : sqlalchemy.engine.base.Engine. Use `utils.db_engine.get_engine()` to reuse the shared
+        connection pool.
     data : pd.DataFrame. Data to be saved.
     load_behavior : str. Save mode, should be one of `append`, `replace`, `current+history`.
         `append`: Just append new data to the `default_table`.
@@ -25,6 +200,12 @@ def save_dataframe_to_postgresql(
             to `history_table`.
     default_table : str. Default table name.
     history_table : str. History table name, only used when load_behavior is `current+history`.
+    chunksize : int. Number of rows written per INSERT batch. Default is `LOAD_CHUNKSIZE`.
+    method : str or None. Insert method, should be one of `execute_values`, `multi`, None.
+        Default is `LOAD_METHOD`. See `LOAD_METHOD` in `settings.global_config` for details.
+    parallel_workers : int. Number of connections writing at the same time, only used when
+        load_behavior is `append`, e.g. loading into a partitioned table. Each connection commits
+        its own part of data. Default is 1, which means all data is written in one transaction.
     """
     # check data type
     if isinstance(data, gpd.GeoDataFrame):
@@ -41,41 +222,30 @@ def save_dataframe_to_postgresql(
         """
         )
 
-    start_time = time.time()
-
     # main
-    conn = engine.connect()
-    if load_behavior == "append":
-        data.to_sql(
-            default_table, conn, if_exists="append", index=False, schema="public"
-        )
-    elif load_behavior == "replace":
-        conn.execute(sa_text(f"TRUNCATE TABLE {default_table}"))
-        data.to_sql(
-            default_table, conn, if_exists="append", index=False, schema="public"
-        )
-    elif load_behavior == "current+history":
-        if history_table is None:
-            raise ValueError(
-                "history_table should be provided when load_behavior is `current+history`."
-            )
-        conn.execute(sa_text(f"TRUNCATE TABLE {default_table}"))
-        data.to_sql(
-            default_table, conn, if_exists="append", index=False, schema="public"
-        )
-        data.to_sql(
-            history_table, conn, if_exists="append", index=False, schema="public"
-        )
-    else:
-        raise ValueError(
-            "load_behavior should be one of `append`, `replace`, `current+history`."
+    with StageMetrics(
+        "load", table=default_table, load_behavior=load_behavior
+    ) as metrics:
+        metrics.add_rows(len(data))
+        metrics.add_bytes(estimate_payload_bytes(data, deep=STAGE_PROFILE_ENABLED))
+        _load(
+            engine,
+            data,
+            load_behavior,
+            default_table,
+            history_table,
+            dtype=None,
+            chunksize=chunksize,
+            method=method,
+            parallel_workers=parallel_workers,
+            metrics=metrics,
         )
-    conn.commit()
-    conn.close()
 
     # print
-    cost_time = time.time() - start_time
-    print(f"Data been saved, cost time: {cost_time:.2f}s.")
+    print(
+        f"Data been saved, cost time: {metrics.metrics['total_s']:.2f}s, "
+        f"{len(data)} rows, {_format_rows_per_s(metrics)}."
+    )
 
 
 def save_geodataframe_to_postgresql(
@@ -86,6 +256,9 @@ def save_geodataframe_to_postgresql(
     default_table: str,
     history_table: str = None,
     geometry_col: str = "wkb_geometry",
+    chunksize: int = LOAD_CHUNKSIZE,
+    method=LOAD_METHOD,
+    parallel_workers: int = 1,
 ):
     """
     Save gpd.GeoDataFrame to psql.
@@ -94,7 +267,8 @@ def save_geodataframe_to_postgresql(
     If the data is pd.DataFrame, use function `save_dataframe_to_postgresql` instead.
 
     Args:
-    engine : sqlalchemy.engine.base.Engine.
+    engine : sqlalchemy.engine.base.Engine. Use `utils.db_engine.get_engine()` to reuse the shared
+        connection pool.
     gdata : gpd.GeoDataFrame. Data with geometry to be saved.
     load_behavior : str. Save mode, should be one of `append`, `replace`, `current+history`.
         `append`: Just append new data to the `default_table`.
@@ -113,9 +287,16 @@ def save_geodataframe_to_postgresql(
         platform-independent array of bytes, usually for transport between systems or between
         programs. By using WKB, systems can avoid exposing their particular internal implementation
         of geometry storage, for greater overall interoperability.
+    chunksize : int. Number of rows written per INSERT batch. Default is `LOAD_CHUNKSIZE`.
+    method : str or None. Insert method, should be one of `execute_values`, `multi`, None.
+        Default is `LOAD_METHOD`. See `LOAD_METHOD` in `settings.global_config` for details.
+    parallel_workers : int. Number of connections writing at the same time, only used when
+        load_behavior is `append`, e.g. loading into a partitioned table. Each connection commits
+        its own part of data. Default is 1, which means all data is written in one transaction.
     """
     # Data type should not been checked, because the process of geometry to wkb_geometry.
     # The process could generate invalid geometry, so data type cant be converted to GeoDataFrame.
+    # Use `utils.transform_geometry.validate_geometry` before the conversion to repair them.
 
     # check geometry type is valid
     white_list = [
@@ -133,58 +314,95 @@ def save_geodataframe_to_postgresql(
             f"geometry_type should be one of {white_list}, but got {geometry_type}."
         )
 
-    start_time = time.time()
-
     # main
-    conn = engine.connect()
-    if load_behavior == "append":
-        gdata.to_sql(
+    with StageMetrics(
+        "load", table=default_table, load_behavior=load_behavior
+    ) as metrics:
+        # Spatial elements are converted to EWKT/EWKB strings here, so every insert method can
+        # write them. PostGIS casts the strings to geometry, the same as geoalchemy2 does.
+        with metrics.phase("serialize"):
+            # hex EWKB strings from `convert_geoseries_to_ewkb` need no conversion
+            geometry_dtype = pd.api.types.infer_dtype(gdata[geometry_col], skipna=True)
+            if geometry_dtype not in ("string", "empty"):
+                gdata = gdata.assign(
+                    **{geometry_col: gdata[geometry_col].map(_spatial_element_to_ewkt)}
+                )
+        metrics.add_rows(len(gdata))
+        metrics.add_bytes(estimate_payload_bytes(gdata, deep=STAGE_PROFILE_ENABLED))
+        _load(
+            engine,
+            gdata,
+            load_behavior,
             default_table,
-            conn,
-            if_exists="append",
-            index=False,
-            schema="public",
-            dtype={geometry_col: Geometry(geometry_type, srid=4326)},
-        )
-    elif load_behavior == "replace":
-        conn.execute(sa_text(f"TRUNCATE TABLE {default_table}"))
-        gdata.to_sql(
-            default_table,
-            conn,
-            if_exists="append",
-            index=False,
-            schema="public",
-            dtype={geometry_col: Geometry(geometry_type, srid=4326)},
-        )
-    elif load_behavior == "current+history":
-        if (history_table is None) or (history_table == ""):
-            raise ValueError(
-                "history_table should be provided when load_behavior is `current+history`."
-            )
-        conn.execute(sa_text(f"TRUNCATE TABLE {default_table}"))
-        gdata.to_sql(
-            default_table,
-            conn,
-            if_exists="append",
-            index=False,
-            schema="public",
-            dtype={geometry_col: Geometry(geometry_type, srid=4326)},
-        )
-        gdata.to_sql(
             history_table,
-            conn,
-            if_exists="append",
-            index=False,
-            schema="public",
             dtype={geometry_col: Geometry(geometry_type, srid=4326)},
+            chunksize=chunksize,
+            method=method,
+            parallel_workers=parallel_workers,
+            metrics=metrics,
         )
-    else:
-        raise ValueError(
-            "load_behavior should be one of `append`, `replace`, `current+history`."
-        )
-    conn.commit()
-    conn.close()
 
     # print
-    cost_time = time.time() - start_time
-    print(f"GeoData been saved, cost time: {cost_time:.2f}s.")
+    print(
+        f"GeoData been saved, cost time: {metrics.metrics['total_s']:.2f}s, "
+        f"{len(gdata)} rows, {_format_rows_per_s(metrics)}."
+    )
+
+
+def save_stage_parquet(
+    data,
+    file_name: str,
+    file_folder=DATA_PATH,
+    compression=PARQUET_COMPRESSION,
+):
+    """
+    Save the output of a stage to `{file_folder}/{file_name}` as Parquet, so the next stage can
+    be run (or rerun) from the file without re-running the upstream stages.
+    gpd.GeoDataFrame is saved as GeoParquet, the geometry columns are stored as WKB.
+    The file is written to a temporary file first and then renamed, so a failed write never
+    leaves a broken file for the next stage. Use `utils.extract_stage.read_stage_parquet` to
+    read it.
+
+    Args:
+        data: pd.DataFrame or gpd.GeoDataFrame. Data to be saved. Columns of spatial elements
+            (WKBElement, WKTElement) can't be saved, use hex EWKB strings instead, see
+            `utils.transform_geometry.convert_geoseries_to_ewkb`.
+        file_name: str, file name, e.g. "heal_hospital_ready.parquet".
+        file_folder: str, file folder path. Default is `DATA_PATH`.
+        compression: str or None, compression codec. Default is `PARQUET_COMPRESSION`.
+
+    Returns: str, full file path
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import pandas as pd
+        from utils.load_stage import save_stage_parquet
+
+        data = pd.DataFrame({'name': ['A', 'B'], 'value': [1, 2]})
+        file_path = save_stage_parquet(data, 'test_ready.parquet')
+        ```
+        ```
+        >>> output:
+        Stage output been saved, 2 rows, 1.9 KB, .../data/test_ready.parquet
+        ```
+    """
+    full_file_path = f"{file_folder}/{file_name}"
+    temp_file_path = f"{full_file_path}.tmp"
+    try:
+        # GeoDataFrame.to_parquet writes GeoParquet metadata of the geometry columns
+        data.to_parquet(temp_file_path, index=False, compression=compression)
+        os.replace(temp_file_path, full_file_path)
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+    file_size = os.path.getsize(full_file_path) / 1024
+    print(
+        f"Stage output been saved, {len(data)} rows, {file_size:.1f} KB, {full_file_path}"
+    )
+    return full_file_path
@@ -0,0 +1,349 @@
+import gzip
+import itertools
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mapbox_vector_tile
+import numpy as np
+import pandas as pd
+import shapely
+from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+from settings.global_config import DATA_PATH
+from utils.transform_geometry import reproject_geoseries
+
+# half of the width of the web mercator (EPSG:3857) world in meters
+_WEB_MERCATOR_ORIGIN = 20037508.342789244
+# number of tiles submitted to the process pool at a time, so the pending tasks and encoded
+# tiles in memory are bounded instead of growing with the number of tiles
+_TILE_BATCH_SIZE = 4096
+# the features shared by the tile workers, set once per worker by `_init_tile_worker`
+_TILE_FEATURES = None
+
+
+def _get_tile_bounds(zoom: int, x: int, y: int) -> tuple:
+    """
+    Get the EPSG:3857 bounds (minx, miny, maxx, maxy) of the XYZ tile.
+    """
+    tile_size = 2 * _WEB_MERCATOR_ORIGIN / 2**zoom
+    minx = -_WEB_MERCATOR_ORIGIN + x * tile_size
+    maxy = _WEB_MERCATOR_ORIGIN - y * tile_size
+    return (minx, maxy - tile_size, minx + tile_size, maxy)
+
+
+def _assign_features_to_tiles(bounds: np.ndarray, zoom: int, buffer_ratio: float):
+    """
+    Find the XYZ tiles each feature could be drawn on, by the EPSG:3857 `bounds` of features.
+    The bounds are extended by the tile buffer, so features near the edge are drawn on the
+    neighbouring tiles too.
+    Return the arrays of (feature index, tile x, tile y), one element per pair.
+    """
+    n_tiles = 2**zoom
+    tile_size = 2 * _WEB_MERCATOR_ORIGIN / n_tiles
+    pad = tile_size * buffer_ratio
+    minx, miny, maxx, maxy = bounds.T
+    x0 = np.floor((minx - pad + _WEB_MERCATOR_ORIGIN) / tile_size)
+    x1 = np.floor((maxx + pad + _WEB_MERCATOR_ORIGIN) / tile_size)
+    y0 = np.floor((_WEB_MERCATOR_ORIGIN - maxy - pad) / tile_size)
+    y1 = np.floor((_WEB_MERCATOR_ORIGIN - miny + pad) / tile_size)
+    x0, x1, y0, y1 = (
+        np.clip(arr, 0, n_tiles - 1).astype(np.int64) for arr in (x0, x1, y0, y1)
+    )
+
+    # expand each feature to the tiles of its range
+    n_x = x1 - x0 + 1
+    counts = n_x * (y1 - y0 + 1)
+    feature_idx = np.repeat(np.arange(len(bounds)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tile_x = x0[feature_idx] + offset % n_x[feature_idx]
+    tile_y = y0[feature_idx] + offset // n_x[feature_idx]
+    return feature_idx, tile_x, tile_y
+
+
+def _init_tile_worker(wkbs, properties, layer_name, extent, buffer):
+    """
+    Keep the features in the worker process, so the tasks only pass the tile keys.
+    """
+    global _TILE_FEATURES
+    _TILE_FEATURES = (wkbs, properties, layer_name, extent, buffer)
+
+
+def _encode_tile(task):
+    """
+    Clip the features to the tile (with buffer) and encode them to a gzip compressed MVT.
+    It runs in the worker processes, `task` is (zoom, x, y, indices of the features in the tile).
+    Return (zoom, x, y, tile data), the tile data is None if no feature is left after clipping.
+    """
+    zoom, x, y, idx = task
+    wkbs, properties, layer_name, extent, buffer = _TILE_FEATURES
+    minx, miny, maxx, maxy = _get_tile_bounds(zoom, x, y)
+    pad = (maxx - minx) * buffer / extent
+    geoms = shapely.clip_by_rect(
+        shapely.from_wkb(wkbs[idx]), minx - pad, miny - pad, maxx + pad, maxy + pad
+    )
+    # Quantize to the integer tile coordinates (y axis down) here in one vectorized call,
+    # instead of by the encoder feature by feature. Parts smaller than a tile unit collapse
+    # and are dropped.
+    scale = extent / (maxx - minx)
+    geoms = shapely.transform(
+        geoms,
+        lambda coords: np.column_stack(
+            [(coords[:, 0] - minx) * scale, (maxy - coords[:, 1]) * scale]
+        ),
+    )
+    geoms = shapely.set_precision(geoms, 1.0)
+    features = [
+        {"geometry": geom, "properties": props}
+        for geom, props in zip(geoms, (properties[i] for i in idx))
+        if not geom.is_empty
+    ]
+    if not features:
+        return zoom, x, y, None
+
+    tile = mapbox_vector_tile.encode(
+        [{"name": layer_name, "features": features}],
+        default_options={
+            "y_coord_down": True,
+            "extents": extent,
+            "on_invalid_geometry": on_invalid_geometry_make_valid,
+        },
+    )
+    return zoom, x, y, gzip.compress(tile)
+
+
+def _to_tile_properties(data: pd.DataFrame) -> list:
+    """
+    Convert the rows of `data` to the property dicts of MVT features.
+    MVT only supports str, int, float and bool values, so other values are converted to str,
+    and missing values are left out.
+    """
+    properties = []
+    for row in data.to_dict("records"):
+        props = {}
+        for key, value in row.items():
+            if value is None or (not isinstance(value, str) and pd.isna(value)):
+                continue
+            if isinstance(value, (np.integer, np.floating, np.bool_)):
+                value = value.item()
+            elif not isinstance(value, (str, int, float, bool)):
+                value = str(value)
+            props[str(key)] = value
+        properties.append(props)
+    return properties
+
+
+def _get_tile_field_types(data: pd.DataFrame) -> dict:
+    """
+    Map the columns of `data` to the field types of the TileJSON `vector_layers`, by dtype.
+    Booleans are "Boolean", numbers are "Number", and others are "String".
+    """
+    field_types = {}
+    for col, dtype in data.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            field_types[str(col)] = "Boolean"
+        elif pd.api.types.is_numeric_dtype(dtype):
+            field_types[str(col)] = "Number"
+        else:
+            field_types[str(col)] = "String"
+    return field_types
+
+
+def _create_mbtiles(file_path: str, metadata: dict):
+    """
+    Create an empty MBTiles (SQLite) file with the `metadata` and `tiles` tables.
+    An existing file is replaced.
+    """
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    conn = sqlite3.connect(file_path)
+    conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+    conn.execute(
+        """
+        CREATE TABLE tiles (
+            zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB
+        )
+        """
+    )
+    conn.execute(
+        "CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)"
+    )
+    conn.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+    conn.commit()
+    return conn
+
+
+def save_geodataframe_to_mbtiles(
+    gdata,
+    layer_name: str,
+    min_zoom: int,
+    max_zoom: int,
+    file_name: str = None,
+    geometry_col="geometry",
+    from_crs=4326,
+    property_cols=None,
+    extent=4096,
+    buffer=64,
+    max_workers=None,
+):
+    """
+    Pre-render a GeoDataFrame to Mapbox Vector Tiles of the zoom range, and save them to an
+    MBTiles file under `DATA_PATH`. The dashboard can then request the few tiles of the map view
+    instead of the whole layer as GeoJSON.
+    The geometries are reprojected to EPSG:3857 once, assigned to tiles by their bounds, then
+    every tile is clipped and encoded in a process pool. The features are passed to each worker
+    once, and the tiles are submitted in bounded batches. The tiles are gzip compressed, and the
+    rows are in TMS order as required by the MBTiles spec.
+    The workers are forked where possible, as spawned workers import the calling DAG script
+    again, so call it under `if __name__ == "__main__":`. The workers don't use the database.
+
+    Args:
+        gdata: gpd.GeoDataFrame, the data with geometry.
+        layer_name: str, the layer name in the tiles, usually the table name.
+        min_zoom: int, the minimum zoom level.
+        max_zoom: int, the maximum zoom level.
+        file_name: str, the MBTiles file name under `DATA_PATH`. Default is None, which means
+            `{layer_name}.mbtiles`. An existing file is replaced.
+        geometry_col: str, the geometry column name. Default is 'geometry'.
+        from_crs: int, the EPSG code of the geometry column. Default is 4326.
+        property_cols: list of str, the columns saved as feature properties. Default is None,
+            which means all columns except geometry columns.
+        extent: int, the size of a tile in MVT coordinates. Default is 4096.
+        buffer: int, the buffer around a tile in MVT coordinates, so the lines and polygons
+            crossing tiles are drawn without seams. Default is 64.
+        max_workers: int, the number of worker processes. Default is None, which means the
+            number of CPUs.
+
+    Returns: str, the path of the MBTiles file.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        from shapely.geometry import box
+        from utils.tile_stage import save_geodataframe_to_mbtiles
+
+        gdata = gpd.GeoDataFrame(
+            {'id': [1, 2]},
+            geometry=[box(121.50, 25.00, 121.52, 25.02), box(121.55, 25.05, 121.56, 25.06)],
+            crs='EPSG:4326'
+        )
+        file_path = save_geodataframe_to_mbtiles(gdata, 'test_layer', min_zoom=10, max_zoom=14)
+        ```
+        ```
+        >>> output:
+        Tiles been saved, cost time: 0.45s, 18 tiles, zoom 10-14, .../data/test_layer.mbtiles.
+        ```
+    """
+    start_time = time.time()
+    file_path = f"{DATA_PATH}/{file_name or f'{layer_name}.mbtiles'}"
+
+    # reproject and serialize the geometries once for all zoom levels
+    geos = reproject_geoseries(gdata[geometry_col], from_crs=from_crs, to_crs=3857)
+    is_kept = (geos.notna() & ~geos.is_empty).to_numpy()
+    arr = np.asarray(geos.values, dtype=object)[is_kept]
+    wkbs = shapely.to_wkb(arr)
+    bounds = shapely.bounds(arr)
+    if property_cols is None:
+        property_cols = [
+            col
+            for col in gdata.columns
+            if (col != geometry_col) and (col not in ("geometry", "wkb_geometry"))
+        ]
+    properties = _to_tile_properties(gdata.loc[is_kept, property_cols])
+
+    def iterate_tasks():
+        for zoom in range(min_zoom, max_zoom + 1):
+            feature_idx, tile_x, tile_y = _assign_features_to_tiles(
+                bounds, zoom, buffer / extent
+            )
+            # group the features by tile
+            order = np.lexsort((tile_y, tile_x))
+            feature_idx, tile_x, tile_y = (
+                feature_idx[order],
+                tile_x[order],
+                tile_y[order],
+            )
+            tile_key = tile_x * 2**zoom + tile_y
+            starts = np.flatnonzero(np.diff(tile_key, prepend=-1))
+            ends = np.append(starts[1:], len(tile_key))
+            for start, end in zip(starts, ends):
+                yield (
+                    zoom,
+                    int(tile_x[start]),
+                    int(tile_y[start]),
+                    feature_idx[start:end],
+                )
+
+    lng_min, lat_min, lng_max, lat_max = (
+        reproject_geoseries(gdata[geometry_col], from_crs=from_crs).total_bounds
+        if is_kept.any()
+        else (-180, -85, 180, 85)
+    )
+    metadata = {
+        "name": layer_name,
+        "format": "pbf",
+        "type": "overlay",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "bounds": f"{lng_min},{lat_min},{lng_max},{lat_max}",
+        "json": json.dumps(
+            {
+                "vector_layers": [
+                    {
+                        "id": layer_name,
+                        "minzoom": min_zoom,
+                        "maxzoom": max_zoom,
+                        "fields": _get_tile_field_types(gdata[property_cols]),
+                    }
+                ]
+            },
+            ensure_ascii=False,
+        ),
+    }
+
+    n_tiles = 0
+    conn = _create_mbtiles(file_path, metadata)
+    try:
+        # fork the workers, so they don't run the calling script again
+        mp_context = (
+            multiprocessing.get_context("fork")
+            if "fork" in multiprocessing.get_all_start_methods()
+            else None
+        )
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=mp_context,
+            initializer=_init_tile_worker,
+            initargs=(wkbs, properties, layer_name, extent, buffer),
+        ) as executor:
+            tasks = iterate_tasks()
+            # `executor.map` submits the whole iterable at once, so feed it batch by batch
+            while True:
+                batch = list(itertools.islice(tasks, _TILE_BATCH_SIZE))
+                if not batch:
+                    break
+                for zoom, x, y, tile in executor.map(_encode_tile, batch, chunksize=64):
+                    if tile is None:
+                        continue
+                    # MBTiles uses TMS tile rows, which count from the bottom
+                    conn.execute(
+                        "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                        (zoom, x, 2**zoom - 1 - y, sqlite3.Binary(tile)),
+                    )
+                    n_tiles += 1
+                conn.commit()
+    finally:
+        conn.close()
+
+    print(
+        f"Tiles been saved, cost time: {time.time() - start_time:.2f}s, {n_tiles} tiles, "
+        f"zoom {min_zoom}-{max_zoom}, {file_path}."
+    )
+    return file_path
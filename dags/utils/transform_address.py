@@ -1,15 +1,26 @@
 import re
+import time
 import warnings
+from collections import Counter
 
 import numpy as np
 import pandas as pd
-from settings.global_config import DAG_PATH
+from settings.global_config import DAG_PATH, STRING_DTYPE
 
 # Config
 warnings.filterwarnings("ignore")
 CURRENT_PATH = DAG_PATH
 OPENDATA_PATH = f"{DAG_PATH}/utils/opendata"
 PREPROCESS_PATH = f"{DAG_PATH}/utils/preprocess"
+# str.translate table of `clean_data`, the full-width ASCII characters (U+FF01 - U+FF5E) to
+# half-width. The half-width katakana and specials after them are not full-width forms.
+FULL_TO_HALF_TABLE = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+# The punctuation removed by `clean_data`. RE2 used by the pyarrow string dtype only matches
+# ASCII by `\w` and `\s`, so the same characters of `re` are listed by Unicode classes for it.
+PUNCTUATION_PATTERN = r"[^\w\s]"
+PUNCTUATION_PATTERN_RE2 = r"[^\p{L}\p{N}_\p{Z}\t\n\x0b\x0c\r\x1c-\x1f\x85]"
+# The upper edges (ms) of the per-row parse time histogram in the summary of `main_process`.
+PARSE_TIME_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100)
 
 
 # Load necessary data
@@ -59,29 +70,70 @@ def load_dim_data():
     return postcode3, postcode5, citys, districts, villages, roads
 
 
-def cut_edge(data):
+def cut_edge(data, row_threshold=0.9, col_threshold=0.98):
     """
     Filter out rows and columns with a high proportion of missing values.
+    The missing ratios of rows and columns are both computed from one boolean mask of the data.
 
     Args:
         data (pd.DataFrame): The input DataFrame containing the data.
+        row_threshold (float): The rows with missing ratio not less than it are removed.
+            Default is 0.9.
+        col_threshold (float): The columns with missing ratio not less than it are removed.
+            Default is 0.98.
 
     Returns:
         pd.DataFrame: A cleaned DataFrame with rows and columns filtered out if they contain
         more than 90% missing values in rows and 98% missing values in columns.
     """
-    is_row_notna = [
-        True if (row[1].isna().sum() / row[1].shape[0]) < 0.9 else False
-        for row in data.iterrows()
-    ]
-    is_col_notna = [
-        True if (data[colname].isna().sum() / data[colname].shape[0]) < 0.98 else False
-        for colname in data
-    ]
+    is_na = data.isna().to_numpy()
+    with np.errstate(invalid="ignore"):
+        is_row_notna = is_na.mean(axis=1) < row_threshold
+        is_col_notna = is_na.mean(axis=0) < col_threshold
     clean_data = data.loc[is_row_notna, is_col_notna]
     return clean_data
 
 
+def cut_edge_in_chunks(
+    file_path, row_threshold=0.9, col_threshold=0.98, chunksize=100000, **kwargs
+):
+    """
+    The chunked version of `cut_edge` for a CSV file too large to be read at once.
+    The file is read twice by `pd.read_csv` in chunks: the first pass counts the missing values
+    of each column, the second pass filters the rows of each chunk and keeps the columns.
+    Only one chunk and the filtered result are in memory.
+
+    Args:
+        file_path (str): The path of the CSV file.
+        row_threshold (float): The same as `cut_edge`. Default is 0.9.
+        col_threshold (float): The same as `cut_edge`. Default is 0.98.
+        chunksize (int): The number of rows per chunk. Default is 100000.
+        **kwargs: Other arguments of `pd.read_csv`, e.g. encoding.
+
+    Returns:
+        pd.DataFrame: The same rows and columns as
+        `cut_edge(pd.read_csv(file_path, **kwargs))`.
+    """
+    na_count = None
+    row_count = 0
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, **kwargs):
+        chunk_na_count = chunk.isna().sum()
+        na_count = chunk_na_count if na_count is None else na_count + chunk_na_count
+        row_count += len(chunk)
+    if na_count is None:
+        # no column
+        return pd.read_csv(file_path, **kwargs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        is_col_notna = (na_count / row_count < col_threshold).to_numpy()
+
+    clean_chunks = []
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, **kwargs):
+        is_row_notna = chunk.isna().to_numpy().mean(axis=1) < row_threshold
+        clean_chunks.append(chunk.loc[is_row_notna, is_col_notna])
+    clean_data = pd.concat(clean_chunks)
+    return clean_data
+
+
 def chnumber_to_number(ch_num):
     """
     Convert Chinese numerals to Arabic numerals, with many lines of code just for aesthetics
@@ -98,12 +150,13 @@ def chnumber_to_number(ch_num):
     return ch_num
 
 
-def is_address(address):
+def is_address(address, counter: Counter = None):
     """
     先篩去明顯不是地址的資料
     區分是地址還是地段
     地段的特色: 結尾是段 出現兩次段
     地址的特色: 以號、樓、數字、旁結尾
+    counter: 記錄規則命中次數，可不給
     """
     if (address.find("台北市") < 0) and (address.find("臺北市") < 0):
         return False
@@ -157,6 +210,8 @@ def is_address(address):
     else:
         global process_log
         process_log += "is_address func with else condtion!\n"
+        if counter is not None:
+            counter["is_address_else"] += 1
         return True
 
 
@@ -183,9 +238,21 @@ def fulltohalf(string):
         return string
 
 
+def _is_arrow_string(series: pd.Series) -> bool:
+    """
+    Check if the `.str` regex of the series runs by RE2 of pyarrow instead of `re`.
+    """
+    return (
+        isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == "pyarrow"
+    ) or isinstance(series.dtype, pd.ArrowDtype)
+
+
 def clean_data(addr):
     """
     Clean address data.
+    The address is converted to `STRING_DTYPE` first, so the replaces run in pyarrow compute
+    kernels if it is "string[pyarrow]". The values that are not string are regarded as empty,
+    and the output is converted back to object dtype of str for `main_process`.
 
     Example:
         ``` python
@@ -210,7 +277,16 @@ def clean_data(addr):
     """
     if type(addr) == list:
         addr = pd.Series(addr)
-    addr = addr.apply(fulltohalf)
+    if pd.api.types.infer_dtype(addr, skipna=True) not in ("string", "empty"):
+        # `.str` methods of object dtype return NaN for numbers, which are emptied below
+        addr = addr.where(addr.map(lambda x: isinstance(x, str)))
+    addr = addr.astype(STRING_DTYPE)
+    # fulltohalf, only the few addresses with full-width characters are translated
+    is_full_width = addr.str.contains("[\uff01-\uff5e]", regex=True, na=False)
+    if is_full_width.any():
+        addr.loc[is_full_width] = addr.loc[is_full_width].str.translate(
+            FULL_TO_HALF_TABLE
+        )
     addr1 = addr.str.replace("-", "之")  # 因為後面會刪掉dash，先替換掉
     addr1 = addr1.str.replace("之之", "")
     addr1 = addr1.str.replace(r"\(.*\)", "", regex=True)
@@ -237,7 +313,7 @@ def clean_data(addr):
     addr1 = addr1.str.replace("舊庄里", "舊莊里")
     addr1 = addr1.str.replace("糖.{1}里", "糖廍里")
     addr1 = addr1.str.replace("汕頭街", "艋舺大道")
-    _bool = addr1.str.find("北投區") >= 0  # 有北投區
+    _bool = addr1.str.contains("北投區", regex=False, na=False)  # 有北投區
     addr1.loc[_bool] = addr1.loc[_bool].str.replace(
         "公館", "公舘"
     )  # 同時又有公館，改成公舘
@@ -271,13 +347,17 @@ def clean_data(addr):
     addr1 = addr1.str.replace("一號", "1號")
     addr1 = addr1.str.replace("二號", "2號")
     addr1 = addr1.str.replace("三號", "3號")
-    addr1 = addr1.str.replace(r"[^\w\s]", "", regex=True)  # 去掉標點符號
+    addr1 = addr1.str.replace(
+        PUNCTUATION_PATTERN_RE2 if _is_arrow_string(addr1) else PUNCTUATION_PATTERN,
+        "",
+        regex=True,
+    )  # 去掉標點符號
     # re.compile(ur"[^a-zA-Z0-9\u4e00-\u9fa5]")  # 好像還有沒去掉的標點符號?
     addr2 = addr1.str.replace(" ", "")  # 去掉空白
     addr1 = addr1.str.replace("糖里", "糖廍里")
     addr3 = addr2.str.replace("ㄧ", "一")
     addr4 = addr3.fillna("")  # nan會造成dtype為float，需處理掉
-    addr_cleaned = addr4
+    addr_cleaned = addr4.astype(object)
 
     return addr_cleaned
 
@@ -493,9 +573,10 @@ def except_rule_for_road(address, target_list):
     return new_address, seg_string, unexpected_string
 
 
-def num_fix(address_num):
+def num_fix(address_num, counter: Counter = None):
     r"""
     修正門牌非單一數字(僅"\d+號" or "\d+之\d+號" or "\d+"不須修正)。
+    counter: 記錄規則命中次數，可不給
 
     test
     ----
@@ -520,6 +601,8 @@ def num_fix(address_num):
             process_log += (
                 "number fix success: Choose median number cause number is an range.\n"
             )
+            if counter is not None:
+                counter["number_fix_median"] += 1
         elif address_num.find("至") > 0:  # 用"至"表示模糊門牌號:
             num_range = address_num.split("號")[0].split("至")
             num_range = [re.search(r"\d+", temp).group(0) for temp in num_range]
@@ -529,11 +612,15 @@ def num_fix(address_num):
             process_log += (
                 "number fix success: Choose median number cause number is an range.\n"
             )
+            if counter is not None:
+                counter["number_fix_median"] += 1
         else:
             new_address_num = address_num
             process_log += (
                 "number fix fail: Address number is not a integer, but cant fix.\n"
             )
+            if counter is not None:
+                counter["number_fix_fail"] += 1
 
     # 格式修正
     if not str(new_address_num).endswith("號"):
@@ -595,9 +682,36 @@ def decide_confidence(addr_dict):
     return confidence_level
 
 
-def main_process(addr_cleaned):
+def main_process(addr_cleaned, return_summary=False):
     """
     Expected to provide several output results with one strict format behind them.
+
+    If `return_summary` is True, a summary dict of the batch is returned too: row counts by
+    status and confidence level, hits of each segmentation rule (`rule_hits`), the share of
+    rows (and time) reaching the slow `road_guessing`, and the histogram of per-row parse time.
+    The rule names are `{target}_seg`, `{target}_seg_fail`, `{target}_unexpected_words` for
+    each target, and `postcode5`, `postcode3`, `postcode_seg_fail`, `road_seg`, `road_change`,
+    `road_guessing`, `road_guessing_fail`, `room_comple`, `beside_del`, `number_fix_median`,
+    `number_fix_fail`, `is_address_else`.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import pandas as pd
+        from utils.transform_address import clean_data, main_process
+
+        addres = pd.Series(['台北市信義區3民路四段３00號-1(3室)', '台北市信義區信易路8號'])
+        standard_addr_list, summary = main_process(clean_data(addres), return_summary=True)
+        print(summary["rule_hits"]["road_guessing"], summary["road_guessing_share"])
+        ```
+        ```
+        >>> print(summary["rule_hits"]["road_guessing"], summary["road_guessing_share"])
+        1 0.5
+        ```
     """
     # 預計提供數個output結果，但背後有一個最嚴謹的格式
     # 0.用dict存正規化後的結果
@@ -609,7 +723,23 @@ def main_process(addr_cleaned):
     num_pattern = "[0-9bB]*[之至]*[0-9bB]+"
     num1_pattern = "[0-9bB一二三四五六七八九十]*[之至]*[0-9bB一二三四五六七八九十]+"
     cn_lane = ["怡和巷", "銀光巷", "杏林巷"]
+    parse_counter = Counter()
+
+    def count_seg(seg_target, seg_str, other_str):
+        # the result of a segmentation, the same as the process_log of `seg_sample` and
+        # `seg_only_by_regexp`
+        if seg_str == "":
+            parse_counter[f"{seg_target}_seg_fail"] += 1
+            return
+        parse_counter[f"{seg_target}_seg"] += 1
+        if other_str != ",":
+            parse_counter[f"{seg_target}_unexpected_words"] += 1
+
+    # the start time of each row, the parse time of a row is the gap to the next one
+    row_start_times = []
+    guessing_rows = []
     for i, raw_adc in enumerate(addr_cleaned):
+        row_start_times.append(time.perf_counter())
         global process_log
         process_log = ""
         process_log += f"data row {i}:\n"
@@ -641,7 +771,7 @@ def main_process(addr_cleaned):
             continue
 
         # 非地址-無法辨識、非臺北市
-        if not is_address(adc):
+        if not is_address(adc, parse_counter):
             if not is_tpe(adc):
                 addr_dict["status"] = "not taipei"
             else:
@@ -676,15 +806,19 @@ def main_process(addr_cleaned):
                 if adc[0:5] in postcode5:
                     addr_dict["postcode"] += adc[:5]
                     adc = adc[5:]
+                    parse_counter["postcode5"] += 1
             else:  # 3碼郵遞區號
                 if adc[0:3] in postcode3:
                     addr_dict["postcode"] += adc[:3]
                     adc = adc[3:]
+                    parse_counter["postcode3"] += 1
         else:  # 無郵遞區號
             process_log += "postcode seg fail: Can't find pattern!\n"
+            parse_counter["postcode_seg_fail"] += 1
 
         # seg city
         new_addr, seg_str, other_str = seg_sample(adc, "city", "縣市", 3, citys)
+        count_seg("city", seg_str, other_str)
         adc = new_addr
         adc = adc.replace("台北市", "").replace("臺北市", "")  # 清除重複出現的縣市
         addr_dict["city"] += seg_str
@@ -694,6 +828,7 @@ def main_process(addr_cleaned):
         new_addr, seg_str, other_str = seg_sample(
             adc, "district", "鄉鎮市區", 3, districts
         )
+        count_seg("district", seg_str, other_str)
         adc = new_addr
         adc = adc.replace(seg_str, "")  # 清除重複出現的鄉鎮市區
         addr_dict["dist"] += seg_str
@@ -701,6 +836,7 @@ def main_process(addr_cleaned):
 
         # seg vil.
         new_addr, seg_str, other_str = seg_sample(adc, "village", "里", 3, villages)
+        count_seg("village", seg_str, other_str)
         if (seg_str == "") and (
             new_addr.find("里") == 2
         ):  # 如果找不到是什麼里，但又有寫XX里，直接丟掉那個XX里
@@ -713,6 +849,7 @@ def main_process(addr_cleaned):
         # seg nebd.
         pattern = f"{num_pattern}鄰"
         new_addr, seg_str, other_str = seg_only_by_regexp(adc, "neighberhood", pattern)
+        count_seg("neighberhood", seg_str, other_str)
         # 到鄰這邊，為了讓路更好做，所有在鄰之前還有任何字，全部刪掉
         adc = new_addr
         addr_dict["nebd"] += chnumber_to_number(seg_str)
@@ -726,6 +863,7 @@ def main_process(addr_cleaned):
         if seg_str == "":
             pattern = "[0-9一二三四五六七八九十]+巷"
             new_addr, seg_str, other_str = seg_only_by_regexp(adc, "lane", pattern)
+        count_seg("lane", seg_str, other_str)
         if (seg_str == "") and (
             new_addr.find("巷") == 2
         ):  # 如果找不到是什麼巷，但又有寫XX巷，直接丟掉那個XX巷
@@ -737,6 +875,7 @@ def main_process(addr_cleaned):
         # seg alley
         pattern = f"{num_pattern}弄"
         new_addr, seg_str, other_str = seg_only_by_regexp(adc, "alley", pattern)
+        count_seg("alley", seg_str, other_str)
         adc = new_addr
         addr_dict["alley"] += chnumber_to_number(seg_str)
         addr_dict["other"] += other_str
@@ -744,6 +883,7 @@ def main_process(addr_cleaned):
         # seg sub_alley
         pattern = f"{num_pattern}衖"
         new_addr, seg_str, other_str = seg_only_by_regexp(adc, "sub_alley", pattern)
+        count_seg("sub_alley", seg_str, other_str)
         adc = new_addr
         addr_dict["sub_alley"] += chnumber_to_number(seg_str)
         addr_dict["other"] += other_str
@@ -751,6 +891,7 @@ def main_process(addr_cleaned):
         # seg number
         pattern = f"[0-9bB]*[之至]*{num1_pattern}號"
         new_addr, seg_str, other_str = seg_only_by_regexp(adc, "number", pattern)
+        count_seg("number", seg_str, other_str)
         adc = new_addr
         addr_dict["num"] += chnumber_to_number(seg_str)
         addr_dict["other"] += other_str
@@ -758,6 +899,7 @@ def main_process(addr_cleaned):
         # seg floor
         pattern = "[0-9bB一二三四五六七八九十]*[之至]*[0-9bB一二三四五六七八九十]+樓"
         new_addr, seg_str, other_str = seg_only_by_regexp(adc, "floor", pattern)
+        count_seg("floor", seg_str, other_str)
         adc = new_addr
         addr_dict["floor"] += chnumber_to_number(seg_str)
         addr_dict["other"] += other_str
@@ -765,6 +907,7 @@ def main_process(addr_cleaned):
         # seg room
         pattern = f"(之{num_pattern})|({num_pattern}室)"
         new_addr, seg_str, other_str = seg_only_by_regexp(adc, "room", pattern)
+        count_seg("room", seg_str, other_str)
         adc = new_addr
         addr_dict["room"] += chnumber_to_number(seg_str)
         addr_dict["other"] += other_str
@@ -782,6 +925,8 @@ def main_process(addr_cleaned):
         addr_dict["other"] = ",".join(clean_others)
         # 最嚴謹的，用已有清單比對
         new_addr, seg_str, other_str = road_seg(adcr, roads)
+        if seg_str != "":
+            parse_counter["road_seg"] += 1
         # 把街、路互換，這是地址最容易寫錯的東西
         if seg_str == "":
             if adcr.rfind("路") > 0:  # 路換成街
@@ -790,18 +935,22 @@ def main_process(addr_cleaned):
                 )
                 new_addr, seg_str, other_str = road_seg(adc_changed, roads)
                 other_str = "road_change" + other_str
+                parse_counter["road_change"] += 1
             elif adcr.rfind("街") > 0:  # 街換成路
                 adc_changed = (
                     adcr[: adcr.rfind("街")] + "路" + adcr[adcr.rfind("街") + 1 :]
                 )
                 new_addr, seg_str, other_str = road_seg(adc_changed, roads)
                 other_str = "road_change" + other_str
+                parse_counter["road_change"] += 1
             else:  # 跳過
                 pass
         # 配對不到的路名，用edit_dist猜是什麼路
         if seg_str == "":
             new_addr, seg_str, other_str = except_rule_for_road(adcr, roads)
             other_str = "road_guessing" + other_str
+            parse_counter["road_guessing"] += 1
+            guessing_rows.append(i)
         # 還是沒有接近的，就放棄
         if seg_str == "":
             cut_index = max(adcr.rfind("路"), adcr.rfind("街"), adcr.rfind("大道"))
@@ -811,6 +960,7 @@ def main_process(addr_cleaned):
                 adcr[: cut_index + 1],
             )
             other_str = "road_guessing" + other_str + ","
+            parse_counter["road_guessing_fail"] += 1
         addr_dict["road"] += seg_str
         addr_dict["other"] += new_addr + other_str
 
@@ -823,9 +973,11 @@ def main_process(addr_cleaned):
         if else_value[-1].isnumeric():  # 在最後面剩下純數字，放到室
             addr_dict["room"] += else_value[-1]
             else_value[-1] = "room_comple"
+            parse_counter["room_comple"] += 1
         elif else_value[-1] == "旁":
             # 在最後面剩下一個"旁"，直接去掉
             else_value[-1] = "旁_del"
+            parse_counter["beside_del"] += 1
         else:
             pass
         addr_dict["other"] = ",".join(else_value)
@@ -833,7 +985,7 @@ def main_process(addr_cleaned):
         # fix 檢查各個parse內容是否正確
         # fix_num 門牌號
         if addr_dict["num"] != "":
-            addr_dict["num"] = num_fix(addr_dict["num"])
+            addr_dict["num"] = num_fix(addr_dict["num"], parse_counter)
 
         # 中文數字轉阿拉伯數字
         addr_dict["lane"] = chnumber_to_number(addr_dict["lane"])
@@ -865,13 +1017,65 @@ def main_process(addr_cleaned):
         # save
         standard_addr_list.append(addr_dict)
 
-    return standard_addr_list
+    if not return_summary:
+        return standard_addr_list
+    row_start_times.append(time.perf_counter())
+    summary = _summarize_parse(
+        standard_addr_list, parse_counter, np.diff(row_start_times), guessing_rows
+    )
+    return standard_addr_list, summary
+
+
+def _summarize_parse(standard_addr_list, parse_counter, parse_times, guessing_rows):
+    """
+    Summarize a batch of `main_process`.
+    `parse_counter` is the rule hits, `parse_times` is the parse time (s) of each row, and
+    `guessing_rows` are the row indexes reaching `road_guessing`.
+    """
+    n_rows = len(standard_addr_list)
+    statuses = Counter(addr_dict["status"] for addr_dict in standard_addr_list)
+    conf_levels = Counter(addr_dict["conf_level"] for addr_dict in standard_addr_list)
+    n_parsed = statuses["not null"]
+    parse_times_ms = parse_times * 1000
+    total_ms = parse_times_ms.sum()
+
+    edges = [0, *PARSE_TIME_BUCKETS_MS, np.inf]
+    hist, _ = np.histogram(parse_times_ms, bins=edges)
+    labels = [f"<{edge}" for edge in PARSE_TIME_BUCKETS_MS] + [
+        f">={PARSE_TIME_BUCKETS_MS[-1]}"
+    ]
+    slowest_rows = np.argsort(parse_times_ms)[::-1][:5]
+
+    return {
+        "rows": n_rows,
+        "total_s": round(total_ms / 1000, 3),
+        "status": dict(statuses),
+        "conf_level": dict(conf_levels),
+        "rule_hits": dict(sorted(parse_counter.items())),
+        # the share of the parsed rows (status "not null"), and of the parse time
+        "road_guessing_share": (
+            round(len(guessing_rows) / n_parsed, 4) if n_parsed else None
+        ),
+        "road_guessing_time_share": (
+            round(parse_times_ms[guessing_rows].sum() / total_ms, 4)
+            if total_ms > 0
+            else None
+        ),
+        "parse_time_ms": {
+            "mean": round(parse_times_ms.mean(), 4) if n_rows else None,
+            "p50": round(np.percentile(parse_times_ms, 50), 4) if n_rows else None,
+            "p95": round(np.percentile(parse_times_ms, 95), 4) if n_rows else None,
+            "max": round(parse_times_ms.max(), 4) if n_rows else None,
+        },
+        "parse_time_histogram_ms": dict(zip(labels, hist.tolist())),
+        "slowest_rows": {int(i): round(parse_times_ms[i], 4) for i in slowest_rows},
+    }
 
 
 def save_data(addr, addr_cleaned, standard_addr_list):
     """
     與main_process配套使用，將結果轉換為df，方便使用。
-    
+
     Example:
         ``` python
         import os
@@ -935,4 +1139,5 @@ def save_data(addr, addr_cleaned, standard_addr_list):
 
     return stnd_addr, output["output"]
 
+
 postcode3, postcode5, citys, districts, villages, roads = load_dim_data()
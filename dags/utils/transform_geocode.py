@@ -0,0 +1,425 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from settings.global_config import DAG_PATH
+from utils.transform_geometry import transform_xy
+
+# Config
+OPENDATA_PATH = f"{DAG_PATH}/utils/opendata"
+# The village boundary of Taipei, e.g. the 村里界圖 from the Ministry of the Interior.
+# It is not shipped with the repo, download it and save it to this path, or pass another path.
+VILLAGE_BOUNDARY_PATH = f"{OPENDATA_PATH}/行政區/village_boundary.geojson"
+# The door plate (門牌) coordinates of Taipei, e.g. 臺北市門牌坐標 from data.taipei.
+# It is not shipped with the repo, download it and save it to this path, or pass another path.
+DOOR_PLATE_PATH = f"{OPENDATA_PATH}/門牌/door_plate.csv"
+
+# The spatial index of boundary polygons and the district/village name of each polygon.
+BoundaryIndex = namedtuple("BoundaryIndex", ["tree", "district", "village", "crs"])
+# The door plate lookup tables of forward geocoding, see `build_gazetteer`.
+Gazetteer = namedtuple("Gazetteer", ["exact", "segment", "road"])
+
+
+def build_boundary_index(
+    boundary: gpd.GeoDataFrame, district_col="TOWNNAME", village_col="VILLNAME"
+) -> BoundaryIndex:
+    """
+    Build a shapely STRtree over the boundary polygons, for `reverse_geocode_district_village`.
+    The polygons are also prepared, which makes the point-in-polygon tests much faster.
+    Build it once and reuse it.
+
+    Args:
+        boundary: gpd.GeoDataFrame, one (Multi)Polygon per village.
+        district_col: str, the column of district name in `boundary`. Default is "TOWNNAME".
+        village_col: str, the column of village name in `boundary`. Default is "VILLNAME".
+
+    Returns: BoundaryIndex
+    """
+    boundary = boundary[boundary.geometry.notna() & ~boundary.geometry.is_empty]
+    geoms = np.asarray(boundary.geometry.values, dtype=object)
+    shapely.prepare(geoms)
+    return BoundaryIndex(
+        tree=shapely.STRtree(geoms),
+        district=boundary[district_col].to_numpy(dtype=object),
+        village=boundary[village_col].to_numpy(dtype=object),
+        crs=boundary.crs,
+    )
+
+
+@lru_cache(maxsize=4)
+def load_boundary_index(
+    path=VILLAGE_BOUNDARY_PATH, district_col="TOWNNAME", village_col="VILLNAME"
+) -> BoundaryIndex:
+    """
+    Read the boundary file (any format readable by gpd.read_file) reprojected to EPSG:4326
+    and build its BoundaryIndex.
+    The result is cached, so the file is read and indexed only once per process.
+    """
+    boundary = gpd.read_file(path).to_crs(epsg=4326)
+    return build_boundary_index(
+        boundary, district_col=district_col, village_col=village_col
+    )
+
+
+def reverse_geocode_district_village(
+    gdata: gpd.GeoDataFrame,
+    boundary_index: BoundaryIndex = None,
+    district_col="district",
+    village_col="village",
+) -> gpd.GeoDataFrame:
+    """
+    Assign the district (行政區) and village (里) of the boundary polygon containing each point.
+    All points are matched at once by a STRtree query and a vectorized point-in-polygon test,
+    which gives the same result as `STRtree.query(points, predicate="within")`.
+    Points on the border of two polygons are not within either of them, they are matched to one
+    of the polygons covering them. Points outside every polygon, missing and empty geometries
+    get None.
+    The district and village columns are overwritten, as the coordinates are more reliable than
+    the text of the source.
+
+    Args:
+        gdata: gpd.GeoDataFrame, the points to be geocoded. It is reprojected to the crs of the
+            boundary if both crs are set.
+        boundary_index: BoundaryIndex, from `build_boundary_index` or `load_boundary_index`.
+            Default is None, which means `load_boundary_index()`.
+        district_col: str, the output column of district name. Default is "district".
+        village_col: str, the output column of village name. Default is "village".
+
+    Returns: gpd.GeoDataFrame, a copy of `gdata` with the district and village columns.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        from shapely.geometry import Point, box
+        from utils.transform_geocode import build_boundary_index, reverse_geocode_district_village
+
+        boundary = gpd.GeoDataFrame(
+            {'TOWNNAME': ['大安區', '大安區'], 'VILLNAME': ['錦安里', '龍安里']},
+            geometry=[box(121.52, 25.02, 121.53, 25.03), box(121.53, 25.02, 121.54, 25.03)],
+            crs='EPSG:4326'
+        )
+        boundary_index = build_boundary_index(boundary)
+        gdata = gpd.GeoDataFrame(
+            {'name': ['A', 'B', 'C']},
+            geometry=[Point(121.525, 25.025), Point(121.53, 25.025), Point(121.6, 25.1)],
+            crs='EPSG:4326'
+        )
+        gdata = reverse_geocode_district_village(gdata, boundary_index)
+        print(gdata)
+        ```
+        ```
+        >>> print(gdata)
+          name                    geometry district village
+        0    A  POINT (121.52500 25.02500)      大安區     錦安里
+        1    B  POINT (121.53000 25.02500)      大安區     龍安里
+        2    C  POINT (121.60000 25.10000)     None    None
+        ```
+    """
+    if boundary_index is None:
+        boundary_index = load_boundary_index()
+
+    gdata = gdata.copy()
+    geos = gdata.geometry
+    if (geos.crs is not None) and (boundary_index.crs is not None):
+        geos = geos.to_crs(boundary_index.crs)
+    points = np.asarray(geos.values, dtype=object)
+
+    # Candidates are found by bounding boxes first, then tested against the prepared polygons.
+    # It is the same as `tree.query(points, predicate="within")`, but the predicate query
+    # prepares every point instead of the polygons, which is much slower for many points.
+    point_idx, polygon_idx = boundary_index.tree.query(points)
+    polygons = boundary_index.tree.geometries[polygon_idx]
+    is_within = shapely.contains(polygons, points[point_idx])
+    # points on the border of polygons are not within any of them, match them by `covers`
+    is_on_border = ~is_within & shapely.covers(polygons, points[point_idx])
+
+    # index of the matched boundary polygon of each point, -1 means not matched
+    matched = np.full(len(points), -1, dtype=np.int64)
+    # assign border matches first, so they are overwritten by within matches
+    # polygons don't overlap, so a point is within one polygon at most
+    for is_hit in (is_on_border, is_within):
+        matched[point_idx[is_hit]] = polygon_idx[is_hit]
+
+    is_matched = matched >= 0
+    district = np.full(len(points), None, dtype=object)
+    village = np.full(len(points), None, dtype=object)
+    district[is_matched] = boundary_index.district[matched[is_matched]]
+    village[is_matched] = boundary_index.village[matched[is_matched]]
+    gdata[district_col] = district
+    gdata[village_col] = village
+    return gdata
+
+
+def _normalize_address_components(
+    data: pd.DataFrame, road_col, lane_col, alley_col, num_col
+) -> pd.DataFrame:
+    """
+    Normalize the road, lane, alley and number of addresses to the keys of the gazetteer.
+    Full-width characters are converted to half-width, and the unit words (巷, 弄, 號) are
+    removed, e.g. ("三民路四段", "１巷", "", "300號之1") -> ("三民路四段", "1", "", "300之1").
+    The main number (300) and its parity are also extracted for interpolation.
+    """
+    # Addresses repeat a lot, so every component is normalized only once per unique value
+    # and mapped back by the codes of pd.factorize.
+    components = {}
+    for key, col, unit in (
+        ("road", road_col, ""),
+        ("lane", lane_col, "巷"),
+        ("alley", alley_col, "弄"),
+        ("num", num_col, "號"),
+    ):
+        codes, uniques = pd.factorize(data[col].fillna("").astype(str))
+        uniques = pd.Series(uniques, dtype=object).str.normalize("NFKC").str.strip()
+        if unit:
+            uniques = uniques.str.replace(unit, "", regex=False)
+        if key == "num":
+            # 300之1 -> 300, 1
+            num_parts = uniques.str.extract(r"^(\d+)(?:之(\d+))?$")
+            uniques = num_parts[0].where(
+                num_parts[1].isna(), num_parts[0] + "之" + num_parts[1]
+            )
+            num_int = pd.to_numeric(num_parts[0], errors="coerce").to_numpy()
+            components["num_int"] = num_int[codes]
+        components[key] = uniques.to_numpy(dtype=object)[codes]
+    result = pd.DataFrame(components, index=data.index)
+    result = result[["road", "lane", "alley", "num", "num_int"]]
+    result["parity"] = result["num_int"] % 2
+    return result
+
+
+def build_gazetteer(
+    door_plate: pd.DataFrame,
+    road_col="road",
+    lane_col="lane",
+    alley_col="alley",
+    num_col="num",
+    x_col="x",
+    y_col="y",
+    from_crs=3826,
+) -> Gazetteer:
+    """
+    Build the lookup tables of `geocode_address` from door plate data.
+
+    Args:
+        door_plate: pd.DataFrame, one row per door plate with its components and coordinates.
+        road_col, lane_col, alley_col, num_col: str, the columns of road (including section,
+            e.g. 三民路四段), lane, alley and number. The unit words (巷, 弄, 號) are optional.
+        x_col, y_col: str, the columns of coordinates.
+        from_crs: int, the EPSG code of the coordinates. Default is 3826 (TWD97).
+
+    Returns: Gazetteer, with three tables in EPSG:4326
+        exact: indexed by (road, lane, alley, num), the hash table of exact matches.
+        segment: sorted by (segment_id, num_int), the numbers of each side of a lane or road
+            for interpolation. A segment is the door plates with the same road, lane, alley and
+            parity of number.
+        road: indexed by road, the mean location of each road.
+    """
+    gazetteer = _normalize_address_components(
+        door_plate, road_col, lane_col, alley_col, num_col
+    )
+    gazetteer["lng"], gazetteer["lat"] = transform_xy(
+        pd.to_numeric(door_plate[x_col], errors="coerce"),
+        pd.to_numeric(door_plate[y_col], errors="coerce"),
+        from_crs=from_crs,
+    )
+    gazetteer = gazetteer[
+        (gazetteer["road"] != "") & gazetteer["lng"].notna() & gazetteer["lat"].notna()
+    ]
+
+    key_cols = ["road", "lane", "alley", "num"]
+    exact = (
+        gazetteer[gazetteer["num"].notna()]
+        .drop_duplicates(subset=key_cols)
+        .set_index(key_cols)[["lng", "lat"]]
+    )
+
+    segment_cols = ["road", "lane", "alley", "parity"]
+    # sub numbers (之1) share the location of the main number
+    segment = gazetteer[gazetteer["num_int"].notna()].drop_duplicates(
+        subset=segment_cols + ["num_int"]
+    )
+    segment = segment[segment_cols + ["num_int", "lng", "lat"]]
+    segment["segment_id"] = segment.groupby(segment_cols, sort=False).ngroup()
+    segment = segment.sort_values(["segment_id", "num_int"], ignore_index=True)
+
+    road = gazetteer.groupby("road")[["lng", "lat"]].mean()
+    return Gazetteer(exact=exact, segment=segment, road=road)
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path=DOOR_PLATE_PATH, from_crs=3826, **column_names) -> Gazetteer:
+    """
+    Read the door plate CSV and build its Gazetteer. `column_names` are passed to
+    `build_gazetteer`, e.g. road_col="街路段".
+    The result is cached, so the file is read and indexed only once per process.
+    """
+    door_plate = pd.read_csv(path, dtype=str, encoding="UTF-8")
+    return build_gazetteer(door_plate, from_crs=from_crs, **column_names)
+
+
+def _interpolate_in_segment(query: pd.DataFrame, segment: pd.DataFrame):
+    """
+    Interpolate the location of each query number between the two nearest door plates of the
+    same segment, e.g. No. 15 is put between No. 11 and No. 21 by the ratio of numbers.
+    A number with a door plate in the segment takes its location, e.g. 300之1 of No. 300.
+    Numbers outside the range of the segment are not interpolated.
+    Return lng, lat arrays with NaN for not interpolated.
+    """
+    lng = np.full(len(query), np.nan)
+    lat = np.full(len(query), np.nan)
+    segment_ids = segment.drop_duplicates("segment_id").set_index(
+        ["road", "lane", "alley", "parity"]
+    )["segment_id"]
+    query_segment_id = (
+        query.join(segment_ids, on=["road", "lane", "alley", "parity"])["segment_id"]
+        .fillna(-1)
+        .to_numpy(dtype=np.int64)
+    )
+    is_valid = query_segment_id >= 0
+    if not is_valid.any():
+        return lng, lat
+
+    # search in one sorted array of (segment_id, num_int) pairs, by a combined sort key
+    scale = float(max(segment["num_int"].max(), query["num_int"].max()) + 1)
+    segment_key = (
+        segment["segment_id"].to_numpy() * scale + segment["num_int"].to_numpy()
+    )
+    query_id = query_segment_id[is_valid]
+    query_num = query["num_int"].to_numpy(dtype=float)[is_valid]
+    query_key = query_id * scale + query_num
+    # left is the last door plate <= the query, right is the first one > the query
+    right = np.searchsorted(segment_key, query_key, side="right")
+    left = right - 1
+    n_points = len(segment_key)
+    left_idx = left.clip(0, n_points - 1)
+    right_idx = right.clip(0, n_points - 1)
+
+    seg_id = segment["segment_id"].to_numpy()
+    seg_num = segment["num_int"].to_numpy(dtype=float)
+    has_left = (left >= 0) & (seg_id[left_idx] == query_id)
+    has_right = (right < n_points) & (seg_id[right_idx] == query_id)
+    # the main number is a door plate of the segment, e.g. 300之1 and 300, even if the
+    # segment has only one door plate
+    is_on_left = has_left & (seg_num[left_idx] == query_num)
+    is_inside = is_on_left | (has_left & has_right)
+    ratio = np.divide(
+        query_num - seg_num[left_idx],
+        seg_num[right_idx] - seg_num[left_idx],
+        out=np.zeros_like(query_num),
+        where=has_left & has_right & ~is_on_left,
+    )
+    for values, col in ((lng, "lng"), (lat, "lat")):
+        seg_values = segment[col].to_numpy()
+        interpolated = seg_values[left_idx] + ratio * (
+            seg_values[right_idx] - seg_values[left_idx]
+        )
+        values[np.flatnonzero(is_valid)[is_inside]] = interpolated[is_inside]
+    return lng, lat
+
+
+def geocode_address(
+    data: pd.DataFrame,
+    gazetteer: Gazetteer = None,
+    road_col="road",
+    lane_col="lane",
+    alley_col="alley",
+    num_col="num",
+) -> pd.DataFrame:
+    """
+    Forward geocode standardized addresses to EPSG:4326 coordinates with a local gazetteer.
+    The addresses should be segmented, e.g. the result of `transform_address.save_data`.
+    Every step is a vectorized lookup over all addresses, in order:
+        exact: the same road, lane, alley and number (之 included) in the gazetteer.
+        interpolated: the number is between two door plates of the same side of the same
+            road, lane and alley, the location is interpolated linearly between them.
+        road: the mean location of all door plates of the road.
+        unmatched: lng and lat are NaN.
+    The output `lng`, `lat` can be passed to `add_point_wkbgeometry_column_to_df` with
+    from_crs=4326.
+
+    Args:
+        data: pd.DataFrame, the segmented addresses.
+        gazetteer: Gazetteer, from `build_gazetteer` or `load_gazetteer`.
+            Default is None, which means `load_gazetteer()`.
+        road_col, lane_col, alley_col, num_col: str, the columns of address components.
+            Default is the column names of `transform_address.save_data`.
+
+    Returns: pd.DataFrame with columns `lng`, `lat`, `match_level`, and the index of `data`.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import pandas as pd
+        from utils.transform_geocode import build_gazetteer, geocode_address
+
+        door_plate = pd.DataFrame({
+            'road': ['三民路四段', '三民路四段', '三民路四段'],
+            'lane': ['', '', ''],
+            'alley': ['', '', ''],
+            'num': ['300號', '310號', '301號'],
+            'x': [306000.0, 306100.0, 306020.0],
+            'y': [2770000.0, 2770000.0, 2770030.0],
+        })
+        gazetteer = build_gazetteer(door_plate)
+        addr = pd.DataFrame({
+            'road': ['三民路四段', '三民路四段', '三民路四段', '忠孝東路五段'],
+            'lane': ['', '', '', ''],
+            'alley': ['', '', '', ''],
+            'num': ['300號', '306號', '399號', '1號'],
+        })
+        result = geocode_address(addr, gazetteer)
+        print(result)
+        ```
+        ```
+        >>> print(result)
+                  lng        lat   match_level
+        0  121.554946  25.037085         exact
+        1  121.555541  25.037083  interpolated
+        2  121.555343  25.037174          road
+        3         NaN        NaN     unmatched
+        ```
+    """
+    if gazetteer is None:
+        gazetteer = load_gazetteer()
+
+    query = _normalize_address_components(data, road_col, lane_col, alley_col, num_col)
+    result = pd.DataFrame(
+        {"lng": np.nan, "lat": np.nan, "match_level": "unmatched"}, index=data.index
+    )
+
+    # exact, a hash join on the full key
+    exact = query.join(gazetteer.exact, on=["road", "lane", "alley", "num"])
+    is_matched = exact["lng"].notna().to_numpy()
+    result.loc[is_matched, ["lng", "lat"]] = exact.loc[is_matched, ["lng", "lat"]]
+    result.loc[is_matched, "match_level"] = "exact"
+
+    # interpolated
+    is_todo = ~is_matched & query["num_int"].notna().to_numpy()
+    if is_todo.any() and len(gazetteer.segment):
+        lng, lat = _interpolate_in_segment(query[is_todo], gazetteer.segment)
+        is_interpolated = np.zeros(len(query), dtype=bool)
+        is_interpolated[np.flatnonzero(is_todo)[~np.isnan(lng)]] = True
+        result.loc[is_interpolated, "lng"] = lng[~np.isnan(lng)]
+        result.loc[is_interpolated, "lat"] = lat[~np.isnan(lat)]
+        result.loc[is_interpolated, "match_level"] = "interpolated"
+        is_matched |= is_interpolated
+
+    # road
+    road = query[["road"]].join(gazetteer.road, on="road")
+    is_road = ~is_matched & road["lng"].notna().to_numpy()
+    result.loc[is_road, ["lng", "lat"]] = road.loc[is_road, ["lng", "lat"]]
+    result.loc[is_road, "match_level"] = "road"
+
+    return result
@@ -1,16 +1,37 @@
+from functools import lru_cache
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-from geoalchemy2 import WKTElement
-from numpy import nan
+import shapely
+from pyproj import Transformer
 from shapely.geometry import MultiLineString
 from shapely.geometry.multipolygon import MultiPolygon
-from shapely.geometry.polygon import Polygon
+
+# geometry type id of shapely.get_type_id
+_GEOMETRY_TYPE_ID = {
+    "Point": 0,
+    "LineString": 1,
+    "LinearRing": 2,
+    "Polygon": 3,
+    "MultiPoint": 4,
+    "MultiLineString": 5,
+    "MultiPolygon": 6,
+    "GeometryCollection": 7,
+}
+# the function building the multi geometry of each single geometry type
+_MULTI_FUNC = {
+    "Point": shapely.multipoints,
+    "LineString": shapely.multilinestrings,
+    "Polygon": shapely.multipolygons,
+}
 
 
 def convert_3d_polygon_to_2d_polygon(geo):
     """
     Convert 3D Multi/Polygons to 2D Multi/Polygons.
-    
+    For a whole GeoSeries, use `convert_geoseries_to_2d` instead, which is much faster.
+
     Example:
         ``` python
         import os
@@ -38,23 +59,16 @@ def convert_3d_polygon_to_2d_polygon(geo):
         # dtype: geometry
         ```
     """
-    if geo.has_z:
-        if geo.geom_type == "Polygon":
-            lines = [xy[:2] for xy in list(geo.exterior.coords)]
-            new_geo = Polygon(lines)
-        elif geo.geom_type == "MultiPolygon":
-            new_multi_p = []
-            for ap in geo:
-                lines = [xy[:2] for xy in list(ap.exterior.coords)]
-                new_p = Polygon(lines)
-                new_multi_p.append(new_p)
-            new_geo = MultiPolygon(new_multi_p)
-    return new_geo
+    if pd.isna(geo):
+        return geo
+    # force_2d keeps the interior rings (holes) of polygons
+    return shapely.force_2d(geo)
 
 
 def convert_linestring_to_multilinestring(geo):
     """
     Convert LineString to MultiLineString.
+    For a whole GeoSeries, use `convert_geoseries_to_multilinestring` instead, which is much faster.
 
     Example:
         ``` python
@@ -91,6 +105,7 @@ def convert_linestring_to_multilinestring(geo):
 def convert_polygon_to_multipolygon(geo):
     """
     Convert Polygon to MultiPolygon.
+    For a whole GeoSeries, use `convert_geoseries_to_multipolygon` instead, which is much faster.
 
     Example:
         ``` python
@@ -124,6 +139,591 @@ def convert_polygon_to_multipolygon(geo):
         return MultiPolygon([geo])
 
 
+def _to_geometry_array(geos) -> np.ndarray:
+    """
+    Convert GeoSeries or array-like of shapely geometry to a numpy array of shapely geometry.
+    Missing values (None, NaN) are converted to None.
+    """
+    if isinstance(geos, gpd.GeoSeries):
+        return np.asarray(geos.values, dtype=object)
+    arr = np.asarray(pd.Series(geos, dtype=object), dtype=object)
+    arr[pd.isna(arr)] = None
+    return arr
+
+
+def _to_geoseries(arr: np.ndarray, geos) -> gpd.GeoSeries:
+    """
+    Wrap the geometry array to a GeoSeries with the index and crs of the input `geos`.
+    """
+    index = geos.index if isinstance(geos, pd.Series) else None
+    crs = geos.crs if isinstance(geos, gpd.GeoSeries) else None
+    return gpd.GeoSeries(arr, index=index, crs=crs)
+
+
+def convert_geoseries_to_2d(geos) -> gpd.GeoSeries:
+    """
+    Drop the Z coordinate of all geometries in a GeoSeries in one vectorized call.
+    Interior rings (holes), missing values and empty geometries are kept.
+    It is the vectorized version of `convert_3d_polygon_to_2d_polygon` for any geometry type.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        from shapely.geometry import Polygon
+        from utils.transform_geometry import convert_geoseries_to_2d
+
+        polygon_with_z = Polygon([(0, 0, 0), (1, 0, 1), (1, 1, 2), (0, 1, 3), (0, 0, 0)])
+        geos_polyz = gpd.GeoSeries([polygon_with_z, None])
+        geos_poly = convert_geoseries_to_2d(geos_polyz)
+        print(geos_poly)
+        ```
+        ```
+        >>> print(geos_poly)
+        0    POLYGON ((0.00000 0.00000, 1.00000 0.00000, 1....
+        1                                                 None
+        dtype: geometry
+        ```
+    """
+    arr = _to_geometry_array(geos)
+    return _to_geoseries(shapely.force_2d(arr), geos)
+
+
+def _check_single_type(single_type: str, geometry_type: str = None):
+    """
+    Raise ValueError if `single_type` isn't a single geometry type with a multi type.
+    `geometry_type` is the type given by the caller, for the error message.
+    """
+    if single_type not in _MULTI_FUNC:
+        allowed = ", ".join(
+            f"`{prefix}{single}{suffix}`"
+            for prefix in ("", "Multi")
+            for single in _MULTI_FUNC
+            for suffix in ("", "Z")
+        )
+        raise ValueError(
+            f"geometry_type should be one of {allowed}, "
+            f"but got {geometry_type or single_type}."
+        )
+
+
+def _convert_single_to_multi(geos, single_type: str, multi_func) -> gpd.GeoSeries:
+    """
+    Wrap each non-empty `single_type` geometry into a multi-part geometry by `multi_func`.
+    Other geometries, missing values and empty geometries are kept.
+    """
+    _check_single_type(single_type)
+    arr = _to_geometry_array(geos)
+    is_single = (shapely.get_type_id(arr) == _GEOMETRY_TYPE_ID[single_type]) & (
+        ~shapely.is_empty(arr)
+    )
+    if is_single.any():
+        arr = arr.copy()
+        # shape (n, 1) means n multi geometries with 1 part each
+        arr[is_single] = multi_func(arr[is_single][:, np.newaxis])
+    return _to_geoseries(arr, geos)
+
+
+def convert_geoseries_to_multipolygon(geos) -> gpd.GeoSeries:
+    """
+    Convert all Polygon in a GeoSeries to MultiPolygon in one vectorized call.
+    Interior rings (holes), Z coordinate, missing values and empty geometries are kept.
+    It is the vectorized version of `convert_polygon_to_multipolygon`.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        from shapely.geometry import Polygon
+        from utils.transform_geometry import convert_geoseries_to_multipolygon
+
+        poly = Polygon([[0,0], [1,1], [1,0]])
+        geos = gpd.GeoSeries([poly, None])
+        geos_mpoly = convert_geoseries_to_multipolygon(geos)
+        print(geos_mpoly)
+        ```
+        ```
+        >>> print(geos_mpoly)
+        0    MULTIPOLYGON (((0.00000 0.00000, 1.00000 1.000...
+        1                                                 None
+        dtype: geometry
+        ```
+    """
+    return _convert_single_to_multi(geos, "Polygon", shapely.multipolygons)
+
+
+def convert_geoseries_to_multilinestring(geos) -> gpd.GeoSeries:
+    """
+    Convert all LineString in a GeoSeries to MultiLineString in one vectorized call.
+    Z coordinate, missing values and empty geometries are kept.
+    It is the vectorized version of `convert_linestring_to_multilinestring`.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        from shapely.geometry import LineString
+        from utils.transform_geometry import convert_geoseries_to_multilinestring
+
+        geos = gpd.GeoSeries([LineString([[0,0], [1,1]]), None])
+        geos_mline = convert_geoseries_to_multilinestring(geos)
+        print(geos_mline)
+        ```
+        ```
+        >>> print(geos_mline)
+        0    MULTILINESTRING ((0.00000 0.00000, 1.00000 1.0...
+        1                                                 None
+        dtype: geometry
+        ```
+    """
+    return _convert_single_to_multi(geos, "LineString", shapely.multilinestrings)
+
+
+def convert_geoseries_to_ewkb(geos, srid=4326) -> np.ndarray:
+    """
+    Encode all geometries of a GeoSeries to hex EWKB strings with `srid` in one vectorized call.
+    The output can be saved to the `wkb_geometry` column by `save_geodataframe_to_postgresql`
+    directly, PostGIS casts hex EWKB strings to geometry.
+    WKB stores the full double precision of coordinates, unlike WKT text which could be rounded.
+    Z coordinate is kept, and missing values are converted to None.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        from shapely.geometry import Point
+        from utils.transform_geometry import convert_geoseries_to_ewkb
+
+        geos = gpd.GeoSeries([Point(121.12299999921674, 25.123000193639967), None])
+        ewkb = convert_geoseries_to_ewkb(geos, srid=4326)
+        print(ewkb)
+        ```
+        ```
+        >>> print(ewkb)
+        ['0101000020E6100000D082633BDF475E40D815D1F07C1F3940' None]
+        ```
+    """
+    arr = shapely.set_srid(_to_geometry_array(geos), srid)
+    return shapely.to_wkb(arr, hex=True, include_srid=True)
+
+
+def _get_geometry_size(arr: np.ndarray) -> dict:
+    """
+    Count the vertices and the WKB bytes of a geometry array. Missing values count as 0.
+    The WKB size is computed from the structure of the geometries instead of serializing them:
+    every geometry has a 5 bytes header (byte order and type), then a 4 bytes count of points,
+    rings or parts (except points), and 8 bytes per coordinate value. The parts of multi
+    geometries and collections are counted level by level.
+    """
+    n_vertices = int(shapely.get_num_coordinates(arr).sum())
+    arr = arr[~shapely.is_missing(arr)]
+    n_bytes = 0
+    while len(arr):
+        type_id = shapely.get_type_id(arr)
+        coord_bytes = 8 * shapely.get_coordinate_dimension(arr)
+        is_point = type_id == _GEOMETRY_TYPE_ID["Point"]
+        is_polygon = type_id == _GEOMETRY_TYPE_ID["Polygon"]
+        is_collection = type_id >= _GEOMETRY_TYPE_ID["MultiPoint"]
+        n_bytes += 5 * len(arr) + 4 * (~is_point).sum()
+        # an empty point is written as NaN coordinates
+        n_bytes += coord_bytes[is_point].sum()
+        n_coords = shapely.get_num_coordinates(arr)
+        n_bytes += (coord_bytes * n_coords)[~is_point & ~is_collection].sum()
+        # the point count of each ring of polygons
+        n_rings = shapely.get_num_interior_rings(arr) + ~shapely.is_empty(arr)
+        n_bytes += 4 * n_rings[is_polygon].sum()
+        arr = shapely.get_parts(arr[is_collection])
+    return {"vertices": n_vertices, "bytes": int(n_bytes)}
+
+
+def simplify_geoseries(
+    geos, tolerance: float, grid_size=None, preserve_topology=True, is_print=True
+):
+    """
+    Simplify all geometries of a GeoSeries and snap their coordinates to a precision grid,
+    to reduce the size of the geometries before they are saved and shipped to the dashboard.
+    Simplification is done first, then the coordinates are snapped by `shapely.set_precision`,
+    which keeps the output geometries valid.
+    Z coordinate, missing values, empty geometries and the geometry types are kept.
+
+    Args:
+        geos: gpd.GeoSeries or array-like of shapely geometry.
+        tolerance: float, the maximum distance of the simplified geometry from the original
+            one, in the unit of the CRS (degree for EPSG:4326). 0 means no simplification.
+        grid_size: float or None, the precision grid size, e.g. 1e-6 degree is about 0.1 m.
+            None means no precision snapping. Default is None.
+        preserve_topology: bool, whether to keep the geometries valid, e.g. no self-intersecting
+            polygons and no collapsed rings. Default is True.
+        is_print: bool, whether to print the reduction. Default is True.
+
+    Returns:
+        gpd.GeoSeries: the simplified geometries, with the index and crs of `geos`.
+        dict: the reduction report with keys `vertices_before`, `vertices_after`,
+            `bytes_before`, `bytes_after`, `vertex_reduction`, `byte_reduction`.
+            The bytes are the WKB size of the geometries.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        from shapely.geometry import LineString
+        from utils.transform_geometry import simplify_geoseries
+
+        geos = gpd.GeoSeries([
+            LineString([(121.5, 25.0), (121.5000001, 25.0000001), (121.5000002, 25.0), (121.6, 25.1)]),
+            None
+        ])
+        geos_simplified, report = simplify_geoseries(geos, tolerance=1e-5, grid_size=1e-6)
+        print(geos_simplified[0])
+        ```
+        ```
+        >>> output:
+        Geometry simplified, vertices: 4 -> 2 (-50.0%), bytes: 73 -> 41 (-43.8%).
+        >>> print(geos_simplified[0])
+        LINESTRING (121.5 25, 121.6 25.1)
+        ```
+    """
+    arr = _to_geometry_array(geos)
+    size_before = _get_geometry_size(arr)
+    type_id_before = shapely.get_type_id(arr)
+
+    if tolerance:
+        arr = shapely.simplify(arr, tolerance, preserve_topology=preserve_topology)
+    if grid_size:
+        arr = shapely.set_precision(arr, grid_size)
+    # GEOS returns a single geometry for a multi geometry with one part, convert it back
+    # so the geometry type of the table is kept
+    type_id = shapely.get_type_id(arr)
+    for single_type, multi_func in _MULTI_FUNC.items():
+        is_demoted = (type_id_before == _GEOMETRY_TYPE_ID[f"Multi{single_type}"]) & (
+            type_id == _GEOMETRY_TYPE_ID[single_type]
+        )
+        if is_demoted.any():
+            arr[is_demoted] = multi_func(arr[is_demoted][:, np.newaxis])
+    size_after = _get_geometry_size(arr)
+
+    report = {
+        "vertices_before": size_before["vertices"],
+        "vertices_after": size_after["vertices"],
+        "bytes_before": size_before["bytes"],
+        "bytes_after": size_after["bytes"],
+        "vertex_reduction": (
+            round(1 - size_after["vertices"] / size_before["vertices"], 4)
+            if size_before["vertices"]
+            else 0.0
+        ),
+        "byte_reduction": (
+            round(1 - size_after["bytes"] / size_before["bytes"], 4)
+            if size_before["bytes"]
+            else 0.0
+        ),
+    }
+    if is_print:
+        print(
+            f"Geometry simplified, vertices: {report['vertices_before']} -> "
+            f"{report['vertices_after']} (-{report['vertex_reduction']:.1%}), bytes: "
+            f"{report['bytes_before']} -> {report['bytes_after']} "
+            f"(-{report['byte_reduction']:.1%})."
+        )
+    return _to_geoseries(arr, geos), report
+
+
+def get_tolerance_of_zoom(zoom: int, pixel_tolerance=0.5, tile_size=256) -> float:
+    """
+    Get the simplification tolerance in degree for a web map zoom level, which is the width of
+    `pixel_tolerance` pixels at the equator. Vertices closer than that can't be seen on the map.
+    The width of one pixel is 360 / (tile_size * 2 ** zoom) degree.
+    """
+    return pixel_tolerance * 360 / (tile_size * 2**zoom)
+
+
+def generalize_geoseries_by_zoom(
+    geos, zooms, pixel_tolerance=0.5, grid_size=None, preserve_topology=True
+) -> dict:
+    """
+    Make a generalized copy of an EPSG:4326 GeoSeries for each web map zoom level, simplified
+    with the tolerance of `get_tolerance_of_zoom`. Lower zoom levels get coarser geometries.
+
+    Args:
+        geos: gpd.GeoSeries or array-like of shapely geometry in EPSG:4326.
+        zooms: iterable of int, the zoom levels, e.g. range(10, 17).
+        pixel_tolerance: float, the tolerance in pixels. Default is 0.5.
+        grid_size: float or None, see `simplify_geoseries`. Default is None.
+        preserve_topology: bool, see `simplify_geoseries`. Default is True.
+
+    Returns:
+        dict: {zoom: (gpd.GeoSeries, report)}, see `simplify_geoseries` for the report, with the
+            `tolerance` of the zoom level added. Nothing is printed.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        import numpy as np
+        import shapely
+        from utils.transform_geometry import generalize_geoseries_by_zoom
+
+        rng = np.random.default_rng(0)
+        points = shapely.points(rng.uniform(121.4, 121.6, 20000), rng.uniform(25, 25.1, 20000))
+        geos = gpd.GeoSeries(shapely.buffer(points, 0.0005, quad_segs=16), crs=4326)
+        generalized = generalize_geoseries_by_zoom(geos, zooms=[12, 16], grid_size=1e-7)
+        geos_z12, report_z12 = generalized[12]
+        print(report_z12)
+        ```
+        ```
+        >>> print(report_z12)
+        {'vertices_before': 1300000, 'vertices_after': 100000, 'bytes_before': 21060000, 'bytes_after': 1860000, 'vertex_reduction': 0.9231, 'byte_reduction': 0.9117, 'tolerance': 0.000171661376953125}
+        ```
+    """
+    generalized = {}
+    for zoom in zooms:
+        tolerance = get_tolerance_of_zoom(zoom, pixel_tolerance=pixel_tolerance)
+        geos_zoom, report = simplify_geoseries(
+            geos,
+            tolerance,
+            grid_size=grid_size,
+            preserve_topology=preserve_topology,
+            is_print=False,
+        )
+        report["tolerance"] = tolerance
+        generalized[zoom] = (geos_zoom, report)
+    return generalized
+
+
+def _extract_parts_of_type(arr: np.ndarray, single_type: str):
+    """
+    Explode multi geometries and geometry collections recursively, and keep the parts of
+    `single_type`. Return the parts and the index of the geometry in `arr` each part is from.
+    """
+    parts, index = shapely.get_parts(arr, return_index=True)
+    type_id = shapely.get_type_id(parts)
+    # collections in collections are exploded again
+    is_nested = type_id >= _GEOMETRY_TYPE_ID["MultiPoint"]
+    while is_nested.any():
+        nested_parts, nested_index = shapely.get_parts(
+            parts[is_nested], return_index=True
+        )
+        parts = np.concatenate([parts[~is_nested], nested_parts])
+        index = np.concatenate([index[~is_nested], index[is_nested][nested_index]])
+        type_id = shapely.get_type_id(parts)
+        is_nested = type_id >= _GEOMETRY_TYPE_ID["MultiPoint"]
+    is_kept = (type_id == _GEOMETRY_TYPE_ID[single_type]) & ~shapely.is_empty(parts)
+    return parts[is_kept], index[is_kept]
+
+
+def validate_geometry(
+    gdata: gpd.GeoDataFrame, geometry_type: str, geometry_col="geometry", is_print=True
+):
+    """
+    Validate and repair the geometries of a GeoDataFrame before they are saved to the table of
+    `geometry_type`, so the table only contains valid, non-empty geometries of the declared type.
+    All steps are vectorized, in order:
+        missing, empty: the rows are dropped.
+        invalid: repaired by `shapely.make_valid`, e.g. a self-intersecting polygon becomes a
+            MultiPolygon, and collapsed parts could become lines.
+        z: Z coordinate is dropped for 2D types, or added as 0 for Z types (e.g. LineStringZ).
+        promoted: single geometries are converted to multi for multi types.
+        extracted: the parts of the declared type are extracted from other geometries, e.g.
+            polygons from the GeometryCollection produced by make_valid, or the only part of a
+            multi geometry for single types.
+        mismatched: geometries which can't be converted to the declared type, the rows are dropped.
+
+    Args:
+        gdata: gpd.GeoDataFrame, data with geometry to be validated.
+        geometry_type: str, the geometry type of the table, see `save_geodataframe_to_postgresql`,
+            e.g. 'MultiPolygon', 'MultiLineStringZ'.
+        geometry_col: str, the geometry column name. Default is 'geometry'.
+        is_print: bool, whether to print the report. Default is True.
+
+    Returns:
+        gpd.GeoDataFrame: the rows with valid geometries of `geometry_type`.
+        dict: the number of rows of each fix, with keys `total`, `missing`, `empty`,
+            `invalid`, `z`, `promoted`, `extracted`, `mismatched`, `dropped`, `output`.
+
+    Raises:
+        ValueError: If `geometry_type` isn't a (Multi)Point, (Multi)LineString or
+            (Multi)Polygon type, with or without Z.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import geopandas as gpd
+        from shapely.geometry import LineString, Polygon, box
+        from utils.transform_geometry import validate_geometry
+
+        gdata = gpd.GeoDataFrame(
+            {'id': [1, 2, 3, 4, 5]},
+            geometry=[
+                box(0, 0, 1, 1),
+                Polygon([(0, 0), (1, 1), (1, 0), (0, 1)]),  # self-intersecting bowtie
+                Polygon(),
+                None,
+                LineString([(0, 0), (1, 1)]),
+            ],
+        )
+        gdata, report = validate_geometry(gdata, 'MultiPolygon')
+        print(gdata['geometry'].geom_type.tolist())
+        ```
+        ```
+        >>> output:
+        Geometry validated, total: 5, missing: 1, empty: 1, invalid: 1, z: 0, promoted: 1, extracted: 0, mismatched: 1, dropped: 3, output: 2.
+        >>> print(gdata['geometry'].geom_type.tolist())
+        ['MultiPolygon', 'MultiPolygon']
+        ```
+    """
+    is_z_type = geometry_type.endswith("Z")
+    base_type = geometry_type[:-1] if is_z_type else geometry_type
+    is_multi_type = base_type.startswith("Multi")
+    single_type = base_type[5:] if is_multi_type else base_type
+    multi_type = f"Multi{single_type}"
+    _check_single_type(single_type, geometry_type)
+
+    arr = _to_geometry_array(gdata[geometry_col]).copy()
+    report = {"total": len(arr)}
+
+    is_missing = shapely.is_missing(arr)
+    is_empty = ~is_missing & shapely.is_empty(arr)
+    is_ok = ~is_missing & ~is_empty
+    report["missing"] = int(is_missing.sum())
+    report["empty"] = int(is_empty.sum())
+
+    is_invalid = is_ok & ~shapely.is_valid(arr)
+    arr[is_invalid] = shapely.make_valid(arr[is_invalid])
+    report["invalid"] = int(is_invalid.sum())
+
+    has_z = shapely.has_z(arr)
+    is_z_fixed = is_ok & (has_z != is_z_type)
+    z_func = shapely.force_3d if is_z_type else shapely.force_2d
+    arr[is_z_fixed] = z_func(arr[is_z_fixed])
+    report["z"] = int(is_z_fixed.sum())
+
+    type_id = shapely.get_type_id(arr)
+    is_single = is_ok & (type_id == _GEOMETRY_TYPE_ID[single_type])
+    is_multi = is_ok & (type_id == _GEOMETRY_TYPE_ID[multi_type])
+    is_promoted = np.zeros(len(arr), dtype=bool)
+    if is_multi_type:
+        is_promoted = is_single
+        arr[is_promoted] = _MULTI_FUNC[single_type](arr[is_promoted][:, np.newaxis])
+        is_other = is_ok & ~is_single & ~is_multi
+    else:
+        is_other = is_ok & ~is_single
+    report["promoted"] = int(is_promoted.sum())
+
+    # extract the parts of the declared type from the other geometries
+    is_extracted = np.zeros(len(arr), dtype=bool)
+    other_idx = np.flatnonzero(is_other)
+    parts, part_index = _extract_parts_of_type(arr[other_idx], single_type)
+    if is_multi_type:
+        # rebuild one multi geometry of the parts of each geometry
+        kept_index, part_index = np.unique(part_index, return_inverse=True)
+        arr[other_idx[kept_index]] = _MULTI_FUNC[single_type](parts, indices=part_index)
+        is_extracted[other_idx[kept_index]] = True
+    else:
+        # only a geometry with exactly one part can be converted to the single type
+        kept_index, counts = np.unique(part_index, return_counts=True)
+        kept_index = kept_index[counts == 1]
+        arr[other_idx[kept_index]] = parts[np.isin(part_index, kept_index)]
+        is_extracted[other_idx[kept_index]] = True
+    report["extracted"] = int(is_extracted.sum())
+
+    is_mismatched = is_other & ~is_extracted
+    report["mismatched"] = int(is_mismatched.sum())
+
+    is_kept = is_ok & ~is_mismatched
+    report["dropped"] = int((~is_kept).sum())
+    report["output"] = int(is_kept.sum())
+
+    gdata = gdata.copy()
+    gdata[geometry_col] = _to_geoseries(arr, gdata[geometry_col])
+    gdata = gdata[is_kept]
+    if is_print:
+        report_str = ", ".join(f"{key}: {value}" for key, value in report.items())
+        print(f"Geometry validated, {report_str}.")
+    return gdata, report
+
+
+@lru_cache(maxsize=32)
+def get_transformer(from_crs: int, to_crs: int) -> Transformer:
+    """
+    Get the pyproj.Transformer from EPSG `from_crs` to EPSG `to_crs` with x, y (lng, lat) order.
+    Creating a Transformer is expensive, so it is cached and reused across calls.
+    """
+    return Transformer.from_crs(f"EPSG:{from_crs}", f"EPSG:{to_crs}", always_xy=True)
+
+
+def transform_xy(x, y, from_crs: int, to_crs=4326):
+    """
+    Transform x, y coordinate arrays from EPSG `from_crs` to EPSG `to_crs` in one vectorized call.
+    The arrays are returned as float arrays without transform if `from_crs` equals `to_crs`.
+    NaN coordinates stay NaN.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        from utils.transform_geometry import transform_xy
+
+        lng, lat = transform_xy([262403.2367], [2779407.0527], from_crs=3826)
+        print(lng, lat)
+        ```
+        ```
+        >>> print(lng, lat)
+        [121.123] [25.12300019]
+        ```
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if from_crs == to_crs:
+        return x, y
+    return get_transformer(from_crs, to_crs).transform(x, y)
+
+
+def reproject_geoseries(
+    geos: gpd.GeoSeries, from_crs: int, to_crs=4326
+) -> gpd.GeoSeries:
+    """
+    Reproject a GeoSeries from EPSG `from_crs` to EPSG `to_crs`.
+    The crs of `geos` is overridden by `from_crs`, and nothing is transformed if `from_crs`
+    equals `to_crs`. GeoSeries.to_crs transforms all coordinates in one vectorized call with a
+    cached transformer, so it is used directly for the other cases.
+    """
+    geos = geos.set_crs(f"EPSG:{from_crs}", allow_override=True)
+    if from_crs == to_crs:
+        return geos
+    return geos.to_crs(epsg=to_crs)
+
+
 def add_point_wkbgeometry_column_to_df(
     data: pd.DataFrame,
     x: pd.Series,
@@ -136,6 +736,7 @@ def add_point_wkbgeometry_column_to_df(
     Convert original DataFrame with x and y to GeoDataFrame with wkbgeometry.
     Input should be a pandas.DataFrame.
     Output will be a geopandas.GeoDataFrame and add 3 columns - wkb_geometry, lng, lat.
+    The wkb_geometry column is hex EWKB string, see `convert_geoseries_to_ewkb`.
 
     Parameters
     ----------
@@ -172,40 +773,31 @@ def add_point_wkbgeometry_column_to_df(
         >>> print(gdf.iloc[0])
         id                                                          1
         attribute                                                   A
-        geometry        POINT (121.12299999921674 25.123000193639967)
-        lng                                                   121.123
-        lat                                                    25.123
-        wkb_geometry    POINT (121.12299999921674 25.123000193639967)
+        geometry            POINT (121.12299999921674 25.123000193639967)
+        lng                                                       121.123
+        lat                                                        25.123
+        wkb_geometry    0101000020E6100000D082633BDF475E40D815D1F07C1F3940
         Name: 0, dtype: object
         ```
     """
     # covert column type
     x = pd.to_numeric(x, errors="coerce")
     y = pd.to_numeric(y, errors="coerce")
+    # transform the coordinate arrays before building points, skipped if from_crs == to_crs
+    x, y = transform_xy(x, y, from_crs=from_crs, to_crs=to_crs)
     geometry = gpd.points_from_xy(x, y)
 
     # make df to gdf
     df = data.copy()
-    gdf = gpd.GeoDataFrame(df, geometry=geometry, crs=f"EPSG:{from_crs}")
-    if from_crs == to_crs:
-        gdf = gdf.to_crs(epsg=from_crs)
-        gdf = gdf.to_crs(epsg=to_crs)
-    else:
-        gdf = gdf.to_crs(epsg=to_crs)
+    gdf = gpd.GeoDataFrame(df, geometry=geometry, crs=f"EPSG:{to_crs}")
 
     # add column
     if is_add_xy_columns:
-        geo_type = gdf["geometry"].type.iloc[0]
-        if geo_type == "Point":
-            gdf["lng"] = gdf["geometry"].map(
-                lambda ele: ele.x if not ele.is_empty else nan
-            )
-            gdf["lat"] = gdf["geometry"].map(
-                lambda ele: ele.y if not ele.is_empty else nan
-            )
-    gdf["wkb_geometry"] = gdf["geometry"].apply(
-        lambda x: WKTElement(x.wkt, srid=to_crs) if x is not None else None
-    )
+        # every geometry is a point built from the transformed arrays, so take lng/lat from them
+        # directly, missing coordinates are already NaN
+        gdf["lng"] = x
+        gdf["lat"] = y
+    gdf["wkb_geometry"] = convert_geoseries_to_ewkb(gdf["geometry"], srid=to_crs)
 
     return gdf
 
@@ -215,6 +807,7 @@ def convert_geometry_to_wkbgeometry(
 ) -> gpd.GeoDataFrame:
     """
     Convert geometry column of GeoDataframe to wkbgeometry.
+    The wkb_geometry column is hex EWKB string, see `convert_geoseries_to_ewkb`.
 
     Example:
         ``` python
@@ -245,20 +838,16 @@ def convert_geometry_to_wkbgeometry(
         id                                                              1
         attribute                                                       A
         geometry        POLYGON ((121.12299765144614 25.12299971980088...
-        wkb_geometry    POLYGON ((121.12299765144614 25.12299971980088...
+        wkb_geometry    0103000020E610000001000000040000008B9C8A31DF47...
         Name: 0, dtype: object
         ```
     """
     # to make sure gdf is in `from_crs` projection
     gdf.crs = f"EPSG:{from_crs}"
 
-    if from_crs == to_crs:
-        gdf = gdf.to_crs(epsg=from_crs)
-        gdf = gdf.to_crs(epsg=to_crs)
-    else:
-        gdf = gdf.to_crs(epsg=to_crs)
-    gdf["wkb_geometry"] = gdf["geometry"].apply(
-        lambda x: WKTElement(x.wkt, srid=to_crs) if x is not None else None
-    )
+    # reproject with cached transformer, skipped if from_crs == to_crs
+    geometry = reproject_geoseries(gdf["geometry"], from_crs=from_crs, to_crs=to_crs)
+    gdf = gdf.set_geometry(geometry)
+    gdf["wkb_geometry"] = convert_geoseries_to_ewkb(gdf["geometry"], srid=to_crs)
 
     return gdf
@@ -1,17 +1,119 @@
 import re
 from datetime import datetime
-from math import isinf
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import pytz
 from numpy import nan
 
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
 TAIPEI_TZ = pytz.timezone("Asia/Taipei")
+# number of values used to guess the time format of a column
+FORMAT_SAMPLE_SIZE = 100
+# parse only the unique values of a column if it is long and repeated enough
+# The ratio is estimated by a random sample of CACHE_SAMPLE_SIZE values before the whole column
+#   is factorized, so a mostly unique column isn't factorized for nothing.
+CACHE_MIN_ROWS = 50
+CACHE_MAX_UNIQUE_RATIO = 0.5
+CACHE_SAMPLE_SIZE = 2000
+
+
+# the time with Chinese AM/PM like '2022/7/14 下午 03:04:05.000', the AM/PM and second are optional
+_CHINESE_TIME_REGEX = (
+    r"^\s*(?P<year>\d{4})[/-](?P<month>\d{1,2})[/-](?P<day>\d{1,2})[\sT]*"
+    r"(?P<period>上午|下午|AM|PM|am|pm)?\s*(?P<hour>\d{1,2}):(?P<minute>\d{1,2})"
+    r"(?::(?P<second>\d{1,2}))?(?:\.(?P<fraction>\d+))?\s*$"
+)
+_CHINESE_TIME_PATTERN = re.compile(_CHINESE_TIME_REGEX)
+
+
+def normalize_chinese_time(time_column: pd.Series, errors="raise") -> pd.Series:
+    """
+    Convert a time column with Chinese AM/PM like "上午" or "下午", and even ".000" at the end,
+    to datetime. The column is split by one regex, and the hour is converted to 24-hour clock by
+    array arithmetic: 上午12 is 00, 下午12 is 12, and 下午1-11 is plus 12. The hour can be 1 or
+    2 digits, and the time without AM/PM is kept as is.
+    The output is naive, and can be passed to `convert_str_to_time_format` for the timezone.
+
+    Args:
+        time_column: pd.Series, the time strings, the missing values are NaT.
+        errors: {'raise', 'coerce'}, default 'raise'. If 'raise', the value not matched or not
+            valid raises ValueError. If 'coerce', it is NaT.
+
+    Returns: pd.Series, with dtype datetime64[ns].
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import pandas as pd
+        from utils.transform_time import normalize_chinese_time
+
+        time_column = pd.Series([
+            '2022/7/14 上午 12:00:00', '2022/7/14 下午 12:00:00.000', '2022/7/14 下午 3:04:05',
+            '2022-07-14 15:04:05', None
+        ])
+        print(normalize_chinese_time(time_column))
+        ```
+        ```
+        >>> output:
+        0   2022-07-14 00:00:00
+        1   2022-07-14 12:00:00
+        2   2022-07-14 15:04:05
+        3   2022-07-14 15:04:05
+        4                   NaT
+        dtype: datetime64[ns]
+        ```
+    """
+    strings = _to_arrow_string(time_column)
+    matches = pc.extract_regex(strings, _CHINESE_TIME_REGEX)
+    is_unmatched = np.asarray(pc.is_null(matches)) & np.asarray(pc.is_valid(strings))
+    if errors == "raise" and is_unmatched.any():
+        raise ValueError(
+            f"time data {time_column[is_unmatched].iloc[0]!r} doesn't match "
+            "'%Y/%m/%d 上午|下午 %I:%M:%S'"
+        )
+
+    units = {}
+    for unit in ("year", "month", "day", "hour", "minute", "second", "fraction"):
+        part = pc.struct_field(matches, [unit])
+        if unit == "fraction":
+            # '5' is 500000 microseconds
+            unit = "microsecond"
+            part = pc.utf8_slice_codeunits(pc.utf8_rpad(part, 6, "0"), 0, 6)
+        elif unit == "second":
+            # the second is optional
+            part = pc.if_else(pc.equal(part, ""), "0", part)
+        units[unit] = pc.cast(part, pa.int64()).to_numpy(zero_copy_only=False)
+
+    period = pc.struct_field(matches, ["period"])
+    is_am = np.asarray(pc.is_in(period, pa.array(["上午", "AM", "am"])))
+    is_pm = np.asarray(pc.is_in(period, pa.array(["下午", "PM", "pm"])))
+    # 上午12 = 00, 下午12 = 12, 下午1 = 13, and the hour over 12 is invalid (24)
+    hour = units["hour"]
+    hour_12 = np.where(hour > 12, 24, hour % 12 + np.where(is_pm, 12, 0))
+    units["hour"] = np.where(is_am | is_pm, hour_12, hour)
+    result = _assemble_datetime(units, errors=errors)
+    return pd.Series(result, index=time_column.index, name=time_column.name)
 
 
 def omit_chinese_string_in_time(x: str):
     """
-    Process time column with Chinese string like "上午" or "下午", and even ".000" at the end.
+    Process a time string with Chinese string like "上午" or "下午", and even ".000" at the end.
+    This is the scalar version of `normalize_chinese_time` with the same regex, use that on a
+    whole column instead of `.apply` this function. The string which doesn't match or isn't a
+    valid time is returned as is.
 
     Example:
         import os
@@ -24,143 +126,508 @@ def omit_chinese_string_in_time(x: str):
         omit_chinese_string_in_time(None)
         # Output:
         omit_chinese_string_in_time("2022/7/14 上午 12:00:00")
-        # Output: '2022-07-14 12:00:00'
-        omit_chinese_string_in_time("2022/7/14 下午 12:00:00")
         # Output: '2022-07-14 00:00:00'
-        omit_chinese_string_in_time("2022/7/14 下午 12:00:00.000")
+        omit_chinese_string_in_time("2022/7/14 下午 12:00:00")
         # Output: '2022-07-14 12:00:00'
+        omit_chinese_string_in_time("2022/7/14 下午 3:00:00.000")
+        # Output: '2022-07-14 15:00:00'
+        omit_chinese_string_in_time("114年7月14日")
+        # Output: '114年7月14日'
     """
-    if x:
-        x = x.replace(".000", "")
-        x = x.replace("  ", " ")
-        split_x = x.split(" ")
-        if split_x[1] == "上午":
-            hour = int(split_x[2][0:2])
-            if hour == 12:  # 上午12=00點
-                fine_x = split_x[0] + " " + "00" + split_x[2][2:]
-            else:  # 不用轉換
-                fine_x = split_x[0] + " " + split_x[2]
-        elif split_x[1] == "下午":
-            hour = int(split_x[2][0:2]) + 12  # 下午 = +12
-            if hour == 24:  # 下午12點=12點
-                hour = 12
-            fine_x = split_x[0] + " " + str(hour) + split_x[2][2:]
-        else:
-            # print(x)
-            pattern = r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}"
-            if re.match(pattern, x)[0]:
-                fine_x = x
-            else:
-                fine_x = re.findall(pattern, x)[0]
-        return fine_x
-    else:
+    if not x:
         return None
+    match = _CHINESE_TIME_PATTERN.match(x) if isinstance(x, str) else None
+    if match is None:
+        return x
+
+    hour = int(match["hour"])
+    if match["period"]:
+        if hour > 12:
+            return x
+        # 上午12 = 00, 下午12 = 12, 下午1 = 13
+        hour = hour % 12 + (12 if match["period"] in ("下午", "PM", "pm") else 0)
+    try:
+        fine_x = datetime(
+            int(match["year"]),
+            int(match["month"]),
+            int(match["day"]),
+            hour,
+            int(match["minute"]),
+            int(match["second"] or 0),
+        )
+    except ValueError:
+        return x
+    return fine_x.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _to_arrow_string(time_column: pd.Series) -> pa.Array:
+    """
+    Convert a column to a pyarrow string array for the vectorized regex, the values that are
+    not string are null.
+    """
+    try:
+        return pa.array(time_column, type=pa.string(), from_pandas=True)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # skip value that is not string
+        is_str = time_column.map(lambda x: isinstance(x, str))
+        return pa.array(time_column.where(is_str), type=pa.string(), from_pandas=True)
 
 
 def _convert_inf_to_nan(series: pd.Series) -> pd.Series:
     """
-    Check if there is inf in the series, and convert it to None.
-    Because inf is not supported in pd.to_datetime.
+    Check if there is inf, empty string or null (None, NaN, NaT) in the series, and convert
+    it to NaN. Because inf is not supported in pd.to_datetime.
+    The input series is not modified.
 
     Example
     ----------
     _convert_inf_to_nan(pd.Series(['2023/12/12', None, float('-inf'), float('inf')]))
     """
-    is_inf = series.apply(lambda x: isinstance(x, float) and isinf(x))
-    is_na = pd.isna(series)
-    is_empty_str = series == ""
-    is_invalid = is_na | is_empty_str | is_inf
-    if any(is_invalid):
-        series.loc[is_invalid] = nan
+    if not (
+        pd.api.types.is_object_dtype(series) or pd.api.types.is_float_dtype(series)
+    ):
+        return series
+    # isin compares by hash, so only the float inf values match, not the strings
+    is_invalid = series.isna() | series.isin([np.inf, -np.inf, ""])
+    if is_invalid.any():
+        series = series.mask(is_invalid, nan)
     return series
 
 
+def _guess_time_format(time_column: pd.Series, sample_size=FORMAT_SAMPLE_SIZE):
+    """
+    Guess the format of a string time column by a sample of its values, so the whole column
+    can be parsed with an explicit format instead of being inferred by pandas.
+    Return None if the column is not string, or no format fits all the sampled values.
+
+    Example
+    ----------
+    _guess_time_format(pd.Series(['2022/12/31 00:12:21', '2022/1/31 01:02:03']))
+    # Output:
+    # '%Y/%m/%d %H:%M:%S'
+    """
+    sample = time_column.dropna()
+    sample = sample.iloc[:sample_size]
+    if sample.empty or not all(isinstance(x, str) for x in sample):
+        return None
+
+    time_format = guess_datetime_format(sample.iloc[0])
+    if time_format is None:
+        return None
+    # make sure the guessed format fits the other sampled values, the values with offsets are
+    # parsed as UTC, so the sample with mixed offsets fits too
+    try:
+        pd.to_datetime(sample, format=time_format, utc="%z" in time_format)
+    except (ValueError, TypeError):
+        return None
+    return time_format
+
+
+# The regex of the format directives, as (min digits, max digits). The year of Minguo calendar
+# has 2 digits before 1922 (year 11), and 3 digits after.
+_DIRECTIVE_DIGITS = {
+    "TY": (2, 3),
+    "Y": (4, 4),
+    "m": (1, 2),
+    "d": (1, 2),
+    "H": (1, 2),
+    "M": (1, 2),
+    "S": (1, 2),
+    "f": (1, 6),
+}
+# the datetime units of the digit directives
+_DIRECTIVE_UNITS = {
+    "TY": "year",
+    "Y": "year",
+    "m": "month",
+    "d": "day",
+    "H": "hour",
+    "M": "minute",
+    "S": "second",
+    "f": "microsecond",
+}
+_DIRECTIVE_REGEX = re.compile(r"%(TY|.)")
+
+
+@lru_cache(maxsize=32)
+def _compile_minguo_format(format_str: str):
+    """
+    Compile a format string with '%TY' to a regex (RE2 syntax, for pyarrow) with one named
+    group per directive.
+    The digit directives next to another directive (e.g. '%TY%m%d') are fixed width, so the
+    values can be split without separators. Other directives like '%b' or '%p' are matched
+    lazily and kept as string.
+    Return (regex, pieces, is_all_digit), `pieces` is the list of (directive, literal) in order,
+    and the directive is None for a literal.
+
+    Example
+    ----------
+    _compile_minguo_format('%TY/%m/%d')
+    # Output:
+    # ('^\\s*(?P<p0>\\d{2,3})/(?P<p2>\\d{1,2})/(?P<p4>\\d{1,2})\\s*$',
+    #  [('TY', None), (None, '/'), ('m', None), (None, '/'), ('d', None)], True)
+    """
+    pieces = []
+    last_end = 0
+    for match in _DIRECTIVE_REGEX.finditer(format_str):
+        if match.start() > last_end:
+            pieces.append((None, format_str[last_end : match.start()]))
+        if match.group(1) == "%":
+            pieces.append((None, "%"))
+        else:
+            pieces.append((match.group(1), None))
+        last_end = match.end()
+    if last_end < len(format_str):
+        pieces.append((None, format_str[last_end:]))
+
+    patterns = []
+    for i, (directive, literal) in enumerate(pieces):
+        if directive is None:
+            # strptime matches any whitespace for a space in format
+            patterns.append(r"\s+".join(re.escape(x) for x in literal.split(" ")))
+            continue
+        if directive not in _DIRECTIVE_DIGITS:
+            patterns.append(rf"(?P<p{i}>.+?)")
+            continue
+        min_digit, max_digit = _DIRECTIVE_DIGITS[directive]
+        is_adjacent = any(
+            0 <= j < len(pieces) and pieces[j][0] is not None for j in (i - 1, i + 1)
+        )
+        if is_adjacent and directive != "TY":
+            min_digit = max_digit
+        patterns.append(rf"(?P<p{i}>\d{{{min_digit},{max_digit}}})")
+    regex = r"^\s*" + "".join(patterns) + r"\s*$"
+    is_all_digit = all(
+        directive is None or directive in _DIRECTIVE_DIGITS for directive, _ in pieces
+    )
+    return regex, pieces, is_all_digit
+
+
+def _assemble_datetime(units: dict, errors="raise") -> np.ndarray:
+    """
+    Assemble datetimes from the arrays of year, month, day, hour, minute, second and microsecond
+    by numpy datetime64 arithmetic, without formatting them to strings and parsing again.
+    The missing units are the same defaults as strptime. The rows with NaN are NaT, and the
+    invalid dates (e.g. 2月30日) raise ValueError, or are NaT if `errors` is not 'raise'.
+    Return a datetime64[ns] array.
+
+    Example
+    ----------
+    _assemble_datetime({'year': np.array([2021, np.nan]), 'month': np.array([12, 1])})
+    # Output:
+    # array(['2021-12-01T00:00:00.000000000', 'NaT'], dtype='datetime64[ns]')
+    """
+    n_rows = max(np.size(value) for value in units.values())
+    is_missing = np.zeros(n_rows, dtype=bool)
+    values = {}
+    for unit, default in (
+        ("year", 1900),
+        ("month", 1),
+        ("day", 1),
+        ("hour", 0),
+        ("minute", 0),
+        ("second", 0),
+        ("microsecond", 0),
+    ):
+        value = np.broadcast_to(
+            np.asarray(units.get(unit, default), dtype="float64"), n_rows
+        )
+        is_missing |= np.isnan(value)
+        values[unit] = np.where(np.isnan(value), default, value).astype(np.int64)
+
+    month_start = (values["year"] - 1970).astype("datetime64[Y]").astype(
+        "datetime64[M]"
+    ) + (values["month"] - 1).astype("timedelta64[M]")
+    date = month_start.astype("datetime64[D]") + (values["day"] - 1).astype(
+        "timedelta64[D]"
+    )
+    is_valid = (
+        # the range of datetime64[ns]
+        (values["year"] > 1677)
+        & (values["year"] < 2262)
+        & (values["month"] >= 1)
+        & (values["month"] <= 12)
+        & (values["day"] >= 1)
+        # the day is not out of the month
+        & (date.astype("datetime64[M]") == month_start)
+        & (values["hour"] < 24)
+        & (values["minute"] < 60)
+        & (values["second"] < 60)
+    )
+    is_invalid = ~is_valid & ~is_missing
+    if errors == "raise" and is_invalid.any():
+        i = np.flatnonzero(is_invalid)[0]
+        raise ValueError(
+            "invalid datetime "
+            + ", ".join(f"{unit}={value[i]}" for unit, value in values.items())
+            + f", at position {i}"
+        )
+
+    result = (
+        date.astype("datetime64[ns]")
+        + (values["hour"] * 3600 + values["minute"] * 60 + values["second"]).astype(
+            "timedelta64[s]"
+        )
+        + values["microsecond"].astype("timedelta64[us]")
+    )
+    result[is_missing | is_invalid] = np.datetime64("NaT")
+    return result
+
+
 def _minguo_calendar_to_gregorian(
-    time_column: pd.Series, format_str: str, ty_pattern: str = "%TY"
+    time_column: pd.Series,
+    format_str: str,
+    errors: str = "raise",
+    ty_pattern: str = "%TY",
 ):
     """
-    Convert Minguo calendar string to Gregorian calendar string. Minguo calendar is a calendar used
+    Convert Minguo calendar string to Gregorian calendar. Minguo calendar is a calendar used
     in Taiwan, which is the Gregorian calendar with the year minus 1911. For example, 2021 in
     Gregorian calendar is 110 in Minguo calendar.
+    The column is split by a regex compiled from `format_str` in one vectorized call, so
+    '%TY' can be anywhere in the format, with 2 or 3 digits.
+    If the format only has digit directives (%TY, %Y, %m, %d, %H, %M, %S, %f), the datetimes are
+    assembled from the integer parts directly, and the returned format is None. Otherwise, the
+    Gregorian year is put back to the string, and the returned format uses '%Y'.
+    The input column is not modified.
 
     Args
     -----
     time_column: pandas.Series, the column to be converted, with dtype str.
     format_str: str, the format string of the time_column.
+    errors: {'ignore', 'raise', 'coerce'}, default 'raise', the same as pd.to_datetime.
     ty_pattern: str, the pattern of the year in Minguo calendar. Default is '%TY'.
 
     Example
     ----------
-    time_column = pd.Series(['1101230', '1101231'])
+    time_column = pd.Series(['1101230', '991231', nan])
     format_str = '%TY%m%d'
     tc, fs = _minguo_calendar_to_gregorian(time_column, format_str)
     print(tc)
     print(fs)
     # Output:
     # >>> print(tc)
-    # 0    20211230
-    # 1    20211231
-    # dtype: object
+    # 0   2021-12-30
+    # 1   2010-12-31
+    # 2          NaT
+    # dtype: datetime64[ns]
     # >>> print(fs)
-    # %Y%m%d
+    # None
 
-    time_column = pd.Series(['12/30/110', '12/31/110', nan])
-    format_str = '%m/%d/%TY'
-    tc, fs = _minguo_calendar_to_gregorian(time_column, format_str)
+    tc, fs = _minguo_calendar_to_gregorian(pd.Series(['Dec 30 110']), '%b %d %TY')
     print(tc)
     # >>> print(tc)
-    # 0    12/30/2021
-    # 1    12/31/2021
-    # 2           NaN
+    # 0    Dec 30 2021
     # dtype: object
     print(fs)
     # >>> print(fs)
-    # %m/%d/%Y
+    # %b %d %Y
     """
-    if ty_pattern in format_str:
-        is_ty_at_start = format_str.startswith(ty_pattern)
-        is_ty_at_end = format_str.endswith(ty_pattern)
+    if ty_pattern not in format_str:
+        return time_column, format_str
+    gregorian_format = format_str.replace(ty_pattern, "%Y")
+    if not (
+        pd.api.types.is_object_dtype(time_column)
+        or pd.api.types.is_string_dtype(time_column)
+    ):
+        # no string to be converted
+        return time_column, gregorian_format
+
+    regex, pieces, is_all_digit = _compile_minguo_format(format_str)
+    strings = _to_arrow_string(time_column)
+    # split all rows in one call of the RE2 engine, the unmatched rows are null
+    matches = pc.extract_regex(strings, regex)
+    is_unmatched = np.asarray(pc.is_null(matches)) & np.asarray(pc.is_valid(strings))
+    if is_unmatched.any():
+        if errors == "raise":
+            raise ValueError(
+                f"time data {time_column[is_unmatched].iloc[0]!r} doesn't match format "
+                f"{format_str!r}"
+            )
+        if errors == "ignore":
+            return time_column, gregorian_format
+
+    directives = [directive for directive, _ in pieces if directive is not None]
+    parts = {
+        directive: pc.struct_field(matches, [i])
+        for i, directive in enumerate(directives)
+    }
+    parts["TY"] = pc.add(pc.cast(parts["TY"], pa.int64()), 1911)
+    if is_all_digit:
+        units = {}
+        for directive, part in parts.items():
+            if directive == "f":
+                # '5' is 500000 microseconds
+                part = pc.utf8_rpad(part, 6, "0")
+            units[_DIRECTIVE_UNITS[directive]] = pc.cast(part, pa.int64()).to_numpy(
+                zero_copy_only=False
+            )
+        try:
+            gregorian = _assemble_datetime(
+                units, errors="raise" if errors == "ignore" else errors
+            )
+        except ValueError:
+            if errors == "ignore":
+                return time_column, gregorian_format
+            raise
+        gregorian = pd.Series(gregorian, index=time_column.index, name=time_column.name)
+        return gregorian, None
+
+    # put the Gregorian year back to the string
+    gregorian = pc.binary_join_element_wise(
+        *[
+            literal if directive is None else pc.cast(parts[directive], pa.string())
+            for directive, literal in pieces
+        ],
+        "",
+    )
+    gregorian = pd.Series(
+        gregorian.to_numpy(zero_copy_only=False),
+        index=time_column.index,
+        name=time_column.name,
+    )
+    # keep the values not matched, e.g. NaN
+    gregorian = gregorian.where(gregorian.notna(), time_column)
+    if is_unmatched.any():
+        gregorian = gregorian.where(~is_unmatched, nan)
+    return gregorian, gregorian_format
+
+
+@lru_cache(maxsize=32)
+def get_timezone(timezone: str):
+    """
+    Get the pytz timezone object by name, cached so it is built once per process.
+    All timezone names can be found in pytz.all_timezones.
 
-        is_str = time_column.apply(lambda x: isinstance(x, str))
-        # skip value that is not string
-        time_column_only_str = time_column.loc[is_str]
-        if is_ty_at_start:
-            minguo_year = time_column_only_str.str[:3]
-            gregorian_year = (minguo_year.astype(int) + 1911).astype(str)
-            time_column_only_str = gregorian_year + time_column_only_str.str[3:]
-        elif is_ty_at_end:
-            minguo_year = time_column_only_str.str[-3:]
-            gregorian_year = (minguo_year.astype(int) + 1911).astype(str)
-            time_column_only_str = time_column_only_str.str[:-3] + gregorian_year
-        else:
-            raise ValueError("Can not process %TY in the middle of the format string")
-        time_column.loc[is_str] = time_column_only_str
+    Example
+    ----------
+    get_timezone('Asia/Taipei')
+    # Output:
+    # <DstTzInfo 'Asia/Taipei' LMT+8:06:00 STD>
+    """
+    return pytz.timezone(timezone)
 
-    return time_column, format_str.replace("TY", "Y")
 
+# a time string ends with an UTC offset, e.g. '2024-01-01 00:00:00+08:00' or '...T00:00Z'
+_OFFSET_REGEX = r"\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?\s*(?:Z|[+-]\d{2}:?\d{2})$"
 
-def _get_offset_hour(timezone: str) -> int:
-    """
-    Get the UTC offset hours of a given timezone.
 
-    Args
-    -----
-    timezone: str, the timezone name.
-        All timezone names can be found in pytz.all_timezones.
+def _has_offset(time_column: pd.Series) -> bool:
+    """
+    Check if any string of a time column ends with an UTC offset.
+    """
+    if not (
+        pd.api.types.is_object_dtype(time_column)
+        or isinstance(time_column.dtype, pd.StringDtype)
+    ):
+        return False
+    return bool(
+        time_column.dropna().astype(str).str.contains(_OFFSET_REGEX, regex=True).any()
+    )
+
+
+def _localize_mixed_offsets(
+    time_column: pd.Series, timezone: str, errors="raise"
+) -> pd.Series:
+    """
+    Parse a time column whose values may or may not have their own UTC offsets, e.g. the
+    offsets before and after a DST change, or only some values with offsets.
+    The values with offsets are parsed as UTC and converted to `timezone`, so each value keeps
+    its own offset. The values without offsets are localized to `timezone`, and the DST offset
+    is decided per value.
 
     Example
     ----------
-    _get_offset_hour('Asia/Taipei')
+    _localize_mixed_offsets(
+        pd.Series(['2024-03-09 12:00:00-05:00', '2024-03-10 12:00:00-04:00', '2024-03-11', None]),
+        'America/New_York'
+    )
     # Output:
-    # '+08:00'
-    _get_offset_hour('Pacific/Pago_Pago')
-    # Output:
-    # '-11:00'
+    # 0   2024-03-09 12:00:00-05:00
+    # 1   2024-03-10 12:00:00-04:00
+    # 2   2024-03-11 00:00:00-04:00
+    # 3                         NaT
+    # dtype: datetime64[ns, America/New_York]
     """
-    tz = pytz.timezone(timezone)
-    now = datetime.now(tz)
-    offset_hours = int(now.utcoffset().total_seconds() / 3600)
-    return f"{int(offset_hours):+03}:00"
+    tz = get_timezone(timezone)
+    result = pd.Series(pd.NaT, index=time_column.index, dtype=f"datetime64[ns, {tz}]")
+    # null values would be 'None' or 'nan' after astype(str), so only the others are parsed,
+    # by position in case the index has duplicates
+    is_valid = time_column.notna().to_numpy()
+    time_str = time_column[is_valid].astype(str)
+    has_offset = np.zeros(len(time_column), dtype=bool)
+    has_offset[is_valid] = time_str.str.contains(_OFFSET_REGEX, regex=True).to_numpy()
+    no_offset = is_valid & ~has_offset
+    if has_offset.any():
+        parsed = pd.to_datetime(
+            time_column[has_offset].astype(str), utc=True, errors=errors
+        )
+        result.iloc[has_offset] = parsed.dt.tz_convert(tz).array
+    if no_offset.any():
+        parsed = pd.to_datetime(time_column[no_offset].astype(str), errors=errors)
+        result.iloc[no_offset] = parsed.dt.tz_localize(tz).array
+    return result
+
+
+def convert_datetime_to_epoch(time_column: pd.Series, unit="s") -> pd.Series:
+    """
+    Convert a datetime column to the epoch time, by the integer view of the datetime64 values
+    instead of calling `.timestamp()` per row.
+    The tz-aware input is stored as UTC, so the epoch time doesn't depend on the timezone. The
+    naive input is regarded as UTC, the same as `pd.Timestamp.timestamp()`.
+
+    Args:
+        time_column: pd.Series, with dtype datetime64, the output of
+            `convert_str_to_time_format`.
+        unit: str, 's' (seconds) or 'ms' (milliseconds). Default is 's'.
+
+    Returns: pd.Series, the float epoch time, NaT is NaN.
+
+    Example:
+        ``` python
+        import os
+        import sys
+
+        dags_path = os.path.join(os.getcwd(), 'dags')  # Should be looks like '.../dags'
+        sys.path.append(dags_path)
+        import pandas as pd
+        from utils.transform_time import convert_datetime_to_epoch, convert_str_to_time_format
+
+        time_column = convert_str_to_time_format(pd.Series(['1130101', None]), from_format='%TY%m%d')
+        print(convert_datetime_to_epoch(time_column))
+        ```
+        ```
+        >>> output:
+        0    1.704038e+09
+        1             NaN
+        dtype: float64
+        ```
+    """
+    ns_per_unit = {"s": 10**9, "ms": 10**6}[unit]
+    values = time_column.to_numpy(dtype="datetime64[ns]")
+    epoch = values.view(np.int64) / ns_per_unit
+    epoch[np.isnat(values)] = nan
+    return pd.Series(epoch, index=time_column.index, name=time_column.name)
+
+
+def _is_worth_caching(time_column: pd.Series) -> bool:
+    """
+    Check if the column is long enough, and its estimated unique ratio is low enough, for
+    parsing only the unique values. The exact ratio is checked after factorizing.
+    In a random sample of k values (with replacement) from a column with U unique values,
+    about k^2 / 2U values are repeats, so U is estimated by the repeats of the sample.
+    The sample is random instead of the first values, so the order of rows doesn't matter.
+    """
+    n_rows = len(time_column)
+    if n_rows < CACHE_MIN_ROWS:
+        return False
+    if n_rows <= CACHE_SAMPLE_SIZE:
+        # factorizing a short column costs no more than the sample
+        return True
+    positions = np.random.default_rng(0).integers(0, n_rows, CACHE_SAMPLE_SIZE)
+    n_repeats = CACHE_SAMPLE_SIZE - time_column.iloc[positions].nunique(dropna=False)
+    max_unique = n_rows * CACHE_MAX_UNIQUE_RATIO
+    return n_repeats >= CACHE_SAMPLE_SIZE**2 / (2 * max_unique)
 
 
 def convert_str_to_time_format(
@@ -173,6 +640,7 @@ def convert_str_to_time_format(
     to_timezone="Asia/Taipei",
     is_omit_microsecond=True,
     errors="raise",
+    cache=True,
 ) -> pd.Series:
     """
     A time processing function for Taiwan time zone.
@@ -186,8 +654,10 @@ def convert_str_to_time_format(
     output_level: "date" or "datetime", default "datetime".
     output_type: "str" or "time", default "time".
     from_format: Default is None, indicating a common format. In this case, the function will
-        automatically parse the input. Alternatively, you can provide a string like "%TY/%m/%d" or
-        "%Y%m%d" in specific format. All format codes can be found in
+        guess the format by a sample of the input, and parse the whole input with it. If no
+        format fits the sample, the input is parsed by pandas automatically.
+        Alternatively, you can provide a string like "%TY/%m/%d" or "%Y%m%d" in specific format.
+        All format codes can be found in
         https://docs.python.org/3/library/datetime.html#strftime-and-strptime-behavior.
         The only difference is that the year in Minguo calendar should be represented by '%TY'
         instead of '%Y'.
@@ -201,6 +671,10 @@ def convert_str_to_time_format(
         - If 'raise', then invalid parsing will raise an exception.
         - If 'coerce', then invalid parsing will be set as NaT.
         - If 'ignore', then invalid parsing will return the input.
+    cache: default True, which means only the unique values are parsed and mapped back, when
+        the input is long and has many repeated values, e.g. a scalar broadcast `data_time`
+        column or the update time of a feed. The time and memory then scale with the number
+        of unique values instead of rows.
 
     Example:
         ``` python
@@ -270,29 +744,63 @@ def convert_str_to_time_format(
         # <class 'str'>
         ```
     """
+    if cache and _is_worth_caching(time_column):
+        codes, uniques = pd.factorize(time_column, use_na_sentinel=False)
+        if len(uniques) <= len(time_column) * CACHE_MAX_UNIQUE_RATIO:
+            parsed = convert_str_to_time_format(
+                pd.Series(uniques, name=time_column.name),
+                from_format=from_format,
+                output_level=output_level,
+                output_type=output_type,
+                is_from_utc=is_from_utc,
+                from_timezone=from_timezone,
+                to_timezone=to_timezone,
+                is_omit_microsecond=is_omit_microsecond,
+                errors=errors,
+                cache=False,
+            )
+            parsed = parsed.take(codes)
+            parsed.index = time_column.index
+            return parsed
+
     time_column = _convert_inf_to_nan(time_column)
 
     if from_format:
         time_column, from_format = _minguo_calendar_to_gregorian(
-            time_column, from_format
+            time_column, from_format, errors=errors
         )
+    else:
+        from_format = _guess_time_format(time_column)
 
     if is_from_utc:
-        time_column = pd.to_datetime(time_column, utc=True, errors=errors)
-        time_column = time_column.dt.tz_convert(to_timezone)
+        time_column = pd.to_datetime(
+            time_column, format=from_format, utc=True, errors=errors
+        )
+        time_column = time_column.dt.tz_convert(get_timezone(to_timezone))
     else:
         try:
-            time_column = pd.to_datetime(time_column, utc=is_from_utc, erroe=errors)
-            time_column = time_column.dt.tz_localize(from_timezone)
-        except TypeError:
-            # if the input is not a string, it will raise a TypeError
-            # If parsing fails, convert input to string, remove timezone, and retry.
-            offset_hour_str = _get_offset_hour(from_timezone)
-            time_column = time_column.astype(str).str.replace(
-                offset_hour_str, "", regex=False
-            )
-            time_column = pd.to_datetime(time_column, utc=is_from_utc, errors=errors)
-            time_column = time_column.dt.tz_localize(from_timezone)
+            if pd.api.types.is_numeric_dtype(time_column):
+                # numbers are not epoch here, parse them as strings like '20240101'
+                raise TypeError("numeric time column")
+            if from_format and ("%z" in from_format):
+                # parse as UTC, so mixed offsets are not parsed to objects
+                parsed = pd.to_datetime(
+                    time_column, format=from_format, utc=True, errors=errors
+                )
+            elif (from_format is None) and _has_offset(time_column):
+                # the offsets can't be inferred with one format
+                raise TypeError("time column with offsets")
+            else:
+                parsed = pd.to_datetime(time_column, format=from_format, errors=errors)
+            if parsed.dt.tz is None:
+                time_column = parsed.dt.tz_localize(get_timezone(from_timezone))
+            else:
+                # the input already has offsets, e.g. '2024-01-01T00:00:00+08:00'
+                time_column = parsed.dt.tz_convert(get_timezone(from_timezone))
+        except (TypeError, AttributeError):
+            # Mixed offsets can't be parsed to one datetime dtype, or mixed types can't be parsed
+            # with one format. Convert input to string, and parse by offsets of each value.
+            time_column = _localize_mixed_offsets(time_column, from_timezone, errors)
 
     if is_omit_microsecond:
         time_column = time_column.dt.floor("s")
@@ -0,0 +1,13 @@
+"""
+Unit tests of the `utils` package, on small hand-made data with known results.
+
+    pytest tests
+
+The benchmarks of the same functions are under `benchmarks/`.
+"""
+
+import os
+import sys
+
+TEST_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(TEST_PATH, "..", "dags"))
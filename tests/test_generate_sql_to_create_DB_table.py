@@ -0,0 +1,137 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+from settings.global_config import (
+    HISTORY_PARTITION_END_MONTH,
+    HISTORY_PARTITION_START_MONTH,
+)
+from utils.generate_sql_to_create_DB_table import (
+    generate_column_map_from_dataframe,
+    generate_sql_to_create_db_table,
+    generate_sql_to_create_index,
+    generate_sql_to_create_monthly_partition,
+)
+
+
+def test_generate_column_map_narrows_integers_only():
+    data = pd.DataFrame(
+        {
+            "small": pd.Series([1, 2], dtype="int64"),
+            "large": pd.Series([1, 2**40], dtype="int64"),
+            "nullable": pd.Series([1, None], dtype="Int64"),
+            "integral_float": [1.0, 2.0],
+            "float_with_nan": [1.0, np.nan],
+            "float": [1.5, 2.0],
+        }
+    )
+
+    col_map = generate_column_map_from_dataframe(data)
+
+    assert col_map == {
+        "small": "smallint",
+        "large": "bigint",
+        "nullable": "smallint",
+        "integral_float": "double precision",
+        "float_with_nan": "double precision",
+        "float": "double precision",
+    }
+
+
+COL_MAP = {
+    "data_time": "timestamp with time zone",
+    "name": "text",
+    "wkb_geometry": "geometry(Point,4326)",
+}
+
+
+def test_generate_sql_to_create_db_table():
+    sql = generate_sql_to_create_db_table("test_table", COL_MAP)
+
+    assert "CREATE TABLE IF NOT EXISTS public.test_table" in sql
+    assert "wkb_geometry geometry(Point,4326)" in sql
+    assert "TABLESPACE pg_default;" in sql
+    assert "PARTITION" not in sql
+    assert "CREATE INDEX" not in sql
+
+
+def test_generate_sql_to_create_partitioned_db_table():
+    sql = generate_sql_to_create_db_table(
+        "test_table_history",
+        COL_MAP,
+        is_add_ogc_fid=True,
+        partition_col="data_time",
+        partition_start_month="2024-11",
+        partition_end_month="2025-02",
+    )
+
+    # a partitioned table can't have a tablespace or storage parameters
+    assert "PARTITION BY RANGE (data_time);" in sql
+    assert "TABLESPACE" not in sql
+    assert "OIDS" not in sql
+    # the partition key is a part of the primary key
+    assert "PRIMARY KEY (ogc_fid, data_time)" in sql
+    partitions = re.findall(
+        r"EXISTS public\.(test_table_history_\w+)\n *PARTITION OF", sql
+    )
+    assert partitions == [
+        "test_table_history_y2024m11",
+        "test_table_history_y2024m12",
+        "test_table_history_y2025m01",
+        "test_table_history_y2025m02",
+        "test_table_history_default",
+    ]
+
+
+def test_generate_sql_to_create_partitioned_db_table_default_range():
+    sql = generate_sql_to_create_db_table(
+        "test_table_history", COL_MAP, partition_col="data_time"
+    )
+
+    assert (
+        f"test_table_history_y{HISTORY_PARTITION_START_MONTH.replace('-', 'm')}" in sql
+    )
+    assert f"test_table_history_y{HISTORY_PARTITION_END_MONTH.replace('-', 'm')}" in sql
+
+
+def test_generate_sql_to_create_monthly_partition():
+    sql = generate_sql_to_create_monthly_partition("test_history", "2024-12", "2025-01")
+
+    assert (
+        "CREATE TABLE IF NOT EXISTS public.test_history_y2024m12\n"
+        "        PARTITION OF public.test_history\n"
+        "        FOR VALUES FROM ('2024-12-01 00:00:00+08:00') "
+        "TO ('2025-01-01 00:00:00+08:00');"
+    ) in sql
+    assert (
+        "FOR VALUES FROM ('2025-01-01 00:00:00+08:00') TO ('2025-02-01 00:00:00+08:00');"
+        in sql
+    )
+    assert (
+        "CREATE TABLE IF NOT EXISTS public.test_history_default\n"
+        "        PARTITION OF public.test_history DEFAULT;"
+    ) in sql
+
+
+def test_generate_sql_to_create_index():
+    sql = generate_sql_to_create_index(
+        "test_table", COL_MAP, time_index_col="data_time", time_index_method="btree"
+    )
+
+    assert (
+        "CREATE INDEX IF NOT EXISTS test_table_wkb_geometry_gist_idx\n"
+        "        ON public.test_table USING gist (wkb_geometry);"
+    ) in sql
+    assert (
+        "CREATE INDEX IF NOT EXISTS test_table_data_time_btree_idx\n"
+        "        ON public.test_table USING btree (data_time);"
+    ) in sql
+    assert (
+        generate_sql_to_create_index("test_table", COL_MAP, is_add_geometry_index=False)
+        == ""
+    )
+    with pytest.raises(ValueError, match="time_index_method"):
+        generate_sql_to_create_index(
+            "test_table", COL_MAP, time_index_col="data_time", time_index_method="hash"
+        )
@@ -0,0 +1,32 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from utils.instrumentation import estimate_payload_bytes
+
+
+def test_estimate_payload_bytes_counts_object_values():
+    n_rows = 20_000
+    rng = np.random.default_rng(0)
+    points = shapely.points(rng.uniform(121, 122, n_rows), rng.uniform(25, 26, n_rows))
+    gdata = gpd.GeoDataFrame(
+        {
+            "id": np.arange(n_rows),
+            "name": [f"臺北市信義區{'市府路' * (i % 5)}{i}號" for i in range(n_rows)],
+            # the load functions send hex EWKB strings
+            "wkb_geometry": shapely.to_wkb(points, hex=True, include_srid=True),
+        }
+    )
+    exact = estimate_payload_bytes(gdata, deep=True)
+
+    estimated = estimate_payload_bytes(gdata)
+
+    # far more than the 8 bytes per value of the column buffers
+    assert exact > 3 * gdata.memory_usage(index=False).sum()
+    assert abs(estimated - exact) / exact < 0.05
+
+
+def test_estimate_payload_bytes_small_data_is_exact():
+    data = pd.DataFrame({"name": ["a", "bb", None], "value": [1.0, 2.0, 3.0]})
+
+    assert estimate_payload_bytes(data) == estimate_payload_bytes(data, deep=True)
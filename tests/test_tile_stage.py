@@ -0,0 +1,84 @@
+import gzip
+import sqlite3
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+from utils import tile_stage
+from utils.tile_stage import _get_tile_field_types, save_geodataframe_to_mbtiles
+
+
+def test_get_tile_field_types():
+    data = pd.DataFrame(
+        {
+            "id": pd.Series([1, 2], dtype="int64"),
+            "count": pd.Series([1, None], dtype="Int32"),
+            "area": [1.5, 2.0],
+            "is_open": [True, False],
+            "name": ["a", None],
+            "data_time": pd.to_datetime(["2024-01-01", "2024-01-02"]),
+        }
+    )
+
+    assert _get_tile_field_types(data) == {
+        "id": "Number",
+        "count": "Number",
+        "area": "Number",
+        "is_open": "Boolean",
+        "name": "String",
+        "data_time": "String",
+    }
+
+
+def test_save_geodataframe_to_mbtiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(tile_stage, "DATA_PATH", str(tmp_path))
+    # a small batch, so the tiles are submitted in more than one batch
+    monkeypatch.setattr(tile_stage, "_TILE_BATCH_SIZE", 4)
+    gdata = gpd.GeoDataFrame(
+        {"id": [1, 2], "name": ["a", None]},
+        geometry=[
+            box(121.50, 25.00, 121.52, 25.02),
+            box(121.55, 25.05, 121.56, 25.06),
+        ],
+        crs="EPSG:4326",
+    )
+
+    file_path = save_geodataframe_to_mbtiles(
+        gdata, "test_layer", min_zoom=10, max_zoom=14, max_workers=1
+    )
+
+    assert file_path == f"{tmp_path}/test_layer.mbtiles"
+    with sqlite3.connect(file_path) as conn:
+        metadata = dict(conn.execute("SELECT name, value FROM metadata"))
+        rows = conn.execute(
+            "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles"
+        ).fetchall()
+    conn.close()
+    assert (metadata["minzoom"], metadata["maxzoom"]) == ("10", "14")
+    assert len(rows) == 18
+    keys = {(zoom, x, y) for zoom, x, y, _ in rows}
+    # zoom 10 covers Taipei with the XYZ tile (857, 438), which is the TMS row 1023 - 438
+    assert (10, 857, 585) in keys
+    assert {zoom for zoom, _, _ in keys} == set(range(10, 15))
+    # flipping the TMS rows back to XYZ gives tiles around the features
+    features = gdata.to_crs(3857).geometry.unary_union
+    for zoom, x, tms_y in keys:
+        tile = box(*tile_stage._get_tile_bounds(zoom, x, 2**zoom - 1 - tms_y))
+        # the default buffer is 64 of the 4096 units of the tile side
+        side = tile.length / 4
+        assert tile.buffer(side * 64 / 4096).intersects(features)
+
+    ids = set()
+    for _, _, _, tile_data in rows:
+        layer = mapbox_vector_tile.decode(gzip.decompress(tile_data))["test_layer"]
+        assert layer["extent"] == 4096
+        for feature in layer["features"]:
+            assert feature["geometry"]["type"] == "Polygon"
+            ids.add(feature["properties"]["id"])
+            # missing values are left out of the properties
+            if feature["properties"]["id"] == 2:
+                assert "name" not in feature["properties"]
+    assert ids == {1, 2}
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    from utils import transform_address
+except FileNotFoundError as error:
+    # the dimension data under `utils/opendata` is loaded when importing
+    pytest.skip(f"Address dimension data is missing: {error}", allow_module_level=True)
+
+
+def test_clean_data_returns_object_str():
+    addr = pd.Series(
+        ["台北市信義區3民路四段３00號-1(3室)", "信義路-８號之之5樓", None, np.nan, 123]
+    )
+
+    cleaned = transform_address.clean_data(addr)
+
+    assert cleaned.dtype == object
+    assert cleaned.tolist() == [
+        "台北市信義區三民路四段300號之1",
+        "信義路之8號5樓",
+        "",
+        "",
+        "",
+    ]
+    assert all(isinstance(value, str) for value in cleaned)
+
+
+def test_clean_data_only_converts_full_width_ascii():
+    # U+FF71 is a half-width katakana, not a full-width form
+    cleaned = transform_address.clean_data(pd.Series(["臺北市Ａ區ｱ"]))
+
+    assert cleaned.iloc[0] == "臺北市A區ｱ"
+
+
+def test_cleaned_address_to_save_data():
+    addr = pd.Series(["台北市信義區3民路四段３00號-1(3室)", None])
+
+    cleaned = transform_address.clean_data(addr)
+    standard_addr_list = transform_address.main_process(cleaned)
+    result, output = transform_address.save_data(addr, cleaned, standard_addr_list)
+
+    assert result["status"].tolist() == ["not null", "null"]
+    assert result.loc[0, "conf_level"] == "perfect"
+    assert output.tolist() == ["台北市信義區三民路四段300號", ""]
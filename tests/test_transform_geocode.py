@@ -0,0 +1,164 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point, Polygon, box
+from utils.transform_geocode import (
+    _interpolate_in_segment,
+    build_boundary_index,
+    build_gazetteer,
+    geocode_address,
+    reverse_geocode_district_village,
+)
+
+# door plates of one road in EPSG:4326, the even side on lat 25.0 and the odd side on 25.01
+DOOR_PLATE = pd.DataFrame(
+    {
+        "road": ["測試路一段"] * 4 + ["測試路一段"],
+        "lane": ["", "", "", "", "1巷"],
+        "alley": [""] * 5,
+        "num": ["10號", "20號", "30號", "11號", "2號"],
+        "x": [121.0, 121.1, 121.2, 121.05, 121.3],
+        "y": [25.0, 25.0, 25.0, 25.01, 25.02],
+    }
+)
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return build_gazetteer(DOOR_PLATE, from_crs=4326)
+
+
+def test_build_gazetteer(gazetteer):
+    assert ("測試路一段", "", "", "20") in gazetteer.exact.index
+    assert gazetteer.exact.loc[("測試路一段", "1", "", "2"), "lng"] == pytest.approx(
+        121.3
+    )
+
+    # three segments: even and odd side of the road, and the lane
+    assert gazetteer.segment["segment_id"].nunique() == 3
+    even = gazetteer.segment[
+        (gazetteer.segment["lane"] == "") & (gazetteer.segment["parity"] == 0)
+    ]
+    assert even["num_int"].tolist() == [10, 20, 30]
+
+    assert gazetteer.road.loc["測試路一段", "lng"] == pytest.approx(121.13)
+
+
+def test_geocode_address(gazetteer):
+    addr = pd.DataFrame(
+        {
+            "road": ["測試路一段"] * 7 + ["不存在路"],
+            "lane": [""] * 7 + [""],
+            "alley": [""] * 8,
+            "num": [
+                "20號",
+                "14號",
+                "10號之1",
+                "30號之2",
+                "11號之1",
+                "15號",
+                "32號",
+                "1號",
+            ],
+        }
+    )
+
+    result = geocode_address(addr, gazetteer)
+
+    assert result["match_level"].tolist() == [
+        "exact",
+        "interpolated",
+        # the first and last door plate of a segment
+        "interpolated",
+        "interpolated",
+        # a segment with only one door plate
+        "interpolated",
+        # out of the range of the segment
+        "road",
+        "road",
+        "unmatched",
+    ]
+    expected_lng = [121.1, 121.04, 121.0, 121.2, 121.05, 121.13, 121.13, np.nan]
+    np.testing.assert_allclose(result["lng"], expected_lng)
+    np.testing.assert_allclose(result.loc[:4, "lat"], [25.0, 25.0, 25.0, 25.0, 25.01])
+
+
+def test_interpolate_in_one_row_segment():
+    segment = pd.DataFrame(
+        {
+            "road": ["測試路"],
+            "lane": [""],
+            "alley": [""],
+            "parity": [1.0],
+            "num_int": [11.0],
+            "lng": [121.05],
+            "lat": [25.01],
+            "segment_id": [0],
+        }
+    )
+    query = pd.DataFrame(
+        {
+            "road": ["測試路", "測試路", "測試路"],
+            "lane": ["", "", ""],
+            "alley": ["", "", ""],
+            "num_int": [11.0, 9.0, 13.0],
+            "parity": [1.0, 1.0, 1.0],
+        }
+    )
+
+    lng, lat = _interpolate_in_segment(query, segment)
+
+    np.testing.assert_allclose(lng, [121.05, np.nan, np.nan])
+    np.testing.assert_allclose(lat, [25.01, np.nan, np.nan])
+
+
+def test_reverse_geocode_district_village():
+    # two villages side by side, the right one has a hole
+    boundary = gpd.GeoDataFrame(
+        {"TOWNNAME": ["甲區", "乙區"], "VILLNAME": ["甲里", "乙里"]},
+        geometry=[
+            box(0, 0, 10, 10),
+            Polygon(
+                [(10, 0), (20, 0), (20, 10), (10, 10)],
+                holes=[[(14, 4), (16, 4), (16, 6), (14, 6)]],
+            ),
+        ],
+        crs="EPSG:3826",
+    )
+    boundary_index = build_boundary_index(boundary)
+    points = gpd.GeoDataFrame(
+        {"district": ["舊區"] * 8},
+        geometry=[
+            Point(5, 5),
+            Point(12, 2),
+            # on the shared border, matched to one of the two
+            Point(10, 5),
+            # on the outer border and on the border of the hole
+            Point(0, 5),
+            Point(14, 5),
+            # in the hole
+            Point(15, 5),
+            # outside all polygons
+            Point(30, 30),
+            None,
+        ],
+        crs="EPSG:3826",
+    )
+
+    result = reverse_geocode_district_village(points, boundary_index)
+
+    assert result.loc[[0, 1, 3, 4, 5, 6, 7], "village"].tolist() == [
+        "甲里",
+        "乙里",
+        "甲里",
+        "乙里",
+        None,
+        None,
+        None,
+    ]
+    assert result.loc[2, "village"] in ("甲里", "乙里")
+    assert result["district"].tolist()[:2] == ["甲區", "乙區"]
+    assert result["district"].tolist()[5:] == [None, None, None]
+    # the input is not modified
+    assert points["district"].eq("舊區").all()
@@ -0,0 +1,172 @@
+import geopandas as gpd
+import pytest
+import shapely
+from shapely.geometry import (
+    GeometryCollection,
+    LineString,
+    MultiLineString,
+    Point,
+    Polygon,
+    box,
+)
+from utils.transform_geometry import (
+    _get_geometry_size,
+    convert_geometry_to_wkbgeometry,
+    generalize_geoseries_by_zoom,
+    simplify_geoseries,
+    validate_geometry,
+)
+
+
+def test_validate_geometry_repairs_multipolygon():
+    # the geometries of R0019 and D030101_1
+    gdata = gpd.GeoDataFrame(
+        {"id": [1, 2, 3, 4, 5]},
+        geometry=[
+            box(0, 0, 1, 1),
+            Polygon([(0, 0), (1, 1), (1, 0), (0, 1)]),  # self-intersecting bowtie
+            Polygon(),
+            None,
+            LineString([(0, 0), (1, 1)]),
+        ],
+        crs=3826,
+    )
+
+    result, report = validate_geometry(gdata, "MultiPolygon", is_print=False)
+
+    assert report == {
+        "total": 5,
+        "missing": 1,
+        "empty": 1,
+        "invalid": 1,
+        "z": 0,
+        "promoted": 1,
+        "extracted": 0,
+        "mismatched": 1,
+        "dropped": 3,
+        "output": 2,
+    }
+    assert result["id"].tolist() == [1, 2]
+    assert (result.geometry.geom_type == "MultiPolygon").all()
+    assert result.geometry.is_valid.all()
+    # the bowtie is split into its two triangles
+    assert shapely.get_num_geometries(result.geometry.values[1]) == 2
+    assert result.geometry.values[1].area == pytest.approx(0.5)
+    # the input is not modified
+    assert gdata.geometry.values[1].geom_type == "Polygon"
+
+    result = convert_geometry_to_wkbgeometry(result, from_crs=3826)
+    assert result["wkb_geometry"].notna().all()
+
+
+def test_validate_geometry_multilinestringz():
+    # the geometries of D030102_2
+    gdata = gpd.GeoDataFrame(
+        {"id": [1, 2, 3, 4]},
+        geometry=[
+            LineString([(0, 0), (1, 1)]),
+            MultiLineString([[(0, 0, 1), (1, 1, 1)]]),
+            GeometryCollection([LineString([(0, 0), (1, 0)]), Point(2, 2)]),
+            Point(0, 0),
+        ],
+        crs=4326,
+    )
+
+    result, report = validate_geometry(gdata, "MultiLineStringZ", is_print=False)
+
+    assert report["z"] == 3
+    assert report["promoted"] == 1
+    assert report["extracted"] == 1
+    assert report["mismatched"] == 1
+    assert result["id"].tolist() == [1, 2, 3]
+    assert (result.geometry.geom_type == "MultiLineString").all()
+    assert result.geometry.has_z.all()
+
+
+@pytest.mark.parametrize("geometry_type", ["MultiPolygon", "MultiLineStringZ"])
+def test_validate_geometry_empty_input(geometry_type):
+    gdata = gpd.GeoDataFrame({"id": []}, geometry=[], crs=4326)
+
+    result, report = validate_geometry(gdata, geometry_type, is_print=False)
+
+    assert len(result) == 0
+    assert report["total"] == report["output"] == report["dropped"] == 0
+    assert list(result.columns) == ["id", "geometry"]
+    result = convert_geometry_to_wkbgeometry(result, from_crs=4326)
+    assert len(result) == 0
+
+
+def test_validate_geometry_all_dropped():
+    gdata = gpd.GeoDataFrame({"id": [1, 2]}, geometry=[None, Polygon()], crs=4326)
+
+    result, report = validate_geometry(gdata, "MultiPolygon", is_print=False)
+
+    assert len(result) == 0
+    assert report["dropped"] == 2
+
+
+@pytest.mark.parametrize("geometry_type", ["Geometry", "MultiCurve", "Polygonz"])
+def test_validate_geometry_unknown_type(geometry_type):
+    gdata = gpd.GeoDataFrame({"id": [1]}, geometry=[box(0, 0, 1, 1)])
+
+    with pytest.raises(ValueError, match="geometry_type should be one of"):
+        validate_geometry(gdata, geometry_type, is_print=False)
+
+
+def test_get_geometry_size_matches_wkb():
+    arr = shapely.from_wkt(
+        [
+            "POINT (1 2)",
+            "POINT EMPTY",
+            "LINESTRING Z (0 0 0, 1 1 1)",
+            "POLYGON ((0 0, 10 0, 10 10, 0 0), (1 1, 2 1, 2 2, 1 1))",
+            "POLYGON EMPTY",
+            "MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), ((5 5, 6 5, 6 6, 5 5)))",
+            "GEOMETRYCOLLECTION (POINT (1 1), GEOMETRYCOLLECTION (LINESTRING (0 0, 1 1)))",
+            None,
+        ]
+    )
+
+    size = _get_geometry_size(arr)
+
+    expected = sum(len(wkb) for wkb in shapely.to_wkb(arr) if wkb is not None)
+    assert size == {"vertices": 22, "bytes": expected}
+
+
+def test_generalize_geoseries_by_zoom(capsys):
+    geos = gpd.GeoSeries(
+        shapely.buffer(shapely.points([121.5, 121.6], [25.0, 25.1]), 0.001), crs=4326
+    )
+
+    generalized = generalize_geoseries_by_zoom(geos, zooms=[10, 16])
+
+    assert capsys.readouterr().out == ""
+    assert generalized[10][1]["tolerance"] > generalized[16][1]["tolerance"]
+    assert generalized[10][1]["vertices_after"] <= generalized[16][1]["vertices_after"]
+    assert generalized[10][0].crs == geos.crs
+
+
+def test_simplify_geoseries_keeps_multi_type():
+    geos = gpd.GeoSeries(
+        shapely.from_wkt(
+            [
+                "MULTIPOLYGON (((0 0, 1 0, 1 0.001, 1 1, 0 0)))",
+                "MULTILINESTRING Z ((0 0 1, 0.5 0.0001 1, 1 0 1))",
+                "POLYGON ((0 0, 1 0, 1 1, 0 0))",
+                None,
+            ]
+        )
+    )
+
+    result, report = simplify_geoseries(
+        geos, tolerance=0.01, grid_size=0.001, is_print=False
+    )
+
+    assert result.geom_type.tolist()[:3] == [
+        "MultiPolygon",
+        "MultiLineString",
+        "Polygon",
+    ]
+    assert result.values[1].has_z
+    assert result.isna().tolist() == [False, False, False, True]
+    assert report["vertices_after"] == 4 + 2 + 4
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+from utils.transform_time import (
+    _localize_mixed_offsets,
+    convert_str_to_time_format,
+    omit_chinese_string_in_time,
+)
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_mixed_offsets_with_nulls():
+    time_column = pd.Series(
+        ["2024-01-01 00:00:00+08:00", "2024-07-01 00:00:00+09:00", None, float("nan")]
+    )
+
+    result = convert_str_to_time_format(time_column)
+
+    assert str(result.dt.tz) == "Asia/Taipei"
+    assert result.iloc[0] == pd.Timestamp("2024-01-01 00:00:00+08:00")
+    assert result.iloc[1] == pd.Timestamp("2024-06-30 23:00:00+08:00")
+    assert result.iloc[2:].isna().all()
+
+
+def test_localize_mixed_offsets_keeps_offset_of_each_value():
+    time_column = pd.Series(
+        ["2024-03-09 12:00:00-05:00", "2024-03-10 12:00:00-04:00", "2024-03-11", None],
+        index=[1, 1, 2, 2],
+    )
+
+    result = _localize_mixed_offsets(time_column, "America/New_York")
+
+    assert result.index.tolist() == [1, 1, 2, 2]
+    assert [value.utcoffset().total_seconds() / 3600 for value in result[:3]] == [
+        -5,
+        -4,
+        -4,
+    ]
+    assert result.iloc[2] == pd.Timestamp("2024-03-11", tz="America/New_York")
+    assert pd.isna(result.iloc[3])
+
+
+def test_localize_mixed_offsets_all_null():
+    result = _localize_mixed_offsets(pd.Series([None, None]), "Asia/Taipei")
+
+    assert result.isna().all()
+    assert str(result.dt.tz) == "Asia/Taipei"
+
+
+def test_omit_chinese_string_in_time():
+    assert (
+        omit_chinese_string_in_time("2022/7/14 上午 12:00:00") == "2022-07-14 00:00:00"
+    )
+    assert (
+        omit_chinese_string_in_time("2022/7/14 下午 3:04:05.000")
+        == "2022-07-14 15:04:05"
+    )
+    # the strings in other formats are passed through
+    assert omit_chinese_string_in_time("114年7月14日") == "114年7月14日"
+    assert (
+        omit_chinese_string_in_time("2022/7/14 下午 25:00:00")
+        == "2022/7/14 下午 25:00:00"
+    )
+    assert omit_chinese_string_in_time(None) is None
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_some_values_with_offsets():
+    time_column = pd.Series(["2024-01-01 00:00:00+09:00", "2024-07-01 00:00:00"])
+
+    result = convert_str_to_time_format(time_column)
+
+    assert result.tolist() == [
+        pd.Timestamp("2023-12-31 23:00:00+08:00"),
+        pd.Timestamp("2024-07-01 00:00:00+08:00"),
+    ]
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_mixed_offsets_with_format():
+    time_column = pd.Series(["2024-01-01 00:00:00+0800", "2024-07-01 00:00:00+0900"])
+
+    result = convert_str_to_time_format(time_column, from_format="%Y-%m-%d %H:%M:%S%z")
+
+    assert str(result.dt.tz) == "Asia/Taipei"
+    assert result.iloc[1] == pd.Timestamp("2024-06-30 23:00:00+08:00")